@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from utils.metrics import registry
+
+
+# User columns kept per token. Anything else (email, names, ...) is loaded
+# lazily from the database the first time a view reads it.
+USER_FIELDS = ["id", "username", "role", "is_active", "is_staff", "is_superuser"]
+
+
+class TokenCache:
+    # token -> user fields, in a per-process TTL/LRU cache backed by an
+    # optional shared Django cache (TOKEN_AUTH_SHARED_CACHE). Entries are
+    # deleted on invalidation; other processes' local copies expire after
+    # TOKEN_AUTH_CACHE_TTL seconds.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def cache_key(key):
+        # Tokens are credentials, so only their hash is used as a cache key
+        return "accounts:token:" + hashlib.sha256(key.encode()).hexdigest()
+
+    @property
+    def shared(self):
+        alias = settings.TOKEN_AUTH_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        # Cached user field values for the token, or None
+        values = self.get_local(key)
+        if values is not None:
+            return values
+
+        cache_key = self.cache_key(key)
+        values = self.shared.get(cache_key) if self.shared is not None else None
+        if values is not None:
+            self.remember(cache_key, values)
+            self.stats["shared_hits"] += 1
+            return values
+
+        self.stats["misses"] += 1
+        return None
+
+    def get_local(self, key):
+        # Like get(), but only consults this process's entries
+        cache_key = self.cache_key(key)
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(cache_key)
+                self.stats["local_hits"] += 1
+                return entry[1]
+        return None
+
+    def set(self, key, values):
+        cache_key = self.cache_key(key)
+        self.remember(cache_key, values)
+        if self.shared is not None:
+            self.shared.set(cache_key, values, settings.TOKEN_AUTH_SHARED_CACHE_TTL)
+
+    def remember(self, cache_key, values):
+        expires = time.monotonic() + settings.TOKEN_AUTH_CACHE_TTL
+        with self.lock:
+            self.entries[cache_key] = (expires, values)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > settings.TOKEN_AUTH_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        cache_keys = [self.cache_key(key) for key in keys]
+        with self.lock:
+            for cache_key in cache_keys:
+                self.entries.pop(cache_key, None)
+            self.stats["invalidations"] += len(cache_keys)
+
+        if self.shared is not None and cache_keys:
+            self.shared.delete_many(cache_keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+registry.register_stats("token_cache", token_cache.stats, "Token authentication cache lookups")
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # TokenAuthentication without the per-request Token + User query: known
+    # tokens resolve to a User built from cached fields
+    def authenticate_credentials(self, key):
+        values = token_cache.get(key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, {field: getattr(user, field) for field in USER_FIELDS})
+            return user, token
+
+        return self.build(key, values)
+
+    def build(self, key, values):
+        # from_db expects values in the model's column order
+        User = get_user_model()
+        fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        user = User.from_db("default", fields, [values[field] for field in fields])
+        token = Token.from_db("default", ["key", "user_id"], [key, user.pk])
+        return user, token
+
+    async def aauthenticate(self, request):
+        # authenticate() for async views. Tokens in this process's cache
+        # resolve on the event loop; anything else (malformed headers,
+        # misses, the shared cache) runs in a worker thread.
+        parts = get_authorization_header(request).split()
+        if len(parts) == 2 and parts[0].lower() == self.keyword.lower().encode():
+            try:
+                key = parts[1].decode()
+            except UnicodeError:
+                key = None
+
+            values = token_cache.get_local(key) if key else None
+            if values is not None:
+                return self.build(key, values)
+
+        return await sync_to_async(self.authenticate)(request)
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class LoginOverloaded(APIException):
+    # Every hashing worker is busy and the wait queue is full
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins in progress, please retry shortly."
+    default_code = "login_overloaded"
+
+
+class PasswordPool:
+    # Runs password hashing on LOGIN_HASH_WORKERS threads. The hashers release
+    # the GIL, so a burst of logins uses at most that many cores while other
+    # requests keep theirs; beyond LOGIN_HASH_QUEUE waiting logins, new ones
+    # are turned away instead of piling up.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.slots = None
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                workers = settings.LOGIN_HASH_WORKERS
+                self.slots = threading.BoundedSemaphore(workers + settings.LOGIN_HASH_QUEUE)
+                self.executor = ThreadPoolExecutor(workers, thread_name_prefix="password-hash")
+
+    def run(self, func, *args):
+        if self.executor is None:
+            self.start()
+
+        if not self.slots.acquire(blocking=False):
+            raise LoginOverloaded()
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self.slots.release()
+
+
+password_pool = PasswordPool()
+
+
+class PooledModelBackend(ModelBackend):
+    # ModelBackend with the password checks moved onto the password pool.
+    # Database work stays on the request thread, so pool threads never hold
+    # connections.
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        User = get_user_model()
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as known ones
+            password_pool.run(make_password, password)
+            return None
+
+        # check_password reports through the setter when the stored hash
+        # uses an older hasher or weaker parameters than PASSWORD_HASHERS[0]
+        outdated = []
+        if not password_pool.run(check_password, password, user.password, outdated.append):
+            return None
+
+        if outdated:
+            user.password = password_pool.run(make_password, password)
+            user.save(update_fields=["password"])
+
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,39 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from accounts.authentication import CachedTokenAuthentication, token_cache
+from utils.benchmarking import Timer, bench_user, rolled_back
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-request token authentication with and without the token cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+
+        with rolled_back():
+            key = Token.objects.get(user=bench_user("viewer")).key
+            request = APIRequestFactory().get("/api/recipes/", HTTP_AUTHORIZATION=f"Token {key}")
+
+            token_cache.clear()
+            for name, authentication in [
+                ("TokenAuthentication", TokenAuthentication()),
+                ("CachedTokenAuthentication", CachedTokenAuthentication()),
+            ]:
+                with CaptureQueriesContext(connection) as queries, Timer() as timer:
+                    for _ in range(count):
+                        authentication.authenticate(request)
+
+                self.stdout.write(
+                    f"{name:>26}: {timer.elapsed / count * 1e6:.1f} us/request, "
+                    f"{len(queries)} queries for {count} requests"
+                )
+
+            self.stdout.write(f"cache stats: {token_cache.stats}")
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, get_hashers, make_password
+from django.core.management.base import BaseCommand
+
+from accounts.backends import password_pool
+from accounts.views import LoginView
+from utils.benchmarking import Timer, bench_client, bench_user, rolled_back
+
+
+PASSWORD = "bench-login-password"
+
+
+class Command(BaseCommand):
+    help = "Benchmark password verification per hasher and login throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=20)
+        parser.add_argument("--clients", type=int, default=16)
+
+    def handle(self, *args, **options):
+        count = options["logins"]
+
+        # Single-threaded cost of one verification, i.e. logins/sec per core
+        for hasher in get_hashers():
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            with Timer() as timer:
+                for _ in range(count):
+                    hasher.verify(PASSWORD, encoded)
+            per_login = timer.elapsed / count
+            self.stdout.write(
+                f"{hasher.algorithm:>14}: {per_login * 1000:.1f} ms/verify, "
+                f"{1 / per_login:.1f} logins/sec/core"
+            )
+
+        # Concurrent clients sharing the password pool
+        encoded = make_password(PASSWORD)
+        with ThreadPoolExecutor(options["clients"]) as clients, Timer() as timer:
+            list(clients.map(
+                lambda _: password_pool.run(check_password, PASSWORD, encoded), range(count)
+            ))
+        self.stdout.write(
+            f"{options['clients']} clients, {settings.LOGIN_HASH_WORKERS} hashing workers "
+            f"({get_hasher().algorithm}): {count / timer.elapsed:.1f} logins/sec"
+        )
+
+        # Whole requests through the login endpoint, without its throttles
+        with rolled_back():
+            user = bench_user("viewer")
+            user.set_password(PASSWORD)
+            user.save()
+
+            client = bench_client()
+            throttles, LoginView.throttle_classes = LoginView.throttle_classes, []
+            try:
+                with Timer() as timer:
+                    for _ in range(count):
+                        response = client.post(
+                            "/api/accounts/login/", {"username": user.username, "password": PASSWORD}
+                        )
+                        assert response.status_code == 200, response.content
+            finally:
+                LoginView.throttle_classes = throttles
+
+        self.stdout.write(
+            f"POST /api/accounts/login/: {timer.elapsed / count * 1000:.1f} ms/login, "
+            f"{count / timer.elapsed:.1f} logins/sec"
+        )
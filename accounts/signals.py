@@ -1,8 +1,11 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 
+from .authentication import USER_FIELDS, token_cache
+
 
 # Automatically create auth token whenever a new user is created
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -10,3 +13,22 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
     # Generate token only for newly created users
     if created:
         Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance=None, created=False, update_fields=None, **kwargs):
+    # Cached tokens carry the user's role and active flag; saves that only
+    # touch other columns (e.g. last_login) keep them
+    if created or (update_fields is not None and not set(update_fields) & set(USER_FIELDS)):
+        return
+
+    keys = list(Token.objects.filter(user=instance).values_list("key", flat=True))
+    transaction.on_commit(lambda: token_cache.invalidate(keys))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance=None, **kwargs):
+    # Also runs for tokens removed together with their user. The key is the
+    # primary key, which the delete resets on the instance afterwards.
+    keys = [instance.key]
+    transaction.on_commit(lambda: token_cache.invalidate(keys))
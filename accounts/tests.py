@@ -1,3 +1,141 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from .authentication import CachedTokenAuthentication, token_cache
+from .backends import password_pool
+from .throttles import LoginUsernameThrottle
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    # Known tokens authenticate without queries until they are invalidated
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="viewer", password="secret", email="viewer@example.com", role="viewer"
+        )
+        cls.key = Token.objects.get(user=cls.user).key
+
+    def setUp(self):
+        token_cache.clear()
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.key)[0]
+
+    def test_cached_token_skips_database(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.pk, user.role, user.is_authenticated), (self.user.pk, "viewer", True))
+
+    def test_other_fields_load_lazily(self):
+        self.authenticate()
+        user = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "viewer@example.com")
+
+    def test_role_change_invalidates(self):
+        self.authenticate()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = "creator"
+            self.user.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().role, "creator")
+
+    def test_deactivation_rejects_token(self):
+        self.authenticate()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=["is_active"])
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deleted_token_is_rejected(self):
+        self.authenticate()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(key=self.key).delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_last_login_update_keeps_cache(self):
+        self.authenticate()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=["last_login"])
+
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+
+class LoginTests(TestCase):
+    # Logins hash on the password pool, upgrade old hashes and are throttled
+    client_class = APIClient
+    url = "/api/accounts/login/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="viewer", password="secret", email="viewer@example.com", role="viewer"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, password="secret", username="viewer"):
+        return self.client.post(self.url, {"username": username, "password": password})
+
+    def test_login_returns_token(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["token"], Token.objects.get(user=self.user).key)
+
+        self.assertEqual(self.login(password="wrong").status_code, 400)
+        self.assertEqual(self.login(username="nobody").status_code, 400)
+
+    def test_outdated_hash_is_upgraded(self):
+        self.user.password = make_password("secret", hasher="pbkdf2_sha256")
+        self.user.save(update_fields=["password"])
+
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, get_hasher().algorithm)
+        self.assertTrue(self.user.check_password("secret"))
+
+    @mock.patch.object(LoginUsernameThrottle, "THROTTLE_RATES", {"login_username": "2/min"})
+    def test_username_throttle_skips_hashing(self):
+        with mock.patch.object(password_pool, "run", wraps=password_pool.run) as run:
+            self.assertEqual(self.login(password="wrong").status_code, 400)
+            self.assertEqual(self.login(password="wrong").status_code, 400)
+            self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(run.call_count, 2)
+
+        # Other usernames keep their own budget
+        self.assertEqual(self.login(username="nobody").status_code, 400)
+
+    def test_full_pool_sheds_logins(self):
+        password_pool.start()
+        held = 0
+        while password_pool.slots.acquire(blocking=False):
+            held += 1
+        try:
+            self.assertEqual(self.login().status_code, 503)
+        finally:
+            for _ in range(held):
+                password_pool.slots.release()
 
-# Create your tests here.
+        self.assertEqual(self.login().status_code, 200)
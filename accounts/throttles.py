@@ -0,0 +1,25 @@
+import hashlib
+
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle
+
+
+class LoginIPThrottle(AnonRateThrottle):
+    # Login attempts per client address (the "login_ip" rate)
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginUsernameThrottle(SimpleRateThrottle):
+    # Login attempts per username (the "login_username" rate), whichever
+    # addresses they come from
+    scope = "login_username"
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if not isinstance(username, str) or not username:
+            return None
+        # Hashed, as usernames may hold characters some cache backends reject
+        ident = hashlib.sha256(username.strip().casefold().encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
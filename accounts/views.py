@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from .serializers import LoginSerializer, RegisterSerializer
+from .throttles import LoginIPThrottle, LoginUsernameThrottle
 
 
 class RegisterView(APIView):
@@ -29,6 +30,9 @@ class LoginView(APIView):
     # Public endpoint to authenticate users and return token
     permission_classes = []
 
+    # Checked before any password is hashed
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
+
     def post(self, request):
         # Validate login credentials
         serializer = LoginSerializer(data=request.data)
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+import pytest
+
+from recipes.changes import encode_token
+from utils.benchmarking import StatementCapture, full_scans
+
+pytestmark = pytest.mark.django_db
+
+# Request shapes of the recipe and favourite endpoints whose queries must
+# be served from indexes. "{recipe}" is a seeded recipe; "{creator}" is a
+# user owning few recipes, as most creators do (the seeded creator owns
+# them all, which any planner answers with a full scan).
+QUERY_SHAPES = {
+    "list": "/api/recipes/?page_size=20",
+    "list_prep_duration": "/api/recipes/?prep_duration=5&page_size=20",
+    "list_cook_duration": "/api/recipes/?cook_duration=5&page_size=20",
+    "list_created_by": "/api/recipes/?created_by={creator}&page_size=20",
+    "list_order_prep_duration": "/api/recipes/?ordering=prep_duration&page_size=20",
+    "list_order_cook_duration": "/api/recipes/?ordering=-cook_duration&page_size=20",
+    "list_order_favourite_count": "/api/recipes/?ordering=-favourite_count&page_size=20",
+    "list_cursor_prep_duration": "/api/recipes/?pagination=cursor&ordering=prep_duration&page_size=20",
+    "list_expanded": "/api/recipes/?page_size=20&expand=ingredients,steps",
+    "retrieve": "/api/recipes/{recipe}/",
+    "batch": "/api/recipes/batch/?ids={recipe}",
+    "my_favourites": "/api/recipes/my_favourites/?page_size=20",
+    "favourite_ids": "/api/recipes/favourite_ids/",
+    "top": "/api/recipes/top/",
+    "top_week": "/api/recipes/top/?window=7d",
+    "changes": "/api/recipes/changes/?limit=20",
+    "changes_since": "/api/recipes/changes/?since={token}&limit=20",
+    "favourites": "/api/favorites/",
+}
+
+
+@pytest.fixture(scope="module")
+def analyzed(bench_data, django_db_blocker, pytestconfig):
+    # PostgreSQL plans from statistics, so it gets them for the seeded data
+    # and enough rows for an index to beat reading a few pages. SQLite
+    # without statistics assumes indexes are selective.
+    if connection.vendor == "postgresql":
+        if pytestconfig.getoption("--bench-scale") == "small":
+            pytest.skip("PostgreSQL scans small tables whatever the indexes; use --bench-scale=medium or large")
+        with django_db_blocker.unblock(), connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+@pytest.mark.parametrize("shape", QUERY_SHAPES)
+def bench_query_plan(shape, analyzed, bench_data, viewer_client):
+    url = QUERY_SHAPES[shape].format(
+        recipe=bench_data["recipe_ids"][0],
+        creator=bench_data["viewer"].pk,
+        token=encode_token(timezone.now() - timedelta(hours=1), 0),
+    )
+    cache.clear()
+
+    capture = StatementCapture()
+    with connection.execute_wrapper(capture):
+        response = viewer_client.get(url)
+    assert response.status_code == 200, response.content
+
+    scans = {
+        sql: tables for sql, params in capture.statements
+        if (tables := full_scans(sql, params))
+    }
+    assert not scans, f"{shape} reads whole tables: " + "; ".join(
+        f"{', '.join(tables)} in {sql}" for sql, tables in scans.items()
+    )
@@ -0,0 +1,165 @@
+import io
+
+from django.core.cache import cache
+import openpyxl
+import pytest
+
+from favorites.models import Favourite
+from recipes.importers import OPTIONAL_COLUMNS, REQUIRED_COLUMNS
+from recipes.pdf import pdf_cache
+from utils.benchmarking import create_sample_recipe, temporary_media
+
+pytestmark = pytest.mark.django_db
+
+# Most queries a single request of each benchmark may run. Raising one is a
+# deliberate choice that shows up in review.
+QUERY_BUDGETS = {
+    "list": 2,
+    "list_cached": 1,
+    "list_expanded": 4,
+    "retrieve": 3,
+    "retrieve_cached": 1,
+    "search": 2,
+    "create": 8,
+    "bulk_upload": 8,
+    "export_csv": 3,
+    "export_xlsx": 3,
+    "download_pdf": 3,
+    "download_pdf_cached": 3,
+    "favourite": 9,
+    "bulk_favourite": 6,
+    "batch": 3,
+    "changes": 4,
+}
+
+
+def ok(response, status=200):
+    assert response.status_code == status, response.content
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def recipe_payload(number):
+    return {
+        "title": f"Benchmark recipe {number}",
+        "description": "Created by the benchmark suite",
+        "prep_duration": 10,
+        "cook_duration": 20,
+        "ingredients": [{"name": f"Bench ingredient {i}"} for i in range(8)],
+        "steps": [{"step_number": n, "instruction": f"Step {n}"} for n in range(1, 11)],
+    }
+
+
+def workbook(rows):
+    # In-memory import file with an ingredients column
+    book = openpyxl.Workbook(write_only=True)
+    sheet = book.create_sheet()
+    sheet.append(REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+    for i in range(rows):
+        sheet.append([f"Imported {i}", f"Description {i}", i % 60, i % 120, "Flour, Salt, Bench ingredient 3"])
+
+    buffer = io.BytesIO()
+    book.save(buffer)
+    return buffer.getvalue()
+
+
+def bench_list(bench, viewer_client):
+    url = "/api/recipes/?page_size=20"
+    bench("list", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["list"], setup=cache.clear)
+    bench("list_cached", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["list_cached"])
+
+
+def bench_list_expanded(bench, viewer_client):
+    url = "/api/recipes/?page_size=20&expand=ingredients,steps"
+    bench("list_expanded", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["list_expanded"], setup=cache.clear)
+
+
+def bench_retrieve(bench, viewer_client, bench_data):
+    url = f"/api/recipes/{bench_data['recipe_ids'][0]}/"
+    bench("retrieve", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["retrieve"], setup=cache.clear)
+    bench("retrieve_cached", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["retrieve_cached"])
+
+
+def bench_search(bench, viewer_client):
+    url = "/api/recipes/?search=stir+gently&page_size=20"
+    bench("search", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["search"], setup=cache.clear)
+
+
+def bench_create(bench, creator_client):
+    numbers = iter(range(1_000_000))
+    bench(
+        "create",
+        lambda: ok(creator_client.post("/api/recipes/", recipe_payload(next(numbers)), format="json"), 201),
+        QUERY_BUDGETS["create"],
+    )
+
+
+def bench_bulk_upload(bench, creator_client):
+    content = workbook(200)
+
+    def upload():
+        file = io.BytesIO(content)
+        file.name = "recipes.xlsx"
+        ok(creator_client.post("/api/recipes/bulk_upload/", {"file": file}, format="multipart"), 201)
+
+    bench("bulk_upload", upload, QUERY_BUDGETS["bulk_upload"])
+
+
+def bench_export(bench, creator_client):
+    # One prep_duration value: about 1/60 of the seeded recipes
+    for file_type in ("csv", "xlsx"):
+        bench(
+            f"export_{file_type}",
+            lambda: ok(creator_client.get(f"/api/recipes/export/?type={file_type}&prep_duration=5")),
+            QUERY_BUDGETS[f"export_{file_type}"],
+        )
+
+
+def bench_download_pdf(bench, viewer_client, bench_data):
+    with temporary_media():
+        recipe = create_sample_recipe(bench_data["creator"])
+        url = f"/api/recipes/{recipe.pk}/download_pdf/"
+
+        bench(
+            "download_pdf",
+            lambda: ok(viewer_client.get(url)),
+            QUERY_BUDGETS["download_pdf"],
+            setup=lambda: pdf_cache.invalidate([recipe.pk]),
+        )
+        bench("download_pdf_cached", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["download_pdf_cached"])
+
+
+def bench_favourite(bench, viewer_client, bench_data):
+    recipe_id = bench_data["recipe_ids"][-1]
+    url = f"/api/recipes/{recipe_id}/favourite/"
+
+    bench(
+        "favourite",
+        lambda: ok(viewer_client.post(url), 201),
+        QUERY_BUDGETS["favourite"],
+        setup=lambda: Favourite.objects.filter(user=bench_data["viewer"], recipe_id=recipe_id).delete(),
+    )
+
+
+def bench_bulk_favourite(bench, viewer_client, bench_data):
+    recipe_ids = bench_data["recipe_ids"][-50:]
+
+    bench(
+        "bulk_favourite",
+        lambda: ok(viewer_client.post("/api/recipes/bulk_favourite/", {"ids": recipe_ids}, format="json")),
+        QUERY_BUDGETS["bulk_favourite"],
+        setup=lambda: viewer_client.post("/api/recipes/bulk_unfavourite/", {"ids": recipe_ids}, format="json"),
+    )
+
+
+def bench_batch(bench, viewer_client, bench_data):
+    ids = ",".join(map(str, bench_data["recipe_ids"][:50]))
+    bench("batch", lambda: ok(viewer_client.get(f"/api/recipes/batch/?ids={ids}")), QUERY_BUDGETS["batch"])
+
+
+def bench_changes(bench, viewer_client, settings):
+    # A full page of the change feed: recipes, ingredients, steps, tombstones
+    settings.RECIPE_CHANGES_DELAY_SECONDS = 0
+    url = "/api/recipes/changes/?limit=50"
+    bench("changes", lambda: ok(viewer_client.get(url)), QUERY_BUDGETS["changes"])
@@ -0,0 +1,155 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.db import connection
+import pytest
+
+from utils.benchmarking import bench_client, bench_user, seed_favourites, seed_recipes
+from utils.metrics import QueryRecorder
+
+
+# Data generated once per session: recipes (with ingredients and steps),
+# viewers and their favourites
+SCALES = {
+    "small": {"recipes": 500, "users": 50, "favourites_per_user": 10},
+    "medium": {"recipes": 10000, "users": 1000, "favourites_per_user": 20},
+    "large": {"recipes": 100000, "users": 10000, "favourites_per_user": 40},
+}
+
+results_key = pytest.StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-scale", choices=list(SCALES), default="small")
+    group.addoption("--bench-repeat", type=int, default=10, help="Timed runs per benchmark")
+    group.addoption("--bench-json", default="bench-results.json", help="Results file to write")
+    group.addoption("--bench-compare", default=None, help="Earlier results file to compare against")
+
+
+def pytest_configure(config):
+    config.stash[results_key] = {}
+
+
+class Benchmark:
+    # Times a callable over repeated runs after a warm-up run and checks
+    # the queries of every run against an optional budget
+    def __init__(self, results, repeat):
+        self.results = results
+        self.repeat = repeat
+
+    def __call__(self, name, func, queries=None, setup=None):
+        if setup is not None:
+            setup()
+        func()
+
+        timings = []
+        counts = []
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            recorder = QueryRecorder(0)
+            with connection.execute_wrapper(recorder):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            counts.append(recorder.count)
+
+        timings.sort()
+        self.results[name] = {
+            "runs": len(timings),
+            "min_ms": round(timings[0] * 1000, 3),
+            "median_ms": round(statistics.median(timings) * 1000, 3),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+            "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+            "queries": max(counts),
+            "query_budget": queries,
+        }
+
+        if queries is not None:
+            assert max(counts) <= queries, f"{name} ran {max(counts)} queries, budget is {queries}"
+        return self.results[name]
+
+
+@pytest.fixture
+def bench(request):
+    config = request.config
+    return Benchmark(config.stash[results_key], config.getoption("--bench-repeat"))
+
+
+@pytest.fixture(scope="session")
+def bench_data(django_db_setup, django_db_blocker, pytestconfig):
+    # Committed to the test database, which is dropped after the session
+    scale = SCALES[pytestconfig.getoption("--bench-scale")]
+    with django_db_blocker.unblock():
+        creator = bench_user("creator")
+        viewer = bench_user("viewer")
+        recipe_ids = seed_recipes(creator, scale["recipes"])
+        seed_favourites(recipe_ids, scale["users"], scale["favourites_per_user"])
+    return {"creator": creator, "viewer": viewer, "recipe_ids": recipe_ids}
+
+
+@pytest.fixture
+def creator_client(bench_data):
+    return bench_client(bench_data["creator"])
+
+
+@pytest.fixture
+def viewer_client(bench_data):
+    return bench_client(bench_data["viewer"])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    results = config.stash[results_key]
+    if not results or hasattr(config, "workerinput"):
+        return
+
+    # Stable key order and no timestamps, so files diff cleanly
+    document = {
+        "meta": {
+            "commit": git_commit(),
+            "scale": config.getoption("--bench-scale"),
+            "repeat": config.getoption("--bench-repeat"),
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    with open(config.getoption("--bench-json"), "w") as output:
+        json.dump(document, output, indent=2, sort_keys=True)
+        output.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash[results_key]
+    if not results:
+        return
+
+    baseline = {}
+    if config.getoption("--bench-compare"):
+        with open(config.getoption("--bench-compare")) as previous:
+            baseline = json.load(previous)["results"]
+
+    terminalreporter.section("benchmarks")
+    for name, result in sorted(results.items()):
+        line = f"{name:<32} median {result['median_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  {result['queries']:3d} queries"
+        before = baseline.get(name)
+        if before:
+            change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100
+            line += f"  ({change:+.1f}% vs {before['median_ms']:.2f} ms, {before['queries']} queries)"
+        terminalreporter.write_line(line)
@@ -0,0 +1,73 @@
+from django.db import router, transaction
+from django.db.models import Exists, F, OuterRef
+
+from recipes.models import Recipe
+from .models import Favourite, lock_user_favourites
+from .signals import counts_adjusted_by_caller
+
+# Set-based favourite changes for many recipes at once. The per-row
+# receivers in signals.py are skipped, and Recipe.favourite_count is
+# adjusted here with one UPDATE per call. Favourite.save() takes the same
+# user lock before inserting and the API removes single favourites through
+# remove_favourites(), so the rows read as (not) favourited are exactly the
+# rows inserted or deleted.
+
+ADDED = "added"
+ALREADY_FAVOURITED = "already_favourited"
+REMOVED = "removed"
+NOT_FAVOURITED = "not_favourited"
+NOT_FOUND = "not_found"
+
+
+def _favourite_flags(user, recipe_ids, using):
+    # {recipe_id: favourited} for the recipes that exist. Locks the user's
+    # row first so the flags stay true until the transaction ends.
+    lock_user_favourites(user.pk, using)
+
+    favourites = Favourite.objects.filter(user_id=user.pk, recipe_id=OuterRef("pk"))
+    return dict(
+        Recipe.objects.using(using).filter(pk__in=recipe_ids)
+        .annotate(favourited=Exists(favourites))
+        .values_list("pk", "favourited")
+    )
+
+
+def add_favourites(user, recipe_ids):
+    # Favourite every existing recipe; returns {recipe_id: status} in the
+    # given order
+    using = router.db_for_write(Favourite)
+    with transaction.atomic(using=using):
+        flags = _favourite_flags(user, recipe_ids, using)
+        new = [pk for pk in recipe_ids if flags.get(pk) is False]
+
+        if new:
+            Favourite.objects.using(using).bulk_create(
+                [Favourite(user=user, recipe_id=pk) for pk in new], ignore_conflicts=True
+            )
+            Recipe.objects.using(using).filter(pk__in=new).update(favourite_count=F("favourite_count") + 1)
+
+    return {
+        pk: NOT_FOUND if pk not in flags else ALREADY_FAVOURITED if flags[pk] else ADDED
+        for pk in recipe_ids
+    }
+
+
+def remove_favourites(user, recipe_ids):
+    # Unfavourite the given recipes with one DELETE; returns
+    # {recipe_id: status} in the given order
+    using = router.db_for_write(Favourite)
+    with transaction.atomic(using=using):
+        flags = _favourite_flags(user, recipe_ids, using)
+        removed = [pk for pk in recipe_ids if flags.get(pk)]
+
+        if removed:
+            with counts_adjusted_by_caller():
+                Favourite.objects.using(using).filter(user_id=user.pk, recipe_id__in=removed).delete()
+            Recipe.objects.using(using).filter(pk__in=removed, favourite_count__gt=0).update(
+                favourite_count=F("favourite_count") - 1
+            )
+
+    return {
+        pk: NOT_FOUND if pk not in flags else REMOVED if flags[pk] else NOT_FAVOURITED
+        for pk in recipe_ids
+    }
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from favorites.models import Favourite
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Recount Recipe.favourite_count from the favourites table and fix drifted counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drifted counters",
+        )
+
+    def handle(self, *args, **options):
+        favourites = Favourite.objects.filter(
+            recipe_id=OuterRef("pk")
+        ).values("recipe_id").annotate(count=Count("*")).values("count")
+
+        drifted = Recipe.objects.annotate(
+            actual=Coalesce(Subquery(favourites), 0)
+        ).exclude(favourite_count=F("actual")).values_list("pk", "favourite_count", "actual")
+
+        fixed = 0
+        batch = []
+        for pk, stored, actual in drifted.iterator(chunk_size=options["batch_size"]):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"recipe {pk}: {stored} -> {actual}")
+            batch.append(pk)
+            fixed += 1
+
+            if len(batch) >= options["batch_size"] and not options["dry_run"]:
+                self.recount(batch, favourites)
+                batch = []
+
+        if batch and not options["dry_run"]:
+            self.recount(batch, favourites)
+
+        action = "Found" if options["dry_run"] else "Fixed"
+        self.stdout.write(f"{action} {fixed} drifted favourite counters")
+
+    def recount(self, recipe_ids, favourites):
+        # Recount inside the UPDATE so favourites added since the scan count
+        with transaction.atomic():
+            Recipe.objects.filter(pk__in=recipe_ids).update(
+                favourite_count=Coalesce(Subquery(favourites), 0)
+            )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.11 on 2026-10-18 19:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favorites', '0001_initial'),
+        ('recipes', '0006_recipe_favourite_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['created_at', 'recipe'], name='favourite_created_recipe_idx'),
+        ),
+    ]
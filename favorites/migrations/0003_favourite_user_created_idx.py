@@ -0,0 +1,20 @@
+# Generated by Django 5.2.11 on 2026-10-18 20:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favorites', '0002_favourite_favourite_created_recipe_idx'),
+        ('recipes', '0008_step_number_constraint_and_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='favourite_user_created_idx'),
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from recipes.models import Recipe
 
 
+def lock_user_favourites(user_id, using):
+    # Lock the user's row until the transaction ends, so changes to one
+    # user's favourites apply one at a time (favorites.bulk relies on it)
+    list(get_user_model().objects.using(using).select_for_update().filter(pk=user_id).values_list("pk"))
+
+
 class Favourite(models.Model):
     # Link favourite to a user
     user = models.ForeignKey(
@@ -25,6 +32,25 @@ class Favourite(models.Model):
         # Prevent duplicate favourites for same user & recipe
         unique_together = ("user", "recipe")
 
+        indexes = [
+            # Trending windows count recent favourites per recipe
+            models.Index(fields=["created_at", "recipe"], name="favourite_created_recipe_idx"),
+            # A user's favourites newest first, with the pk as the keyset
+            # pagination tie-breaker
+            models.Index(fields=["user", "created_at", "id"], name="favourite_user_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # New favourites wait for a bulk change of the same user to finish
+        # instead of slipping in after it read which recipes are favourited
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get("using") or router.db_for_write(Favourite, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            lock_user_favourites(self.user_id, using)
+            super().save(*args, **kwargs)
+
     def __str__(self):
         # Readable representation in admin
         return f"{self.user.username} -> {self.recipe.title}"
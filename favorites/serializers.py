@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from .models import Favourite
+
+
+class FavouriteSerializer(serializers.ModelSerializer):
+    # Favourites always belong to the requesting user
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+    class Meta:
+        model = Favourite
+        fields = ["id", "user", "recipe", "created_at"]
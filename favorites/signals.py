@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+import threading
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from recipes.models import Recipe
+from .models import Favourite
+
+
+# Recipe.favourite_count is adjusted in the same transaction as the
+# favourite row, with an UPDATE ... SET favourite_count = favourite_count +/- 1
+# so concurrent requests never overwrite each other. The API removes
+# favourites through favorites.bulk, which adjusts the count by the rows it
+# actually deleted; post_delete covers cascades (deleted users or recipes)
+# and other direct deletes.
+
+_bulk = threading.local()
+
+
+@contextmanager
+def counts_adjusted_by_caller():
+    # Skip the receivers below for favourites saved or deleted inside the
+    # block; favorites.bulk holds the user's lock and adjusts the counts of
+    # a whole batch with one UPDATE
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = False
+
+
+def _adjusted_by_caller():
+    return getattr(_bulk, "active", False)
+
+
+@receiver(post_save, sender=Favourite)
+def favourite_created(sender, instance, created=False, **kwargs):
+    if created and not _adjusted_by_caller():
+        Recipe.objects.filter(pk=instance.recipe_id).update(favourite_count=F("favourite_count") + 1)
+
+
+@receiver(post_delete, sender=Favourite)
+def favourite_deleted(sender, instance, **kwargs):
+    if _adjusted_by_caller():
+        return
+    Recipe.objects.filter(pk=instance.recipe_id, favourite_count__gt=0).update(
+        favourite_count=F("favourite_count") - 1
+    )
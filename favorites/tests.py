@@ -1,3 +1,267 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from .models import Favourite, lock_user_favourites
+from .views import FavouriteViewSet
+
+
+class FavouriteCountTests(TestCase):
+    # Recipe.favourite_count follows the favourites table
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewers = [
+            User.objects.create_user(username=f"viewer{i}", password="secret", role="viewer")
+            for i in range(3)
+        ]
+        cls.recipe = Recipe.objects.create(
+            title="Soup", description="Hot", prep_duration=5, cook_duration=10, created_by=cls.creator
+        )
+
+    def count(self):
+        self.recipe.refresh_from_db(fields=["favourite_count"])
+        return self.recipe.favourite_count
+
+    def test_create_and_delete_adjust_count(self):
+        favourites = [Favourite.objects.create(user=user, recipe=self.recipe) for user in self.viewers]
+        self.assertEqual(self.count(), 3)
+
+        favourites[0].delete()
+        self.assertEqual(self.count(), 2)
+
+    def test_cascade_delete_adjusts_count(self):
+        for user in self.viewers:
+            Favourite.objects.create(user=user, recipe=self.recipe)
+
+        self.viewers[0].delete()
+        self.assertEqual(self.count(), 2)
+
+    def test_reconcile_fixes_drift(self):
+        Favourite.objects.create(user=self.viewers[0], recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favourite_count=10)
+
+        call_command("reconcile_favourite_counts", stdout=StringIO())
+        self.assertEqual(self.count(), 1)
+
+
+class FavouriteRemovalTests(TestCase):
+    # Removing a favourite twice only counts it once
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.other = User.objects.create_user(username="other", password="secret", role="viewer")
+        cls.recipe = Recipe.objects.create(
+            title="Soup", description="", prep_duration=1, cook_duration=1, created_by=creator
+        )
+
+    def setUp(self):
+        self.favourite = Favourite.objects.create(user=self.viewer, recipe=self.recipe)
+        Favourite.objects.create(user=self.other, recipe=self.recipe)
+        self.client.force_authenticate(self.viewer)
+
+    def count(self):
+        self.recipe.refresh_from_db(fields=["favourite_count"])
+        return self.recipe.favourite_count
+
+    def test_unfavourite_twice(self):
+        url = f"/api/recipes/{self.recipe.pk}/unfavourite/"
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.count(), 1)
+
+    def test_delete_after_unfavourite(self):
+        # The favourites API looked the row up before another request removed it
+        with mock.patch.object(FavouriteViewSet, "get_object", return_value=self.favourite):
+            self.assertEqual(self.client.delete(f"/api/recipes/{self.recipe.pk}/unfavourite/").status_code, 204)
+            self.assertEqual(self.client.delete(f"/api/favorites/{self.favourite.pk}/").status_code, 204)
+        self.assertEqual(self.count(), 1)
+        self.assertTrue(Favourite.objects.filter(user=self.other).exists())
+
+
+class FavouriteLockTests(TestCase):
+    # Single favourite changes wait for bulk changes of the same user
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.recipe = Recipe.objects.create(
+            title="Soup", description="", prep_duration=1, cook_duration=1, created_by=creator
+        )
+
+    def locks(self, target):
+        # Users locked through target, with whether a transaction was open
+        calls = []
+
+        def lock(user_id, using):
+            calls.append((user_id, connection.in_atomic_block))
+
+        return calls, mock.patch(target, side_effect=lock)
+
+    def test_adding_and_removing_lock_the_user(self):
+        calls, patch = self.locks("favorites.models.lock_user_favourites")
+        with patch:
+            favourite = Favourite.objects.create(user=self.viewer, recipe=self.recipe)
+            favourite.save()
+        self.assertEqual(calls, [(self.viewer.pk, True)])
+
+        calls, patch = self.locks("favorites.bulk.lock_user_favourites")
+        with patch:
+            self.client.force_authenticate(self.viewer)
+            response = self.client.delete(f"/api/favorites/{favourite.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(calls, [(self.viewer.pk, True)])
+
+    def test_removals_look_the_favourite_up_under_the_lock(self):
+        Favourite.objects.create(user=self.viewer, recipe=self.recipe)
+        other = get_user_model().objects.create_user(username="other", password="secret", role="viewer")
+        Favourite.objects.create(user=other, recipe=self.recipe)
+        url = f"/api/recipes/{self.recipe.pk}/unfavourite/"
+        self.client.force_authenticate(self.viewer)
+        statuses = []
+        waiting = []
+
+        def first_request_wins(user_id, using):
+            # Another unfavourite of the same row held the lock and finished
+            # while this request waited for it
+            if not waiting:
+                waiting.append(user_id)
+                statuses.append(self.client.delete(url).status_code)
+            lock_user_favourites(user_id, using)
+
+        with mock.patch("favorites.bulk.lock_user_favourites", side_effect=first_request_wins):
+            statuses.append(self.client.delete(url).status_code)
+
+        self.assertEqual(statuses, [204, 400])
+        self.recipe.refresh_from_db(fields=["favourite_count"])
+        self.assertEqual(self.recipe.favourite_count, 1)
+
+
+class BulkFavouriteTests(TestCase):
+    # Many favourites changed in one request with per-id outcomes
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.other = User.objects.create_user(username="other", password="secret", role="viewer")
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Recipe {i}", description="", prep_duration=1, cook_duration=1, created_by=creator
+            )
+            for i in range(4)
+        ]
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[0])
+        Favourite.objects.create(user=cls.other, recipe=cls.recipes[1])
+
+    def setUp(self):
+        self.client.force_authenticate(self.viewer)
+
+    def post(self, action, ids):
+        response = self.client.post(f"/api/recipes/{action}/", {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return {result["id"]: result["status"] for result in response.json()["results"]}
+
+    def counts(self):
+        return list(Recipe.objects.filter(pk__in=[recipe.pk for recipe in self.recipes]).order_by("pk").values_list(
+            "favourite_count", flat=True
+        ))
+
+    def test_add_is_set_based(self):
+        ids = [recipe.pk for recipe in self.recipes[:3]] + [999999]
+
+        # savepoint, user lock, flags, insert, counts, release
+        with self.assertNumQueries(6):
+            statuses = self.post("bulk_favourite", ids + ids[:1])
+
+        self.assertEqual(statuses, {
+            ids[0]: "already_favourited", ids[1]: "added", ids[2]: "added", 999999: "not_found",
+        })
+        self.assertEqual(self.counts(), [1, 2, 1, 0])
+        self.assertEqual(Favourite.objects.filter(user=self.viewer).count(), 3)
+
+    def test_remove_is_set_based(self):
+        ids = [recipe.pk for recipe in self.recipes[:3]]
+
+        # savepoint, user lock, flags, select, delete, counts, release
+        with self.assertNumQueries(7):
+            statuses = self.post("bulk_unfavourite", ids)
+
+        self.assertEqual(statuses, {ids[0]: "removed", ids[1]: "not_favourited", ids[2]: "not_favourited"})
+        self.assertEqual(self.counts(), [0, 1, 0, 0])
+        self.assertTrue(Favourite.objects.filter(user=self.other).exists())
+
+    def test_validation(self):
+        response = self.client.post("/api/recipes/bulk_favourite/", {"ids": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(RECIPE_BATCH_MAX_IDS=2):
+            response = self.client.post("/api/recipes/bulk_favourite/", {"ids": [1, 2, 3]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(get_user_model().objects.get(username="creator"))
+        response = self.client.post("/api/recipes/bulk_favourite/", {"ids": [1]}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class FavouriteListTests(TestCase):
+    # The favourites API only exposes the requesting user's favourites
+    client_class = APIClient
+
+    def test_list_and_detail_are_scoped_to_the_user(self):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        other = User.objects.create_user(username="other", password="secret", role="viewer")
+        recipe = Recipe.objects.create(
+            title="Soup", description="", prep_duration=1, cook_duration=1, created_by=creator
+        )
+        own = Favourite.objects.create(user=viewer, recipe=recipe)
+        theirs = Favourite.objects.create(user=other, recipe=recipe)
+
+        self.client.force_authenticate(viewer)
+        response = self.client.get("/api/favorites/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.json()["results"]], [own.pk])
+
+        self.assertEqual(self.client.get(f"/api/favorites/{theirs.pk}/").status_code, 404)
+        self.assertEqual(self.client.delete(f"/api/favorites/{theirs.pk}/").status_code, 404)
+        self.assertTrue(Favourite.objects.filter(pk=theirs.pk).exists())
+
+    def test_favourites_cannot_be_moved_to_another_recipe(self):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        first, second = [
+            Recipe.objects.create(
+                title=title, description="", prep_duration=1, cook_duration=1, created_by=creator
+            )
+            for title in ("Soup", "Stew")
+        ]
+
+        self.client.force_authenticate(viewer)
+        response = self.client.post("/api/favorites/", {"recipe": first.pk}, format="json")
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/favorites/{response.json()['id']}/"
 
-# Create your tests here.
+        self.assertEqual(self.client.put(url, {"recipe": second.pk}, format="json").status_code, 405)
+        self.assertEqual(self.client.patch(url, {"recipe": second.pk}, format="json").status_code, 405)
+        self.assertEqual(
+            list(Recipe.objects.order_by("pk").values_list("favourite_count", flat=True)), [1, 0]
+        )
@@ -1,11 +1,34 @@
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from rest_framework.permissions import IsAuthenticated
+from .bulk import remove_favourites
 from .models import Favourite
+from .serializers import FavouriteSerializer
 
 
-class FavouriteViewSet(viewsets.ModelViewSet):
-    # ViewSet to manage favourite records
+class FavouriteViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    # ViewSet to add, list and remove favourites. There is no update: moving
+    # a favourite to another recipe would bypass the favourite_count receivers
     queryset = Favourite.objects.all()
+    serializer_class = FavouriteSerializer
 
     # Only authenticated users can access favourites
     permission_classes = [IsAuthenticated]
+
+    # Newest-first listing; also used as the keyset pagination key
+    ordering_fields = ["created_at"]
+    ordering = ["-created_at"]
+
+    def get_queryset(self):
+        # Users only see and change their own favourites
+        return Favourite.objects.filter(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        # Deleted under the user's lock with the count adjusted by what was
+        # deleted, as in RecipeViewSet.unfavourite
+        remove_favourites(self.request.user, [instance.recipe_id])
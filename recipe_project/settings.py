@@ -2,7 +2,9 @@
 Django settings for recipe_project project.
 """
 
+from importlib.util import find_spec
 from pathlib import Path
+import logging
 import os
 
 # Base directory of the project
@@ -51,11 +53,15 @@ INSTALLED_APPS = [
 # ------------------------------------------------------------------
 
 MIDDLEWARE = [
+    # First, so it times the rest of the stack too
+    'utils.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Keeps users on the primary database right after they wrote
+    'utils.middleware.PrimaryAfterWriteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,18 +94,88 @@ WSGI_APPLICATION = 'recipe_project.wsgi.application'
 # DATABASE CONFIGURATION
 # ------------------------------------------------------------------
 
-# PostgreSQL database configuration
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'recipe_db',
-        'USER': 'postgres',
-        'PASSWORD': 'Vaanara',
-        'HOST': '127.0.0.1',
-        'PORT': '5432',
-    }
+# PostgreSQL connection read from the environment; the defaults suit a
+# local development server
+DATABASE_CONNECTION = {
+    'ENGINE': 'django.db.backends.postgresql',
+    'NAME': os.environ.get('DATABASE_NAME', 'recipe_db'),
+    'USER': os.environ.get('DATABASE_USER', 'postgres'),
+    'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+    'HOST': os.environ.get('DATABASE_HOST', '127.0.0.1'),
+    'PORT': os.environ.get('DATABASE_PORT', '5432'),
+
+    # A reused connection is checked before a request gets it, so one the
+    # server dropped is replaced instead of failing the request
+    'CONN_HEALTH_CHECKS': True,
 }
 
+# With psycopg 3 and psycopg_pool installed (requirements.txt), each process
+# keeps a pool of open connections that requests borrow and return
+# (DATABASE_POOL=0 turns it off). Otherwise each request connects anew, unless
+# DATABASE_CONN_MAX_AGE lets each thread keep its connection that many
+# seconds. Only set it under WSGI: ASGI servers run the sync views on
+# threads that outlive requests, and Django requires persistent
+# connections to be disabled there.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '1') != '0' and find_spec('psycopg_pool') is not None
+if os.environ.get('DATABASE_POOL') == '1' and not DATABASE_POOL:
+    logging.getLogger(__name__).warning(
+        'DATABASE_POOL=1 but psycopg_pool is not installed; connecting per request. '
+        'Install requirements.txt (psycopg[binary,pool]).'
+    )
+if DATABASE_POOL:
+    from psycopg_pool import ConnectionPool
+
+    # Pooled connections are returned at the end of each request
+    DATABASE_CONNECTION['CONN_MAX_AGE'] = 0
+    DATABASE_CONNECTION['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', '10')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', '10')),
+            # Health check of each connection as it leaves the pool
+            'check': ConnectionPool.check_connection,
+        },
+    }
+else:
+    DATABASE_CONNECTION['CONN_MAX_AGE'] = int(os.environ.get('DATABASE_CONN_MAX_AGE', '0'))
+
+DATABASES = {'default': DATABASE_CONNECTION}
+
+# Read-only replicas of the primary as comma-separated host[:port] values,
+# added as "replica_1", "replica_2", ... Reads of the read-only
+# RecipeViewSet actions are spread over them (utils.routers); tests use the
+# primary instead.
+DATABASE_REPLICAS = []
+for number, address in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASE_CONNECTION,
+        'HOST': host,
+        'PORT': port or DATABASE_CONNECTION['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['utils.routers.ReplicaRouter']
+
+
+# DATABASE REPLICA SETTINGS
+# ------------------------------------------------------------------
+
+# Seconds a user's read-only requests stay on the primary after they wrote
+# something, so they see their own changes; keep it above the usual
+# replication lag. Tracked in the default cache, so use a shared one with
+# several processes.
+REPLICA_STICKY_SECONDS = 15
+
+# Replicas further behind the primary than this are skipped; with none
+# left, reads go to the primary
+REPLICA_MAX_LAG_SECONDS = 5
+
+# Seconds a process reuses a replica's measured lag before asking again
+REPLICA_LAG_CHECK_INTERVAL = 5
+
 
 # PASSWORD VALIDATION
 # ------------------------------------------------------------------
@@ -120,6 +196,31 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# PASSWORD HASHING & LOGIN SETTINGS
+# ------------------------------------------------------------------
+
+# New passwords use the first hasher; the others still verify older hashes,
+# which are re-hashed with the first one on the user's next login. Argon2 is
+# preferred when argon2-cffi is installed, scrypt (stdlib) otherwise; both
+# cost far less CPU per login than PBKDF2's default iteration count.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if find_spec('argon2') is not None:
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.Argon2PasswordHasher')
+
+# Password checks run on a bounded thread pool (accounts.backends)
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledModelBackend']
+
+# Threads hashing passwords at once, i.e. cores a login burst may use
+LOGIN_HASH_WORKERS = os.cpu_count() or 1
+
+# Logins allowed to wait for a hashing thread; more are answered with 503
+LOGIN_HASH_QUEUE = 32
+
+
 # INTERNATIONALIZATION
 # ------------------------------------------------------------------
 
@@ -138,6 +239,35 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Files only handed out by the API after a permission check (job inputs and
+# results); never below MEDIA_ROOT, so neither serve_media nor a front-end
+# server for MEDIA_URL exposes them
+PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'private_media')
+
+# Stream MEDIA_ROOT files from Django (utils.async_views.serve_media); turn
+# off when a front-end server or CDN serves MEDIA_URL
+SERVE_MEDIA = DEBUG
+
+# Storage backends (swap "recipe_pdfs" for any storage backend in production)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    # Rendered recipe PDFs cached by content hash
+    "recipe_pdfs": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": os.path.join(MEDIA_ROOT, "pdf_cache")},
+    },
+    # Uploaded import files and results of background jobs
+    "jobs": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": PRIVATE_MEDIA_ROOT},
+    },
+}
+
 
 # CUSTOM USER MODEL
 # ------------------------------------------------------------------
@@ -151,7 +281,7 @@ AUTH_USER_MODEL = "accounts.User"
 REST_FRAMEWORK = {
     # Token-based authentication
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "accounts.authentication.CachedTokenAuthentication",
     ],
 
     # Require authentication by default
@@ -159,8 +289,8 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
 
-    # Pagination configuration
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    # Pagination configuration (page numbers, or keyset with ?pagination=cursor)
+    "DEFAULT_PAGINATION_CLASS": "utils.pagination.PageOrCursorPagination",
     "PAGE_SIZE": 5,
 
     # Swagger / OpenAPI schema generation
@@ -172,9 +302,157 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ],
+
+    # Login attempts (accounts.throttles), checked before hashing. Counts
+    # live in the default cache, so use a shared one with several processes.
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": "30/min",
+        "login_username": "10/min",
+    },
 }
 
 
+# TOKEN AUTHENTICATION CACHE SETTINGS
+# ------------------------------------------------------------------
+
+# Seconds a token -> user lookup is reused by a process without asking the
+# database; also the longest a change made in another process goes unseen
+TOKEN_AUTH_CACHE_TTL = 30
+
+# Tokens kept per process
+TOKEN_AUTH_CACHE_SIZE = 10000
+
+# Optional CACHES alias shared by all processes (e.g. Redis), consulted on
+# local misses; None disables it
+TOKEN_AUTH_SHARED_CACHE = None
+TOKEN_AUTH_SHARED_CACHE_TTL = 300
+
+
+# Upper bound for the client-selectable ?page_size= parameter
+MAX_PAGE_SIZE = 100
+
+# Most recipe ids accepted by the batch fetch and bulk favourite endpoints
+RECIPE_BATCH_MAX_IDS = 100
+
+
+# RECIPE IMPORT SETTINGS
+# ------------------------------------------------------------------
+
+# Number of rows written per bulk_create batch during Excel imports
+RECIPE_IMPORT_CHUNK_SIZE = 1000
+
+# Maximum number of row errors returned in an import report
+RECIPE_IMPORT_MAX_REPORTED_ERRORS = 500
+
+
+# RECIPE CHANGE FEED SETTINGS
+# ------------------------------------------------------------------
+
+# Seconds the change feed stays behind the present, so changes still being
+# committed or replicated are not skipped; keep it above
+# REPLICA_MAX_LAG_SECONDS + REPLICA_LAG_CHECK_INTERVAL
+RECIPE_CHANGES_DELAY_SECONDS = 15
+
+# Changes per page unless ?limit= asks for fewer or more
+RECIPE_CHANGES_PAGE_SIZE = 100
+
+# Days tombstones of deleted recipes are kept (prune_recipe_tombstones).
+# Older change tokens are refused and their clients sync from the start.
+RECIPE_TOMBSTONE_RETENTION_DAYS = 30
+
+
+# RECIPE EXPORT SETTINGS
+# ------------------------------------------------------------------
+
+# Recipes (with their ingredients and steps) fetched per query during exports
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+
+# INGREDIENT CATALOGUE SETTINGS
+# ------------------------------------------------------------------
+
+# Ingredient name -> id lookups kept in each process's LRU cache
+INGREDIENT_CACHE_SIZE = 10000
+
+
+# RECIPE FINDER SETTINGS
+# ------------------------------------------------------------------
+
+# Minimum seconds between rebuilds of a process's ingredient index after
+# recipes were changed by another process
+RECIPE_FINDER_REBUILD_INTERVAL = 30
+
+
+# TRENDING SETTINGS
+# ------------------------------------------------------------------
+
+# Seconds a windowed (24h/7d/30d) most-favourited ranking is cached
+TRENDING_CACHE_SECONDS = 60
+
+
+# RESPONSE CACHE SETTINGS
+# ------------------------------------------------------------------
+
+# Seconds a recipe list/detail response is cached. Recipe edits retire
+# entries at once; this bounds changes that do not (e.g. username edits).
+# Entries live in the default cache, so use a shared backend (Redis,
+# Memcached) in production for edits to reach every process.
+RESPONSE_CACHE_TIMEOUT = 300
+
+
+# PDF EXPORT SETTINGS
+# ------------------------------------------------------------------
+
+# Bytes of a rendered PDF kept in memory before it is spooled to a
+# temporary file
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Most recipes one cookbook export may contain
+COOKBOOK_MAX_RECIPES = 500
+
+# Recipes loaded per query while a cookbook is laid out
+COOKBOOK_BATCH_SIZE = 50
+
+
+# RECIPE SEARCH SETTINGS
+# ------------------------------------------------------------------
+
+# PostgreSQL text search configuration used for stemming
+RECIPE_SEARCH_CONFIG = "english"
+
+# Result cap for the in-memory search fallback used on non-PostgreSQL databases
+RECIPE_SEARCH_MAX_RESULTS = 1000
+
+
+# BACKGROUND JOB SETTINGS
+# ------------------------------------------------------------------
+
+# Seconds an idle worker waits before polling the job table again
+JOB_POLL_INTERVAL_SECONDS = 1.0
+
+# Running jobs without a heartbeat for this long are requeued
+JOB_STALE_AFTER_SECONDS = 600
+
+
+# INSTRUMENTATION SETTINGS
+# ------------------------------------------------------------------
+
+# Clients allowed to scrape /metrics (Prometheus text format, per process)
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Requests taking at least this many milliseconds are logged to the
+# "utils.slow_requests" logger with their SQL; None disables the slow log
+SLOW_REQUEST_THRESHOLD_MS = None
+
+# SQL statements kept per request for the slow log
+SLOW_REQUEST_MAX_SQL = 50
+
+# Opt-in sampling profiler: while the slow log is on, every request's stack
+# is sampled at this interval and slow requests log their hottest stacks.
+# None disables it.
+SLOW_REQUEST_PROFILE_INTERVAL_MS = None
+
+
 # SWAGGER / API DOCUMENTATION SETTINGS
 # ------------------------------------------------------------------
 
@@ -1,9 +1,11 @@
 from django.conf import settings
-from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, include, re_path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from django.contrib import admin
 
+from utils.async_views import serve_media
+from utils.views import metrics
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -12,8 +14,14 @@ urlpatterns = [
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema")),
     path("api/accounts/", include("accounts.urls")),
     path("api/recipes/", include("recipes.urls")),
+    path("api/async/recipes/", include("recipes.async_urls")),
     path("api/favorites/", include("favorites.urls")),
+    path("api/jobs/", include("utils.urls")),
+
+    path("metrics", metrics, name="metrics"),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.SERVE_MEDIA:
+    urlpatterns.append(
+        re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", serve_media, name="media")
+    )
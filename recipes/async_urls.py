@@ -0,0 +1,19 @@
+from django.urls import path
+
+from .async_views import (
+    FavouriteView,
+    MyFavouritesView,
+    RecipeDetailView,
+    RecipeListView,
+    RecipePdfView,
+    UnfavouriteView,
+)
+
+urlpatterns = [
+    path("", RecipeListView.as_view(), name="async-recipes-list"),
+    path("my_favourites/", MyFavouritesView.as_view(), name="async-recipes-my-favourites"),
+    path("<int:pk>/", RecipeDetailView.as_view(), name="async-recipes-detail"),
+    path("<int:pk>/favourite/", FavouriteView.as_view(), name="async-recipes-favourite"),
+    path("<int:pk>/unfavourite/", UnfavouriteView.as_view(), name="async-recipes-unfavourite"),
+    path("<int:pk>/download_pdf/", RecipePdfView.as_view(), name="async-recipes-download-pdf"),
+]
@@ -0,0 +1,132 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from rest_framework import status
+from rest_framework.request import Request
+
+from favorites.bulk import NOT_FOUND, REMOVED, remove_favourites
+from favorites.models import Favourite
+from utils.async_views import AsyncAPIView, json_response, stream_file
+from utils.pagination import SizedPageNumberPagination
+from .models import Recipe
+from .pdf import pdf_cache
+from .views import RecipeViewSet
+
+
+# Async-native versions of the RecipeViewSet read paths and favourite
+# toggles, served under /api/async/recipes/. Querysets, filters and
+# serializers come from RecipeViewSet so responses match the DRF endpoints;
+# list pages are page-numbered only and skip the response cache.
+
+def recipe_viewset(request, action, **kwargs):
+    # RecipeViewSet bound to the request; building querysets with it does
+    # not touch the database
+    drf_request = Request(request)
+    drf_request.user = request.user
+    return RecipeViewSet(request=drf_request, action=action, format_kwarg=None, args=(), kwargs=kwargs)
+
+
+async def serialize(view, instance, many=False):
+    # Rendition URLs check storage, so serializers run in a worker thread
+    return await sync_to_async(lambda: view.get_serializer(instance, many=many).data)()
+
+
+async def get_recipe(view, pk):
+    try:
+        return await view.get_queryset().aget(pk=pk)
+    except Recipe.DoesNotExist:
+        raise Http404
+
+
+async def paginated(view, queryset):
+    paginator = SizedPageNumberPagination()
+    page = await paginator.apaginate_queryset(queryset, view.request, view=view)
+    return json_response(paginator.get_paginated_response(await serialize(view, page, many=True)).data)
+
+
+class RecipeListView(AsyncAPIView):
+    # GET: recipe cards with the list endpoint's filters, search, ordering
+    # and ?fields=/?expand=
+    async def get(self, request):
+        view = recipe_viewset(request, "list")
+
+        # Search backends may read the database while filtering
+        queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+        return await paginated(view, queryset)
+
+
+class RecipeDetailView(AsyncAPIView):
+    async def get(self, request, pk):
+        view = recipe_viewset(request, "retrieve", pk=pk)
+        return json_response(await serialize(view, await get_recipe(view, pk)))
+
+
+class MyFavouritesView(AsyncAPIView):
+    role = "viewer"
+
+    async def get(self, request):
+        view = recipe_viewset(request, "my_favourites")
+        return await paginated(view, view.get_favourites_queryset())
+
+
+class FavouriteView(AsyncAPIView):
+    role = "viewer"
+
+    async def post(self, request, pk):
+        if not await Recipe.objects.filter(pk=pk).aexists():
+            raise Http404
+
+        _, created = await Favourite.objects.aget_or_create(user=request.user, recipe_id=pk)
+        if created:
+            return json_response({"message": "Recipe added to favourites"}, status.HTTP_201_CREATED)
+        return json_response({"message": "Already in favourites"})
+
+
+class UnfavouriteView(AsyncAPIView):
+    role = "viewer"
+
+    async def delete(self, request, pk):
+        # Locked lookup and count update as in RecipeViewSet.unfavourite
+        removed = (await sync_to_async(remove_favourites)(request.user, [pk]))[pk]
+        if removed == NOT_FOUND:
+            raise Http404
+        if removed == REMOVED:
+            return json_response({"message": "Recipe removed from favourites"}, status.HTTP_204_NO_CONTENT)
+        return json_response({"message": "Recipe not in favourites"}, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipePdfView(AsyncAPIView):
+    # GET: the cached PDF, streamed from a worker thread chunk by chunk
+    role = "viewer"
+
+    async def get(self, request, pk):
+        view = recipe_viewset(request, "download_pdf", pk=pk)
+        recipe = await get_recipe(view, pk)
+
+        # Rendering on a miss and the storage lookups block
+        cached, last_modified = await sync_to_async(self.lookup)(recipe)
+        etag = quote_etag(cached.fingerprint)
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            await sync_to_async(cached.close, thread_sensitive=False)()
+            return not_modified
+
+        file, size = await sync_to_async(self.open)(cached)
+        response = StreamingHttpResponse(stream_file(file), content_type="application/pdf")
+        response["Content-Length"] = size
+        response["Content-Disposition"] = content_disposition_header(True, f"{recipe.title}.pdf")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    @staticmethod
+    def lookup(recipe):
+        cached = pdf_cache.get(recipe)
+        return cached, cached.last_modified.timestamp()
+
+    @staticmethod
+    def open(cached):
+        file = cached.open()
+        return file, file.size
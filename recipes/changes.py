@@ -0,0 +1,105 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from utils.batching import batches
+from .models import Recipe, RecipeTombstone
+
+# Recipe.updated_at and tombstones are written after the change committed
+# (record_changes), so a row never becomes visible with a time older than
+# changes already read. Feeds stop RECIPE_CHANGES_DELAY_SECONDS short of now
+# so writes still in flight, and replicas still catching up, are not passed.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class InvalidChangeToken(Exception):
+    # Raised for a ?since= token this feed did not hand out
+    pass
+
+
+class ChangeTokenExpired(Exception):
+    # Raised for a token older than the tombstones kept, whose client may
+    # have missed deletions and has to sync from the start
+    pass
+
+
+def record_changes(recipe_ids):
+    # Move changed recipes past every watermark handed out so far and leave
+    # tombstones for the ones that no longer exist. One UPDATE per 1000
+    # recipes, plus two queries for batches with deletions.
+    now = timezone.now()
+    for batch in batches(recipe_ids):
+        touched = Recipe.objects.filter(pk__in=batch).update(updated_at=now)
+        if touched < len(batch):
+            existing = set(Recipe.objects.filter(pk__in=batch).values_list("pk", flat=True))
+            RecipeTombstone.objects.bulk_create(
+                [RecipeTombstone(recipe_id=pk, deleted_at=now) for pk in batch if pk not in existing],
+                ignore_conflicts=True,
+            )
+
+
+def encode_token(changed_at, pk):
+    micros = (changed_at - EPOCH) // timedelta(microseconds=1)
+    return urlsafe_b64encode(f"{micros}:{pk}".encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    # (changed_at, pk) of the last change a client has seen
+    try:
+        micros, pk = urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split(":")
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError):
+        raise InvalidChangeToken("Invalid change token.") from None
+
+
+def _after(queryset, field, pk_field, position):
+    # Rows ordered after position in (field, pk) order; the range condition
+    # lets the (field, pk) index find the start
+    if position is None:
+        return queryset
+    changed_at, pk = position
+    return queryset.filter(**{f"{field}__gte": changed_at}).filter(
+        Q(**{f"{field}__gt": changed_at}) | Q(**{f"{pk_field}__gt": pk})
+    )
+
+
+def changes_since(recipes, token=None, limit=100):
+    # Up to limit changes after token, oldest first: (recipes changed,
+    # recipe ids deleted, token to resume from, whether more are waiting).
+    # recipes is the queryset changed recipes are read from, so callers
+    # choose related data to prefetch.
+    position = None
+    if token:
+        position = decode_token(token)
+        retention = timedelta(days=settings.RECIPE_TOMBSTONE_RETENTION_DAYS)
+        if position[0] < timezone.now() - retention:
+            # Tombstones this old may have been pruned
+            raise ChangeTokenExpired("Change token expired; sync again from the start.")
+
+    until = timezone.now() - timedelta(seconds=settings.RECIPE_CHANGES_DELAY_SECONDS)
+    updated = _after(recipes.filter(updated_at__lt=until), "updated_at", "pk", position)
+    deleted = _after(RecipeTombstone.objects.filter(deleted_at__lt=until), "deleted_at", "recipe_id", position)
+
+    merged = list(heapq.merge(
+        ((recipe.updated_at, recipe.pk, recipe) for recipe in updated.order_by("updated_at", "pk")[:limit + 1]),
+        ((tombstone.deleted_at, tombstone.recipe_id, None) for tombstone in deleted.order_by(
+            "deleted_at", "recipe_id"
+        ).only("deleted_at")[:limit + 1]),
+        key=lambda change: change[:2],
+    ))
+    page = merged[:limit]
+
+    if page:
+        token = encode_token(*page[-1][:2])
+    return (
+        [recipe for _, _, recipe in page if recipe is not None],
+        [pk for _, pk, recipe in page if recipe is None],
+        token or None,
+        len(merged) > limit,
+    )
@@ -0,0 +1,116 @@
+from django.conf import settings
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from collections import defaultdict
+from itertools import islice
+import csv
+import openpyxl
+
+from .importers import OPTIONAL_COLUMNS, REQUIRED_COLUMNS, is_formula_like
+from .models import Recipe, Step
+
+# Exports use the full import layout so files can be uploaded again
+EXPORT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Characters of CSV output collected before a chunk is sent
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def export_rows(queryset, chunk_size=None):
+    # One row per recipe in EXPORT_COLUMNS order. Recipes are read
+    # chunk_size at a time as plain tuples, with one query each for the
+    # chunk's ingredient names and steps, so memory does not grow with the
+    # number of rows.
+    chunk_size = chunk_size or settings.RECIPE_EXPORT_CHUNK_SIZE
+    recipes = queryset.values_list(
+        "id", "title", "description", "prep_duration", "cook_duration"
+    ).iterator(chunk_size=chunk_size)
+
+    while chunk := list(islice(recipes, chunk_size)):
+        ids = [row[0] for row in chunk]
+
+        ingredients = defaultdict(list)
+        links = Recipe.ingredients.through.objects.filter(recipe_id__in=ids)
+        for recipe_id, name in links.values_list("recipe_id", "ingredient__name").order_by("pk"):
+            ingredients[recipe_id].append(name)
+
+        steps = defaultdict(list)
+        for recipe_id, instruction in Step.objects.filter(recipe_id__in=ids).values_list(
+            "recipe_id", "instruction"
+        ).order_by("recipe_id", "step_number"):
+            # One line per step: line breaks inside an instruction are joined
+            steps[recipe_id].append(" ".join(instruction.splitlines()))
+
+        for recipe_id, *fields in chunk:
+            yield [*fields, _ingredients_cell(ingredients[recipe_id]), "\n".join(steps[recipe_id])]
+
+
+def _ingredients_cell(names):
+    # One name per line, so names may contain commas. A single name with a
+    # comma gets a trailing line break, or it would be read as a
+    # comma-separated list.
+    names = [" ".join(name.splitlines()) for name in names]
+    cell = "\n".join(names)
+    if len(names) == 1 and "," in cell:
+        cell += "\n"
+    return cell
+
+
+def _csv_value(value):
+    # Quote cells a spreadsheet would run as formulas (undone on import)
+    if is_formula_like(value):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    # File-like object returning what csv.writer writes to it
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    # CSV text in chunks of about CSV_CHUNK_SIZE characters for a
+    # StreamingHttpResponse; the byte order mark makes Excel read UTF-8
+    writer = csv.writer(_Echo())
+    lines = ["\ufeff", writer.writerow(EXPORT_COLUMNS)]
+    size = 0
+
+    for row in rows:
+        line = writer.writerow([_csv_value(value) for value in row])
+        lines.append(line)
+        size += len(line)
+        if size >= CSV_CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+            size = 0
+
+    if lines:
+        yield "".join(lines)
+
+
+def _xlsx_value(sheet, value):
+    if not isinstance(value, str):
+        return value
+
+    # Control characters are not allowed in workbooks, and text starting
+    # with "=" must stay text instead of becoming a formula
+    value = ILLEGAL_CHARACTERS_RE.sub("", value)
+    if value.startswith("="):
+        cell = WriteOnlyCell(sheet, value)
+        cell.data_type = "s"
+        return cell
+    return value
+
+
+def write_xlsx(rows, output):
+    # Write a workbook with openpyxl's write-only mode, which keeps rows in
+    # a temporary file until the workbook is saved to output
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Recipes")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append([_xlsx_value(sheet, value) for value in row])
+    workbook.save(output)
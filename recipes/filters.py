@@ -0,0 +1,31 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .search import get_search_backend
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    # Full-text search on ?q= ordered by relevance. ?search= is accepted as
+    # an alias for clients of the previous icontains SearchFilter.
+    search_params = ["q", "search"]
+
+    def get_search_text(self, request):
+        for param in self.search_params:
+            text = request.query_params.get(param, "").strip()
+            if text:
+                return text
+        return ""
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        if not text:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, text)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            "name": "q",
+            "required": False,
+            "in": "query",
+            "description": "Full-text search over title, description, ingredients and steps",
+            "schema": {"type": "string"},
+        }]
@@ -0,0 +1,154 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+import threading
+import time
+
+from django.conf import settings
+
+from utils.batching import batches
+from utils.cache import bump_generation, get_generation
+from .models import Recipe
+
+
+# Bumped after every change applied to the index. A process that sees a
+# value it did not produce itself has missed changes made elsewhere.
+GENERATION_KEY = "recipes:finder:generation"
+
+MATCH_ALL = "all"
+MATCH_ANY = "any"
+
+
+def _contains(posting, recipe_id):
+    index = bisect_left(posting, recipe_id)
+    return index < len(posting) and posting[index] == recipe_id
+
+
+class IngredientIndex:
+    # Inverted index of ingredient id -> sorted array of recipe ids, plus
+    # each recipe's ingredient ids, held in memory per process. Built on
+    # first use, updated incrementally from recipe_content_changed and
+    # rebuilt (at most every RECIPE_FINDER_REBUILD_INTERVAL seconds) when
+    # another process has changed recipes.
+    def __init__(self, using="default"):
+        self.using = using
+        self.lock = threading.RLock()
+        self.postings = None
+        self.recipes = {}
+        self.generation = None
+        self.built_at = 0.0
+
+    def links(self):
+        return Recipe.ingredients.through.objects.using(self.using)
+
+    def build(self):
+        # Read the generation first so changes made during the build are
+        # picked up by the next check
+        generation = get_generation(GENERATION_KEY)
+
+        postings = {}
+        recipes = {}
+        links = self.links().order_by("ingredient_id", "recipe_id").values_list("ingredient_id", "recipe_id")
+        for ingredient_id, recipe_id in links.iterator(chunk_size=10000):
+            if ingredient_id not in postings:
+                postings[ingredient_id] = array("q")
+            postings[ingredient_id].append(recipe_id)
+
+            if recipe_id not in recipes:
+                recipes[recipe_id] = array("q")
+            recipes[recipe_id].append(ingredient_id)
+
+        self.postings = postings
+        self.recipes = recipes
+        self.generation = generation
+        self.built_at = time.monotonic()
+
+    def ensure_current(self):
+        if self.postings is None:
+            self.build()
+        elif (
+            get_generation(GENERATION_KEY) != self.generation
+            and time.monotonic() - self.built_at >= settings.RECIPE_FINDER_REBUILD_INTERVAL
+        ):
+            self.build()
+
+    def update(self, recipe_ids):
+        # Re-read the ingredient links of the given recipes
+        generation = bump_generation(GENERATION_KEY)
+
+        with self.lock:
+            if self.postings is None:
+                return
+
+            # Only stay in sync if nobody else bumped since our last change
+            in_sync = generation == self.generation + 1
+
+            for batch in batches(set(recipe_ids)):
+                for recipe_id in batch:
+                    self.remove(recipe_id)
+
+                links = self.links().filter(recipe_id__in=batch).values_list("recipe_id", "ingredient_id")
+                for recipe_id, ingredient_id in links:
+                    if ingredient_id not in self.postings:
+                        self.postings[ingredient_id] = array("q")
+                    insort(self.postings[ingredient_id], recipe_id)
+
+                    if recipe_id not in self.recipes:
+                        self.recipes[recipe_id] = array("q")
+                    self.recipes[recipe_id].append(ingredient_id)
+
+            if in_sync:
+                self.generation = generation
+
+    def remove(self, recipe_id):
+        for ingredient_id in self.recipes.pop(recipe_id, ()):
+            posting = self.postings.get(ingredient_id)
+            if posting is None:
+                continue
+
+            index = bisect_left(posting, recipe_id)
+            if index < len(posting) and posting[index] == recipe_id:
+                del posting[index]
+            if not posting:
+                del self.postings[ingredient_id]
+
+    def find(self, ingredient_ids, match=MATCH_ANY, max_missing=None):
+        # (recipe_id, matched, total) for recipes using the given
+        # ingredients, best coverage first. MATCH_ALL keeps recipes that use
+        # every ingredient; max_missing drops recipes needing more than that
+        # many ingredients outside the given set.
+        ingredient_ids = set(ingredient_ids)
+        if not ingredient_ids:
+            return []
+
+        with self.lock:
+            self.ensure_current()
+            lists = [self.postings.get(ingredient_id, ()) for ingredient_id in ingredient_ids]
+
+            if match == MATCH_ALL:
+                if not all(lists):
+                    return []
+
+                # Walk the shortest list and binary-search the others
+                lists.sort(key=len)
+                matched = {
+                    recipe_id: len(lists)
+                    for recipe_id in lists[0]
+                    if all(_contains(posting, recipe_id) for posting in lists[1:])
+                }
+            else:
+                matched = Counter()
+                for posting in lists:
+                    matched.update(posting)
+
+            results = []
+            for recipe_id, count in matched.items():
+                total = len(self.recipes[recipe_id])
+                if max_missing is None or total - count <= max_missing:
+                    results.append((recipe_id, count, total))
+
+        results.sort(key=lambda result: (-result[1] / result[2], -result[1], -result[0]))
+        return results
+
+
+ingredient_index = IngredientIndex()
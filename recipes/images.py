@@ -0,0 +1,113 @@
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+import io
+import logging
+import posixpath
+
+from .models import Recipe, Ingredient, Step
+
+logger = logging.getLogger(__name__)
+
+
+# Fixed renditions generated for every uploaded image. Sizes are bounding
+# boxes; the aspect ratio of the original is preserved.
+RENDITIONS = {
+    # Rendered into PDFs at up to 200x150 points (2x for print sharpness)
+    "pdf": {"size": (400, 300), "format": "JPEG", "quality": 85},
+    # List/card images for API clients
+    "card": {"size": (320, 240), "format": "JPEG", "quality": 80},
+    "card_webp": {"size": (320, 240), "format": "WEBP", "quality": 75},
+}
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+# Image field of each model that gets renditions
+IMAGE_FIELDS = {Recipe: "thumbnail", Ingredient: "image", Step: "image"}
+
+
+def rendition_name(name, rendition):
+    # recipes/pizza.png -> recipes/renditions/pizza.png.card.jpg. Keeping the
+    # whole file name gives every stored original its own renditions.
+    directory, filename = posixpath.split(name)
+    extension = EXTENSIONS[RENDITIONS[rendition]["format"]]
+    return posixpath.join(directory, "renditions", f"{filename}.{rendition}.{extension}")
+
+
+def has_renditions(field_file):
+    # Generated renditions are recorded in the model's renditions_of field,
+    # so serializing an image never has to ask the storage
+    instance = getattr(field_file, "instance", None)
+    return bool(field_file.name) and getattr(instance, "renditions_of", "") == field_file.name
+
+
+def rendition_or_original(field_file, rendition):
+    # Name of the rendition, or of the original while it has none (uploaded
+    # before renditions were generated, or generation failed)
+    if has_renditions(field_file):
+        return rendition_name(field_file.name, rendition)
+    return field_file.name
+
+
+def rendition_url(field_file, rendition):
+    return field_file.storage.url(rendition_or_original(field_file, rendition))
+
+
+def pdf_source(field_file):
+    # Name of the file to embed in PDFs
+    return rendition_or_original(field_file, "pdf")
+
+
+def record_renditions(field_file):
+    # Mark the instance's current image as having every rendition, unless
+    # the image was replaced meanwhile
+    instance = field_file.instance
+    if instance.pk is None:
+        return
+    type(instance)._default_manager.filter(
+        pk=instance.pk, **{field_file.field.name: field_file.name}
+    ).update(renditions_of=field_file.name)
+    instance.renditions_of = field_file.name
+
+
+def generate_renditions(field_file, overwrite=False):
+    # Decode the original once, store every missing rendition and record
+    # them on the instance. Returns the number of renditions written.
+    if not field_file:
+        return 0
+    if has_renditions(field_file) and not overwrite:
+        return 0
+
+    storage = field_file.storage
+    names = {rendition: rendition_name(field_file.name, rendition) for rendition in RENDITIONS}
+    if not overwrite:
+        names = {rendition: name for rendition, name in names.items() if not storage.exists(name)}
+    if not names:
+        record_renditions(field_file)
+        return 0
+
+    largest = max(RENDITIONS[rendition]["size"] for rendition in names)
+
+    try:
+        with storage.open(field_file.name, "rb") as original:
+            image = Image.open(original)
+            # Let the JPEG decoder downscale while decoding
+            image.draft("RGB", (largest[0] * 2, largest[1] * 2))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, ValueError):
+        logger.warning("Could not generate renditions for %s", field_file.name, exc_info=True)
+        return 0
+
+    for rendition, name in names.items():
+        spec = RENDITIONS[rendition]
+        resized = image.copy()
+        resized.thumbnail(spec["size"], Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        resized.save(buffer, format=spec["format"], quality=spec["quality"], optimize=True)
+
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+
+    record_renditions(field_file)
+    return len(names)
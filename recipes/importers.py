@@ -0,0 +1,342 @@
+from django.conf import settings
+from django.db import DatabaseError, transaction
+import csv
+import io
+import openpyxl
+
+from .ingredients import ingredient_resolver
+from .models import Recipe, Ingredient, Step
+from .signals import mark_recipes_changed
+
+
+# Column layout expected in the first row of an import file
+REQUIRED_COLUMNS = ["title", "description", "prep_duration", "cook_duration"]
+
+# Columns that may follow the required ones, in this order: ingredient
+# names one per line (or comma-separated on a single line) and step
+# instructions one per line
+OPTIONAL_COLUMNS = ["ingredients", "steps"]
+
+# CSV cells starting with these are read as formulas by spreadsheets, so
+# exports prefix them with a quote that imports remove again
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def is_formula_like(value):
+    # Also true for text already starting with quotes before such a
+    # character, so escaping can always be undone exactly
+    return isinstance(value, str) and value.lstrip("'")[:1] in FORMULA_PREFIXES
+
+
+def unescape_formula(value):
+    if is_formula_like(value) and value.startswith("'"):
+        return value[1:]
+    return value
+
+
+class InvalidImportFile(Exception):
+    # Raised when the uploaded file cannot be read or has the wrong layout
+    pass
+
+
+def _check_columns(headers):
+    # The required columns, then a prefix of the optional ones
+    while headers and headers[-1] in (None, ""):
+        headers.pop()
+
+    layouts = [REQUIRED_COLUMNS + OPTIONAL_COLUMNS[:count] for count in range(len(OPTIONAL_COLUMNS) + 1)]
+    if headers not in layouts:
+        raise InvalidImportFile(
+            f"Columns must be {REQUIRED_COLUMNS}, optionally followed by {OPTIONAL_COLUMNS} in that order"
+        )
+    return headers
+
+
+def read_import_rows(file, name=None):
+    # Rows of a CSV file (by its .csv name) or an Excel workbook
+    name = name or getattr(file, "name", None) or ""
+    if str(name).lower().endswith(".csv"):
+        return read_csv_rows(file)
+    return read_excel_rows(file)
+
+
+def read_excel_rows(file):
+    # Open workbook in read-only mode so rows are streamed from the file
+    # instead of loading the whole sheet into memory
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise InvalidImportFile(str(e))
+
+    sheet = workbook.active
+    rows = sheet.iter_rows(values_only=True)
+
+    # Validate column headers before any data row is consumed
+    try:
+        headers = _check_columns(list(next(rows, None) or []))
+    except InvalidImportFile:
+        workbook.close()
+        raise
+
+    return ExcelRows(workbook, rows, sheet.max_row, columns=headers)
+
+
+def read_csv_rows(file):
+    # Stream rows of a UTF-8 CSV file (with or without a byte order mark),
+    # given as a path or a binary file object
+    if isinstance(file, str):
+        text = open(file, encoding="utf-8-sig", newline="")
+    else:
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    rows = csv.reader(text)
+
+    try:
+        headers = _check_columns(list(next(rows, None) or []))
+    except (InvalidImportFile, UnicodeDecodeError, csv.Error) as e:
+        CsvRows(text, rows, owned=isinstance(file, str)).close()
+        raise InvalidImportFile(str(e))
+
+    return CsvRows(text, rows, owned=isinstance(file, str), columns=headers)
+
+
+class ExcelRows:
+    # Iterable of (row_number, values) pairs streamed from a workbook
+    def __init__(self, workbook, rows, max_row=None, columns=None):
+        self.workbook = workbook
+        self.rows = rows
+        self.columns = columns or REQUIRED_COLUMNS
+
+        # Row count declared by the sheet (excluding headers), if any
+        self.total = max_row - 1 if max_row else None
+
+    def __iter__(self):
+        # Skip blank rows and close the workbook once exhausted
+        try:
+            for row_number, row in enumerate(self.rows, start=2):
+                if not row or all(value is None for value in row):
+                    continue
+                yield row_number, row
+        finally:
+            self.close()
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvRows(ExcelRows):
+    # ExcelRows over a CSV reader; the row count is unknown up front
+    def __init__(self, text, rows, owned, columns=None):
+        super().__init__(None, rows, columns=columns)
+        self.text = text
+        self.owned = owned
+
+    def __iter__(self):
+        # Bytes that are not UTF-8, or broken quoting, past the header end
+        # the file; rows read before stay valid
+        try:
+            for row_number, row in super().__iter__():
+                yield row_number, [unescape_formula(value) for value in row]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise InvalidImportFile(f"File is unreadable after line {self.rows.line_num}: {e}") from None
+
+    def close(self):
+        # Uploaded files stay open for their owner (e.g. to be re-read)
+        if self.owned:
+            self.text.close()
+        elif not self.text.closed:
+            self.text.detach()
+
+
+def _clean_text(value, max_length=None):
+    # Text cells must be present and non-blank
+    if value is None or not str(value).strip():
+        raise ValueError("This field is required.")
+
+    value = str(value).strip()
+    if max_length and len(value) > max_length:
+        raise ValueError(f"Ensure this field has no more than {max_length} characters.")
+    return value
+
+
+def _clean_duration(value):
+    # Durations are whole, non-negative numbers of minutes
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError("This field is required.")
+
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("A valid integer is required.")
+
+    if not number.is_integer():
+        raise ValueError("A valid integer is required.")
+    if number < 0:
+        raise ValueError("Ensure this value is greater than or equal to 0.")
+    return int(number)
+
+
+def _clean_names(value):
+    # Ingredient names one per line, or comma-separated when the cell is a
+    # single line; the cell may be empty
+    if value is None:
+        return []
+
+    value = str(value)
+    separated = value.splitlines() if "\n" in value or "\r" in value else value.split(",")
+    names = [name.strip() for name in separated if name.strip()]
+    for name in names:
+        if len(name) > 255:
+            raise ValueError("Ensure each ingredient has no more than 255 characters.")
+    return names
+
+
+def _clean_steps(value):
+    # Step instructions one per line, numbered in order; the cell may be empty
+    if value is None:
+        return []
+    return [line.strip() for line in str(value).splitlines() if line.strip()]
+
+
+def clean_row(row, columns=REQUIRED_COLUMNS):
+    # Validate a single data row, returning (values, errors)
+    row = tuple(row) + (None,) * (len(columns) - len(row))
+    cleaners = {
+        "title": lambda value: _clean_text(value, max_length=255),
+        "description": _clean_text,
+        "prep_duration": _clean_duration,
+        "cook_duration": _clean_duration,
+        "ingredients": _clean_names,
+        "steps": _clean_steps,
+    }
+
+    values = {}
+    errors = {}
+    for column, value in zip(columns, row):
+        try:
+            values[column] = cleaners[column](value)
+        except ValueError as e:
+            errors[column] = str(e)
+
+    return values, errors
+
+
+class ImportReport:
+    # Collects per-row outcome of an import run
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+        # Why reading stopped before the end of the file, if it did
+        self.file_error = None
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    @property
+    def errors_truncated(self):
+        return len(self.errors) < self.failed
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+            "file_error": self.file_error,
+        }
+
+
+class RecipeImporter:
+    # Streams validated rows into the database in fixed-size batches
+    def __init__(self, created_by, chunk_size=None, max_errors=None):
+        self.created_by = created_by
+        self.chunk_size = chunk_size or settings.RECIPE_IMPORT_CHUNK_SIZE
+        if max_errors is None:
+            max_errors = settings.RECIPE_IMPORT_MAX_REPORTED_ERRORS
+        self.max_errors = max_errors
+
+    def run(self, rows, progress=None):
+        report = ImportReport(max_errors=self.max_errors)
+        columns = getattr(rows, "columns", REQUIRED_COLUMNS)
+        chunk = []
+
+        try:
+            for row_number, row in rows:
+                report.processed += 1
+                values, errors = clean_row(row, columns)
+
+                if errors:
+                    report.add_error(row_number, errors)
+                    continue
+
+                names = values.pop("ingredients", [])
+                steps = values.pop("steps", [])
+                chunk.append((row_number, Recipe(created_by=self.created_by, **values), names, steps))
+                if len(chunk) >= self.chunk_size:
+                    self._flush(chunk, report)
+                    chunk = []
+                    if progress:
+                        progress(report)
+        except InvalidImportFile as e:
+            # Earlier chunks are committed, so report instead of failing
+            report.file_error = str(e)
+
+        if chunk:
+            self._flush(chunk, report)
+        if progress:
+            progress(report)
+
+        return report
+
+    def _flush(self, chunk, report):
+        # Each chunk is written inside its own savepoint so a failing batch
+        # never rolls back rows that were already imported
+        try:
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create([recipe for _, recipe, _, _ in chunk])
+                self._save_related(chunk)
+
+                # bulk_create does not send post_save
+                mark_recipes_changed(recipe.pk for recipe in recipes)
+            report.created += len(chunk)
+        except DatabaseError:
+            # Retry row by row to pinpoint the rows the database rejected
+            for row_number, recipe, names, steps in chunk:
+                recipe.pk = None
+                try:
+                    with transaction.atomic():
+                        recipe.save(force_insert=True)
+                        self._save_related([(row_number, recipe, names, steps)])
+                    report.created += 1
+                except DatabaseError as e:
+                    report.add_error(row_number, {"non_field_errors": str(e)})
+
+    def _save_related(self, chunk):
+        # Resolve every name in the chunk at once and insert all links, then
+        # all steps, with one insert each
+        ids = ingredient_resolver.resolve(name for _, _, names, _ in chunk for name in names)
+
+        Link = Recipe.ingredients.through
+        pairs = dict.fromkeys(
+            (recipe.pk, ids[Ingredient.normalize(name)])
+            for _, recipe, names, _ in chunk
+            for name in names
+        )
+        Link.objects.bulk_create(
+            [Link(recipe_id=recipe_id, ingredient_id=ingredient_id) for recipe_id, ingredient_id in pairs],
+            batch_size=1000,
+        )
+
+        steps = [
+            Step(recipe=recipe, step_number=number, instruction=instruction)
+            for _, recipe, _, instructions in chunk
+            for number, instruction in enumerate(instructions, start=1)
+        ]
+        if steps:
+            Step.objects.bulk_create(steps, batch_size=1000)
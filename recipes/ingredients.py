@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from utils.batching import batches
+from utils.cache import get_generation
+from .models import Ingredient
+
+
+# Bumped whenever an existing ingredient is renamed or deleted. Resolvers
+# drop their cached ids when they see a new value, so with a shared cache
+# backend the invalidation reaches every process.
+GENERATION_KEY = "recipes:ingredients:generation"
+
+
+class IngredientResolver:
+    # Maps ingredient names to catalogue ids. Known names are answered from
+    # a per-process LRU of normalized name -> id; misses cost one lookup
+    # query plus one bulk insert for names that are not in the catalogue.
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.ids = OrderedDict()
+        self.generation = None
+
+    def resolve(self, names):
+        # {normalized name: ingredient id} for every given name
+        wanted = {}
+        for name in names:
+            wanted.setdefault(Ingredient.normalize(name), name)
+
+        resolved = self.cached(wanted)
+        missing = {key: name for key, name in wanted.items() if key not in resolved}
+        if missing:
+            loaded = self.load(missing)
+            resolved.update(loaded)
+
+            # Ids inserted by a transaction that rolls back must not be reused
+            transaction.on_commit(lambda: self.remember(loaded))
+
+        return resolved
+
+    def cached(self, wanted):
+        with self.lock:
+            generation = get_generation(GENERATION_KEY)
+            if generation != self.generation:
+                self.ids.clear()
+                self.generation = generation
+
+            resolved = {}
+            for key in wanted:
+                if key in self.ids:
+                    self.ids.move_to_end(key)
+                    resolved[key] = self.ids[key]
+            return resolved
+
+    def load(self, names):
+        # Read existing rows, insert the missing ones and read those back
+        # (rows inserted with ignore_conflicts come back without ids, and a
+        # concurrent writer may have inserted the same name first)
+        ids = {}
+        for batch in batches(names):
+            ids.update(
+                Ingredient.objects.filter(normalized_name__in=batch).values_list("normalized_name", "pk")
+            )
+
+        new = [Ingredient(name=names[key], normalized_name=key) for key in names if key not in ids]
+        if new:
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True, batch_size=1000)
+            for batch in batches(ingredient.normalized_name for ingredient in new):
+                ids.update(
+                    Ingredient.objects.filter(normalized_name__in=batch).values_list("normalized_name", "pk")
+                )
+
+        return ids
+
+    def remember(self, ids):
+        max_size = self.max_size or settings.INGREDIENT_CACHE_SIZE
+        with self.lock:
+            self.ids.update(ids)
+            for key in ids:
+                self.ids.move_to_end(key)
+            while len(self.ids) > max_size:
+                self.ids.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+
+ingredient_resolver = IngredientResolver()
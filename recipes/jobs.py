@@ -0,0 +1,38 @@
+from django.core.files import File
+
+from utils.jobs import register
+from .importers import RecipeImporter, read_import_rows
+from .models import Recipe
+from .pdf import pdf_cache
+
+
+@register("recipes.import", retry=False)
+def import_recipes(job, progress):
+    # Background variant of RecipeViewSet.bulk_upload. Chunks commit as they
+    # go, so a rerun would import them again.
+    with job.input_file.open("rb") as file:
+        rows = read_import_rows(file, name=job.input_file.name)
+        progress.update(0, total=rows.total)
+
+        report = RecipeImporter(created_by=job.created_by).run(
+            rows,
+            progress=lambda report: progress.update(report.processed),
+        )
+
+    return report.to_dict()
+
+
+@register("recipes.pdf")
+def render_recipe_pdf(job, progress):
+    # Background variant of RecipeViewSet.download_pdf
+    recipe = Recipe.objects.prefetch_related("ingredients", "steps").get(
+        pk=job.payload["recipe_id"]
+    )
+
+    # Reuse the rendered PDF cache shared with download_pdf. Titles are not
+    # safe storage names, so the title only names the download.
+    with pdf_cache.get(recipe).open() as pdf:
+        job.result_file.save(f"recipe-{recipe.pk}.pdf", File(pdf), save=False)
+    progress.update(1, total=1)
+
+    return {"recipe_id": recipe.pk, "filename": f"{recipe.title}.pdf"}
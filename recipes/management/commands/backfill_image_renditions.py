@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import IMAGE_FIELDS, generate_renditions
+from recipes.models import Recipe
+from recipes.pdf import pdf_cache
+from recipes.signals import RESPONSES_GENERATION_KEY
+from utils.cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = "Generate missing image renditions for existing recipes, ingredients and steps"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate renditions that already exist",
+        )
+
+    def handle(self, *args, **options):
+        total_written = 0
+
+        for model, field in IMAGE_FIELDS.items():
+            images = 0
+            written = 0
+
+            queryset = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            for instance in queryset.only("pk", field, "renditions_of").iterator(chunk_size=500):
+                images += 1
+                written += generate_renditions(getattr(instance, field), overwrite=options["force"])
+
+            total_written += written
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: {images} images, {written} renditions written"
+            )
+
+        # Cached PDFs embed the originals and cached responses link to them
+        # until they are re-rendered
+        if total_written:
+            pdf_cache.invalidate(Recipe.objects.values_list("pk", flat=True).iterator())
+            bump_generation(RESPONSES_GENERATION_KEY)
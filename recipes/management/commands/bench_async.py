@@ -0,0 +1,144 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from favorites.models import Favourite
+from recipes.models import Ingredient, Recipe
+from recipes.pdf import pdf_cache
+from utils.benchmarking import (
+    allow_test_host, bench_user, create_sample_recipe, seed_recipes, temporary_media, wsgi_get
+)
+
+
+async def asgi_get(application, url, token):
+    # One request through the ASGI application, as an ASGI server makes it
+    parts = urlsplit(url)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": [(b"host", b"testserver"), (b"authorization", f"Token {token}".encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    received = asyncio.Event()
+    result = {"size": 0}
+
+    async def receive():
+        # The body, then nothing: the client never disconnects
+        if received.is_set():
+            await asyncio.Future()
+        received.set()
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            result["size"] += len(message.get("body", b""))
+
+    await application(scope, receive, send)
+    return result["status"], result["size"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent throughput of the async (ASGI) read paths against the DRF views under WSGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=2000)
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument(
+            "--response-cache",
+            action="store_true",
+            help="Let the DRF list/detail use the response cache (the async views have none)",
+        )
+
+    def handle(self, *args, **options):
+        allow_test_host()
+
+        # Requests are served by other threads and connections, so the data
+        # is committed and removed afterwards instead of rolled back
+        creator = bench_user("creator")
+        viewer = bench_user("viewer")
+        token = Token.objects.get_or_create(user=viewer)[0].key
+        recipe_ids = seed_recipes(creator, options["recipes"])
+
+        try:
+            Favourite.objects.bulk_create(Favourite(user=viewer, recipe_id=pk) for pk in recipe_ids[:50])
+            cache_timeout = {} if options["response_cache"] else {"RESPONSE_CACHE_TIMEOUT": 0}
+
+            with temporary_media(), override_settings(**cache_timeout):
+                pdf_recipe = create_sample_recipe(creator)
+                pdf_cache.get(Recipe.objects.get(pk=pdf_recipe.pk)).close()
+
+                endpoints = {
+                    "list": "recipes/?page_size=20&page=3",
+                    "retrieve": f"recipes/{recipe_ids[0]}/",
+                    "my_favourites": "recipes/my_favourites/?page_size=20",
+                    "download_pdf": f"recipes/{pdf_recipe.pk}/download_pdf/",
+                }
+                for name, path in endpoints.items():
+                    self.compare(name, path, token, options["requests"], options["concurrency"])
+        finally:
+            # Every ingredient of the bench recipes was created by this run
+            ingredient_ids = list(
+                Ingredient.objects.filter(recipe__created_by=creator).values_list("pk", flat=True).distinct()
+            )
+            Recipe.objects.filter(created_by=creator).delete()
+            Ingredient.objects.filter(pk__in=ingredient_ids).delete()
+
+    def compare(self, name, path, token, requests, concurrency):
+        wsgi = get_wsgi_application()
+        asgi = get_asgi_application()
+
+        def timed_wsgi(_):
+            start = time.perf_counter()
+            status, _ = wsgi_get(wsgi, f"/api/{path}", token)
+            assert status.startswith("200"), status
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            sync_latencies = list(pool.map(timed_wsgi, range(requests)))
+            sync_elapsed = time.perf_counter() - start
+
+        async def run_asgi():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def timed_asgi():
+                async with slots:
+                    start = time.perf_counter()
+                    status, _ = await asgi_get(asgi, f"/api/async/{path}", token)
+                    assert status == 200, status
+                    return time.perf_counter() - start
+
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(timed_asgi() for _ in range(requests)))
+            return latencies, time.perf_counter() - start
+
+        async_latencies, async_elapsed = asyncio.run(run_asgi())
+
+        for label, latencies, elapsed in (
+            ("WSGI (DRF)", sync_latencies, sync_elapsed),
+            ("ASGI (async)", async_latencies, async_elapsed),
+        ):
+            latencies = sorted(latencies)
+            self.stdout.write(
+                f"{name:>14} {label:>13}: {requests / elapsed:8.1f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms"
+            )
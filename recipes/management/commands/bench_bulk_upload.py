@@ -0,0 +1,83 @@
+import tempfile
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+import openpyxl
+
+from recipes.importers import REQUIRED_COLUMNS, RecipeImporter, read_excel_rows
+from recipes.models import Recipe
+from utils.benchmarking import Timer, bench_user, rolled_back
+
+
+def write_workbook(path, rows):
+    # Generate an import file using openpyxl's streaming writer
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(REQUIRED_COLUMNS)
+    for i in range(rows):
+        sheet.append([f"Recipe {i}", f"Description for recipe {i}", i % 60, i % 120])
+    workbook.save(path)
+
+
+def legacy_import(path, user):
+    # Previous implementation: full workbook load and one INSERT per row
+    workbook = openpyxl.load_workbook(path)
+    rows = list(workbook.active.iter_rows(values_only=True))
+    for row in rows[1:]:
+        Recipe.objects.create(
+            title=row[0],
+            description=row[1],
+            prep_duration=int(row[2]),
+            cook_duration=int(row[3]),
+            created_by=user
+        )
+    return len(rows) - 1
+
+
+def streaming_import(path, user, chunk_size):
+    report = RecipeImporter(created_by=user, chunk_size=chunk_size).run(read_excel_rows(path))
+    return report.created
+
+
+class Command(BaseCommand):
+    help = "Benchmark Excel bulk upload throughput and peak memory (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument(
+            "--compare-legacy",
+            action="store_true",
+            help="Also run the previous load-everything, row-by-row importer",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+            write_workbook(tmp.name, rows)
+
+            runners = [("streaming", lambda user: streaming_import(tmp.name, user, options["chunk_size"]))]
+            if options["compare_legacy"]:
+                runners.append(("legacy", lambda user: legacy_import(tmp.name, user)))
+
+            for name, runner in runners:
+                # Timing pass without tracemalloc overhead
+                with rolled_back():
+                    user = bench_user()
+                    with Timer() as timer:
+                        created = runner(user)
+
+                # Separate pass to record peak Python heap usage
+                with rolled_back():
+                    user = bench_user()
+                    tracemalloc.start()
+                    runner(user)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                self.stdout.write(
+                    f"{name}: {created} rows in {timer.elapsed:.2f}s "
+                    f"({created / timer.elapsed:.0f} rows/sec), "
+                    f"peak memory {peak / (1024 * 1024):.1f} MiB"
+                )
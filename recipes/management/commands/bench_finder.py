@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from recipes.finder import MATCH_ALL, MATCH_ANY, IngredientIndex
+from recipes.models import Recipe
+from utils.benchmarking import Timer, bench_user, rolled_back, seed_recipes
+
+
+class Command(BaseCommand):
+    help = "Benchmark the ingredient finder index against GROUP BY joins on the link table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100000)
+        parser.add_argument("--catalogue", type=int, default=2000)
+        parser.add_argument("--ingredients", type=int, default=3, help="Ingredients per query")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.stdout.write(f"Seeding {options['recipes']} recipes...")
+            recipe_ids = seed_recipes(
+                bench_user("creator"),
+                options["recipes"],
+                ingredients_per_recipe=8,
+                steps_per_recipe=0,
+                catalogue_size=options["catalogue"],
+            )
+
+            index = IngredientIndex()
+            with Timer() as timer:
+                index.build()
+            self.stdout.write(f"index built in {timer.elapsed:.2f}s")
+
+            # Part of one recipe's ingredient list, so every mode has results
+            Link = Recipe.ingredients.through
+            wanted = list(
+                Link.objects.filter(recipe_id=recipe_ids[0]).order_by("ingredient_id")
+                .values_list("ingredient_id", flat=True)[:options["ingredients"]]
+            )
+
+            def sql(match, max_missing=None):
+                totals = Link.objects.filter(recipe_id__in=Link.objects.filter(
+                    ingredient_id__in=wanted
+                ).values("recipe_id")).values("recipe_id").annotate(total=Count("*"))
+                matched = Link.objects.filter(ingredient_id__in=wanted).values("recipe_id").annotate(
+                    matched=Count("*")
+                )
+                if match == MATCH_ALL:
+                    matched = matched.filter(matched=len(wanted))
+                matched = dict(matched.values_list("recipe_id", "matched"))
+                totals = dict(totals.values_list("recipe_id", "total"))
+                return [
+                    (recipe_id, count, totals[recipe_id])
+                    for recipe_id, count in matched.items()
+                    if max_missing is None or totals[recipe_id] - count <= max_missing
+                ]
+
+            cases = {
+                "any": {"match": MATCH_ANY},
+                "all": {"match": MATCH_ALL},
+                "missing<=5": {"match": MATCH_ANY, "max_missing": 5},
+            }
+            for name, kwargs in cases.items():
+                timings = {}
+                for strategy, run in [("sql", sql), ("index", lambda **kw: index.find(wanted, **kw))]:
+                    best = None
+                    for _ in range(options["repeat"]):
+                        with Timer() as timer:
+                            results = run(**kwargs)
+                        best = timer.elapsed if best is None else min(best, timer.elapsed)
+                    timings[strategy] = (best, len(results))
+
+                self.stdout.write(
+                    f"{name:>11}: "
+                    + " | ".join(
+                        f"{strategy} {elapsed * 1000:.1f} ms ({count} recipes)"
+                        for strategy, (elapsed, count) in timings.items()
+                    )
+                )
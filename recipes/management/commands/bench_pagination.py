@@ -0,0 +1,63 @@
+import base64
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Recipe
+from recipes.views import RecipeViewSet
+from utils.benchmarking import Timer, allow_test_host, bench_user, rolled_back, seed_recipes
+
+
+def cursor_for(recipe):
+    # Cursor positioned just after recipe for the default "-pk" ordering
+    encoded = json.dumps({"pk": recipe.pk, "r": False}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(encoded.encode()).decode().rstrip("=")
+
+
+class Command(BaseCommand):
+    help = "Benchmark page latency at increasing depth for page-number vs keyset pagination"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=200000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        view = RecipeViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        allow_test_host()
+
+        with rolled_back():
+            viewer = bench_user("viewer")
+            seed_recipes(bench_user("creator"), options["recipes"], ingredients_per_recipe=0, steps_per_recipe=0)
+
+            def timed(url):
+                timings = []
+                for _ in range(options["repeat"]):
+                    request = factory.get(url)
+                    force_authenticate(request, user=viewer)
+                    with Timer() as timer:
+                        view(request).render()
+                    timings.append(timer.elapsed)
+                timings.sort()
+                return timings[len(timings) // 2] * 1000
+
+            depth = 1
+            while depth * page_size <= options["recipes"]:
+                offset = (depth - 1) * page_size
+                base = f"/api/recipes/?fields=id,title&page_size={page_size}"
+
+                page_number = timed(f"{base}&page={depth}")
+                if offset:
+                    anchor = Recipe.objects.order_by("-pk")[offset - 1]
+                    keyset = timed(f"{base}&cursor={cursor_for(anchor)}")
+                else:
+                    keyset = timed(f"{base}&pagination=cursor")
+
+                self.stdout.write(
+                    f"page {depth:>7} (offset {offset:>8}): "
+                    f"page-number {page_number:8.1f} ms | keyset {keyset:8.1f} ms"
+                )
+                depth *= 10
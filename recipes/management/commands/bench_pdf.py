@@ -0,0 +1,75 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.pdf import pdf_cache
+from utils.benchmarking import (
+    Timer, bench_client, bench_user, create_sample_recipe, rolled_back, seed_recipes, temporary_media,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark download_pdf latency with a cold and a warm PDF cache, and a cookbook export"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument("--cookbook-recipes", type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+
+        with temporary_media(), rolled_back():
+            recipe = create_sample_recipe(bench_user("creator"))
+            client = bench_client(bench_user("viewer"))
+            url = f"/api/recipes/{recipe.pk}/download_pdf/"
+
+            def request(**headers):
+                with Timer() as timer:
+                    response = client.get(url, **headers)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                return timer.elapsed, response
+
+            cold = []
+            for _ in range(iterations):
+                pdf_cache.invalidate([recipe.pk])
+                elapsed, _ = request()
+                cold.append(elapsed)
+
+            warm = [request()[0] for _ in range(iterations)]
+
+            _, response = request()
+            revalidated = [
+                request(HTTP_IF_NONE_MATCH=response["ETag"])[0] for _ in range(iterations)
+            ]
+
+            # Seeded recipes share the sample thumbnail, embedded once
+            creator = bench_user("creator")
+            recipe_ids = seed_recipes(creator, options["cookbook_recipes"])
+            Recipe.objects.filter(pk__in=recipe_ids).update(thumbnail=recipe.thumbnail.name)
+
+            def export_cookbook():
+                response = client.get("/api/recipes/cookbook/?ordering=-prep_duration")
+                return sum(len(chunk) for chunk in response.streaming_content)
+
+            with Timer() as cookbook:
+                size = export_cookbook()
+
+            # Measured in a second run, tracing slows rendering severalfold
+            tracemalloc.start()
+            export_cookbook()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        for name, timings in (("cold", cold), ("warm", warm), ("304", revalidated)):
+            timings.sort()
+            self.stdout.write(
+                f"{name}: median {timings[len(timings) // 2] * 1000:.1f} ms, "
+                f"min {timings[0] * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms"
+            )
+
+        self.stdout.write(
+            f"cookbook of {options['cookbook_recipes'] + 1} recipes: {cookbook.elapsed:.2f} s, "
+            f"{size / 1024:.0f} KiB, peak Python memory {peak / 1024 / 1024:.1f} MiB"
+        )
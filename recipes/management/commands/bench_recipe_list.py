@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.views import RecipeViewSet
+from utils.benchmarking import Timer, allow_test_host, bench_user, rolled_back, seed_recipes
+
+VARIANTS = [
+    ("compact", ""),
+    ("fields=id,title", "fields=id,title"),
+    ("expand=all", "expand=description,ingredients,steps"),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark query count, latency and payload size of recipe list pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,100,1000")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+
+        # Render whole result sets as one page so payload scales with size
+        view = RecipeViewSet.as_view({"get": "list"}, pagination_class=None)
+        factory = APIRequestFactory()
+        allow_test_host()
+
+        for size in sizes:
+            with rolled_back():
+                creator = bench_user("creator")
+                viewer = bench_user("viewer")
+                seed_recipes(creator, size)
+
+                for name, query in VARIANTS:
+                    request = factory.get(f"/api/recipes/?{query}")
+                    force_authenticate(request, user=viewer)
+
+                    with CaptureQueriesContext(connection) as queries, Timer() as timer:
+                        response = view(request)
+                        response.render()
+
+                    self.stdout.write(
+                        f"{size:>5} recipes | {name:<16} | {len(queries):>3} queries | "
+                        f"{timer.elapsed * 1000:8.1f} ms | {len(response.content) / 1024:9.1f} KiB"
+                    )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.models import Recipe
+from recipes.search import get_search_backend
+from utils.benchmarking import Timer, bench_user, rolled_back, seed_recipes
+
+QUERIES = ["recipe 4242", "stir gently", "ingredient 17", "description searchable"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark full-text recipe search against the previous icontains filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        backend = get_search_backend()
+
+        with rolled_back():
+            self.stdout.write(f"Seeding {options['recipes']} recipes...")
+            seed_recipes(bench_user("creator"), options["recipes"], ingredients_per_recipe=4, steps_per_recipe=3)
+
+            with Timer() as timer:
+                backend.index()
+            self.stdout.write(f"{type(backend).__name__}: indexed in {timer.elapsed:.1f}s")
+
+            strategies = {
+                "icontains": lambda text: Recipe.objects.filter(
+                    Q(title__icontains=text) | Q(description__icontains=text)
+                ).order_by("-pk"),
+                "full-text": lambda text: backend.search(Recipe.objects.all(), text),
+            }
+
+            for text in QUERIES:
+                for name, build in strategies.items():
+                    timings = []
+                    for _ in range(options["repeat"]):
+                        with Timer() as timer:
+                            page = list(build(text).only("pk", "title")[:page_size])
+                        timings.append(timer.elapsed)
+
+                    timings.sort()
+                    self.stdout.write(
+                        f"{text!r:<26} {name:<10} {len(page):>3} hits  "
+                        f"median {timings[len(timings) // 2] * 1000:8.1f} ms"
+                    )
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from recipes.models import Recipe
+from recipes.trending import ALL_TIME, WINDOWS, top_recipes
+from utils.benchmarking import Timer, bench_user, rolled_back, seed_favourites, seed_recipes
+
+
+class Command(BaseCommand):
+    help = "Benchmark most-favourited rankings from favourite_count against COUNT aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--favourites-per-user", type=int, default=40)
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+
+        with rolled_back():
+            self.stdout.write(
+                f"Seeding {options['recipes']} recipes and "
+                f"{options['users'] * options['favourites_per_user']} favourites..."
+            )
+            recipe_ids = seed_recipes(
+                bench_user("creator"), options["recipes"], ingredients_per_recipe=0, steps_per_recipe=0
+            )
+            seed_favourites(recipe_ids, options["users"], options["favourites_per_user"])
+
+            # Fresh tables have no planner statistics yet
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            strategies = {
+                f"{ALL_TIME} (aggregate)": lambda: list(
+                    Recipe.objects.annotate(favourites=Count("favourited_by"))
+                    .filter(favourites__gt=0)
+                    .order_by("-favourites", "-pk")
+                    .values_list("pk", "favourites")[:limit]
+                ),
+                f"{ALL_TIME} (counter)": lambda: top_recipes(ALL_TIME, limit),
+            }
+            for window in WINDOWS:
+                strategies[f"{window} (uncached)"] = lambda window=window: (
+                    cache.delete(f"recipes:trending:{window}:{limit}"), top_recipes(window, limit)
+                )[1]
+                strategies[f"{window} (cached)"] = lambda window=window: top_recipes(window, limit)
+
+            for name, run in strategies.items():
+                best = None
+                for _ in range(options["repeat"]):
+                    with Timer() as timer:
+                        run()
+                    best = timer.elapsed if best is None else min(best, timer.elapsed)
+                self.stdout.write(f"{name:>18}: {best * 1000:.2f} ms")
+
+            for window in WINDOWS:
+                cache.delete(f"recipes:trending:{window}:{limit}")
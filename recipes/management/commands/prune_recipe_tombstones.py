@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import RecipeTombstone
+
+
+class Command(BaseCommand):
+    help = "Delete tombstones of recipes deleted more than RECIPE_TOMBSTONE_RETENTION_DAYS ago"
+
+    def handle(self, *args, **options):
+        # Change tokens older than this are refused, so nobody needs these
+        cutoff = timezone.now() - timedelta(days=settings.RECIPE_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = RecipeTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} tombstones")
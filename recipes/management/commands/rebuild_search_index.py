@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Recompute full-text search documents for every recipe"
+
+    def handle(self, *args, **options):
+        updated = get_search_backend().index()
+        self.stdout.write(f"Indexed {updated} recipes")
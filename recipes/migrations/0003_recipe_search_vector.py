@@ -0,0 +1,65 @@
+# Generated by Django 5.2.11 on 2026-10-18 19:24
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+
+# The GIN index only exists on PostgreSQL; other databases use the
+# in-memory fallback in recipes.search and simply keep the column empty.
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin "
+            "ON recipes_recipe USING gin (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS recipes_recipe_search_vector_gin")
+
+
+# Fill the new column for existing recipes, as PostgresSearchBackend.index()
+# would, so they stay searchable without running rebuild_search_index
+def backfill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    Recipe = apps.get_model("recipes", "Recipe")
+    Step = apps.get_model("recipes", "Step")
+    config = settings.RECIPE_SEARCH_CONFIG
+
+    ingredient_names = Recipe.ingredients.through.objects.filter(
+        recipe_id=OuterRef("pk")
+    ).values("recipe_id").annotate(text=StringAgg("ingredient__name", " ")).values("text")
+    step_instructions = Step.objects.filter(
+        recipe_id=OuterRef("pk")
+    ).values("recipe_id").annotate(text=StringAgg("instruction", " ")).values("text")
+
+    Recipe.objects.using(schema_editor.connection.alias).update(search_vector=(
+        SearchVector(F("title"), weight="A", config=config)
+        + SearchVector(F("description"), weight="B", config=config)
+        + SearchVector(Subquery(ingredient_names), weight="B", config=config)
+        + SearchVector(Subquery(step_instructions), weight="C", config=config)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_alter_ingredient_image_alter_recipe_thumbnail_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations, models
+
+
+def normalize(name):
+    # Same rule as Ingredient.normalize (historical models have no methods)
+    return " ".join(str(name).split()).casefold()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    # Keep the oldest ingredient of every normalized name, point recipe
+    # links at it and delete the duplicates
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Link = Recipe.ingredients.through
+    db = schema_editor.connection.alias
+
+    keepers = {}
+    duplicates = {}
+    for ingredient in Ingredient.objects.using(db).order_by("pk").iterator(chunk_size=2000):
+        normalized_name = normalize(ingredient.name)
+        keeper = keepers.get(normalized_name)
+        if keeper is None:
+            ingredient.normalized_name = normalized_name
+            keepers[normalized_name] = ingredient
+            continue
+
+        duplicates[ingredient.pk] = keeper.pk
+        if not keeper.image and ingredient.image:
+            keeper.image = ingredient.image
+
+    Ingredient.objects.using(db).bulk_update(
+        keepers.values(), ["normalized_name", "image"], batch_size=1000
+    )
+
+    duplicate_ids = list(duplicates)
+    for start in range(0, len(duplicate_ids), 1000):
+        batch = duplicate_ids[start:start + 1000]
+        links = Link.objects.using(db).filter(ingredient_id__in=batch)
+        rewritten = [
+            Link(recipe_id=recipe_id, ingredient_id=duplicates[ingredient_id])
+            for recipe_id, ingredient_id in links.values_list("recipe_id", "ingredient_id")
+        ]
+
+        # A recipe may already be linked to the keeper as well
+        links.delete()
+        Link.objects.using(db).bulk_create(rewritten, ignore_conflicts=True, batch_size=1000)
+        Ingredient.objects.using(db).filter(pk__in=batch).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.11 on 2026-10-18 19:36
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_favourites(apps, schema_editor):
+    # Initialise counters from the existing favourites
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favourite = apps.get_model("favorites", "Favourite")
+    db = schema_editor.connection.alias
+
+    favourites = Favourite.objects.using(db).filter(
+        recipe_id=OuterRef("pk")
+    ).values("recipe_id").annotate(count=Count("*")).values("count")
+    Recipe.objects.using(db).update(favourite_count=Coalesce(Subquery(favourites), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_alter_ingredient_normalized_name'),
+        ('favorites', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favourite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_favourites, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['favourite_count', 'id'], name='recipe_favourite_count_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def renumber_duplicate_steps(apps, schema_editor):
+    # Steps of recipes with a repeated step number are renumbered 1..n in
+    # their current (step_number, id) order, so the next migration can make
+    # (recipe, step_number) unique without losing any step
+    Step = apps.get_model("recipes", "Step")
+    db = schema_editor.connection.alias
+
+    recipe_ids = set(
+        Step.objects.using(db)
+        .values("recipe_id", "step_number")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .values_list("recipe_id", flat=True)
+    )
+    for recipe_id in recipe_ids:
+        steps = list(Step.objects.using(db).filter(recipe_id=recipe_id).order_by("step_number", "id"))
+        for number, step in enumerate(steps, start=1):
+            step.step_number = number
+        Step.objects.using(db).bulk_update(steps, ["step_number"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_favourite_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicate_steps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.11 on 2026-10-18 20:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_renumber_duplicate_steps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['prep_duration', 'id'], name='recipe_prep_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cook_duration', 'id'], name='recipe_cook_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['created_by', 'id'], name='recipe_created_by_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='step',
+            constraint=models.UniqueConstraint(fields=('recipe', 'step_number'), name='step_recipe_number_uniq'),
+        ),
+        # Replaced by the indexes above, which lead with these foreign keys
+        migrations.AlterField(
+            model_name='recipe',
+            name='created_by',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='step',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='recipes.recipe'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.11 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_timestamps_and_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='renditions_of',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_of',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='renditions_of',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
@@ -1,14 +1,47 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.search import SearchVectorField
 
 
 class Ingredient(models.Model):
     # Name of the ingredient
     name = models.CharField(max_length=255)
 
+    # Canonical form of the name ("Flour " and "flour" are the same
+    # ingredient); unique so the catalogue holds one row per ingredient
+    normalized_name = models.CharField(max_length=255, unique=True, editable=False)
+
     # Optional image representing the ingredient
     image = models.ImageField(upload_to="ingredients/", null=True, blank=True)
 
+    # Name of the image whose renditions have been generated (recipes.images)
+    renditions_of = models.CharField(max_length=100, blank=True, editable=False)
+
+    # When the ingredient was added and last changed
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @staticmethod
+    def normalize(name):
+        # Case-insensitive, whitespace-collapsed form of an ingredient name
+        return " ".join(str(name).split()).casefold()
+
+    def clean(self):
+        # Report duplicates as a validation error instead of an IntegrityError
+        normalized_name = self.normalize(self.name)
+        duplicates = Ingredient.objects.filter(normalized_name=normalized_name).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError({"name": "An ingredient with this name already exists."})
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = self.normalize(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "normalized_name"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         # Return ingredient name for readable representation
         return self.name
@@ -26,27 +59,59 @@ class Recipe(models.Model):
     # Optional thumbnail image for the recipe
     thumbnail = models.ImageField(upload_to="recipes/", null=True, blank=True)
 
-    # User who created the recipe
+    # Name of the thumbnail whose renditions have been generated (recipes.images)
+    renditions_of = models.CharField(max_length=100, blank=True, editable=False)
+
+    # User who created the recipe (indexed by recipe_created_by_idx)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name="recipes"
+        related_name="recipes",
+        db_index=False,
     )
 
     # Many-to-many relationship with ingredients
     ingredients = models.ManyToManyField(Ingredient)
 
+    # Full-text document (PostgreSQL only), maintained by recipes.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Number of users who favourited the recipe, kept in step with the
+    # favourites table by favorites.signals
+    favourite_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # When the recipe was created and its content (fields, steps or
+    # ingredients) last changed; recipes.changes moves updated_at forward
+    # after each committed change. Favourite counts do not count as content.
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Change feed order (recipes.changes)
+            models.Index(fields=["updated_at", "id"], name="recipe_updated_idx"),
+            # Most favourited first (index is scanned backwards)
+            models.Index(fields=["favourite_count", "id"], name="recipe_favourite_count_idx"),
+            # Duration filters and orderings, with the pk as the keyset
+            # pagination tie-breaker
+            models.Index(fields=["prep_duration", "id"], name="recipe_prep_duration_idx"),
+            models.Index(fields=["cook_duration", "id"], name="recipe_cook_duration_idx"),
+            # A creator's recipes in listing order; also serves the foreign key
+            models.Index(fields=["created_by", "id"], name="recipe_created_by_idx"),
+        ]
+
     def __str__(self):
         # Return recipe title for readability
         return self.title
 
 
 class Step(models.Model):
-    # Each step belongs to a specific recipe
+    # Each step belongs to a specific recipe (indexed by step_recipe_number_uniq)
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        related_name="steps"
+        related_name="steps",
+        db_index=False,
     )
 
     # Order of the step in the recipe
@@ -58,10 +123,39 @@ class Step(models.Model):
     # Optional image for the step
     image = models.ImageField(upload_to="steps/", null=True, blank=True)
 
+    # Name of the image whose renditions have been generated (recipes.images)
+    renditions_of = models.CharField(max_length=100, blank=True, editable=False)
+
+    # When the step was added and last changed
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     class Meta:
         # Ensure steps are ordered by step number
         ordering = ["step_number"]
 
+        constraints = [
+            # Steps are matched by number on update; the index also serves
+            # fetching a recipe's steps in order
+            models.UniqueConstraint(fields=["recipe", "step_number"], name="step_recipe_number_uniq"),
+        ]
+
     def __str__(self):
         # Readable representation in admin
         return f"{self.recipe.title} - Step {self.step_number}"
+
+
+class RecipeTombstone(models.Model):
+    # Left behind by a deleted recipe so change feed clients learn about the
+    # deletion (recipes.changes); pruned by prune_recipe_tombstones
+    recipe_id = models.BigIntegerField(primary_key=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Change feed order, like recipe_updated_idx
+            models.Index(fields=["deleted_at", "recipe_id"], name="tombstone_deleted_idx"),
+        ]
+
+    def __str__(self):
+        return f"Recipe {self.recipe_id} deleted at {self.deleted_at}"
@@ -0,0 +1,326 @@
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils import timezone
+from reportlab.platypus import (
+    BaseDocTemplate, Flowable, Frame, PageBreak, PageTemplate, Paragraph, SimpleDocTemplate, Spacer,
+)
+from reportlab.platypus.tableofcontents import TableOfContents
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from xml.sax.saxutils import escape
+import hashlib
+import io
+import json
+import tempfile
+
+from .images import pdf_source
+
+# Bump when the PDF layout changes so cached documents are re-rendered
+PDF_LAYOUT_VERSION = 2
+
+# Paragraph styles shared by every document; they are only read while
+# rendering, so one sheet per process is enough
+STYLES = getSampleStyleSheet()
+TOC_STYLE = ParagraphStyle("TOCEntry", parent=STYLES["Normal"], fontSize=11, leading=16)
+
+
+class PdfImage(Flowable):
+    # Image drawn at a fixed size straight from its file. The file is only
+    # read when the page is drawn; from the file system, JPEG renditions
+    # are embedded without decoding and each file once per document,
+    # however often it appears. Other storages are read through open().
+    def __init__(self, field_file, width, height):
+        super().__init__()
+        # Prefer the pre-sized PDF rendition over the full-resolution upload
+        self.storage = field_file.storage
+        self.name = pdf_source(field_file)
+        self.width = width
+        self.height = height
+        self.hAlign = "CENTER"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def source(self):
+        if isinstance(self.storage, FileSystemStorage):
+            return self.storage.path(self.name)
+        with self.storage.open(self.name, "rb") as file:
+            return ImageReader(io.BytesIO(file.read()))
+
+    def draw(self):
+        self.canv.drawImage(self.source(), 0, 0, self.width, self.height, mask="auto")
+
+
+def recipe_flowables(recipe):
+    # Flowables of one recipe (including images); the title carries the
+    # recipe's bookmark key for cookbooks
+    elements = []
+
+    # Recipe title
+    title = Paragraph(f"<b>{escape(recipe.title)}</b>", STYLES["Title"])
+    title.bookmark_key = f"recipe-{recipe.pk}"
+    elements.append(title)
+    elements.append(Spacer(1, 12))
+
+    # Add thumbnail if available
+    if recipe.thumbnail:
+        elements.append(PdfImage(recipe.thumbnail, width=200, height=150))
+        elements.append(Spacer(1, 12))
+
+    # Basic details
+    elements.append(Paragraph(f"Description: {escape(recipe.description)}", STYLES["Normal"]))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(f"Prep Duration: {recipe.prep_duration} mins", STYLES["Normal"]))
+    elements.append(Paragraph(f"Cook Duration: {recipe.cook_duration} mins", STYLES["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # Ingredients section
+    elements.append(Paragraph("<b>Ingredients:</b>", STYLES["Heading2"]))
+    elements.append(Spacer(1, 10))
+
+    for ingredient in recipe.ingredients.all():
+        elements.append(Paragraph(f"- {escape(ingredient.name)}", STYLES["Normal"]))
+        elements.append(Spacer(1, 6))
+
+        if ingredient.image:
+            elements.append(PdfImage(ingredient.image, width=100, height=80))
+            elements.append(Spacer(1, 10))
+
+    elements.append(Spacer(1, 20))
+
+    # Steps section
+    elements.append(Paragraph("<b>Steps:</b>", STYLES["Heading2"]))
+    elements.append(Spacer(1, 10))
+
+    for step in recipe.steps.all():
+        elements.append(
+            Paragraph(f"{step.step_number}. {escape(step.instruction)}", STYLES["Normal"])
+        )
+        elements.append(Spacer(1, 6))
+
+        if step.image:
+            elements.append(PdfImage(step.image, width=200, height=150))
+            elements.append(Spacer(1, 12))
+
+    return elements
+
+
+def build_recipe_pdf(recipe, output):
+    # Render a recipe (including images) as a PDF document into output
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    doc.build(recipe_flowables(recipe))
+
+
+class RecipeSection(Flowable):
+    # Placeholder for the index-th recipe of a cookbook, swapped for the
+    # recipe's flowables only when the layout reaches it
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+
+
+def _draw_page_number(canvas, doc):
+    canvas.setFont("Helvetica", 9)
+    canvas.drawCentredString(doc.pagesize[0] / 2, doc.bottomMargin / 2, str(doc.page))
+
+
+class CookbookTemplate(BaseDocTemplate):
+    # Many recipes in one document: a title page with a linked table of
+    # contents, then each recipe from a new page. Recipes are loaded
+    # batch_size at a time as the layout reaches them, so only one batch
+    # and one recipe's flowables are held however long the cookbook is.
+    def __init__(self, output, recipes, recipe_ids, batch_size, **kwargs):
+        super().__init__(output, pagesize=A4, **kwargs)
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id="body")
+        self.addPageTemplates([PageTemplate(id="page", frames=[frame], onPage=_draw_page_number)])
+
+        self.recipes = recipes
+        self.recipe_ids = recipe_ids
+        self.batch_size = batch_size
+        self.batch = {}
+
+    def load(self, index):
+        # The recipe at index, fetching it with the batch that follows it
+        recipe_id = self.recipe_ids[index]
+        if recipe_id not in self.batch:
+            self.batch = self.recipes.in_bulk(self.recipe_ids[index:index + self.batch_size])
+        return self.batch.get(recipe_id)
+
+    def filterFlowables(self, flowables):
+        # Called before each flowable is laid out
+        section = flowables[0]
+        if isinstance(section, RecipeSection):
+            recipe = self.load(section.index)
+            # Recipes deleted since the ids were read are left out
+            flowables[0:1] = recipe_flowables(recipe) if recipe is not None else [Spacer(1, 0)]
+
+    def afterFlowable(self, flowable):
+        # Recipe titles become table of contents entries and PDF outline items
+        key = getattr(flowable, "bookmark_key", None)
+        if key:
+            text = flowable.getPlainText()
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(text, key, level=0)
+            self.notify("TOCEntry", (0, text, self.page, key))
+
+
+def build_cookbook_pdf(recipes, recipe_ids, output, title="Cookbook"):
+    # Render the recipes with the given ids, in that order, as one PDF.
+    # recipes is the queryset they are loaded from (with prefetches).
+    doc = CookbookTemplate(
+        output,
+        recipes,
+        recipe_ids,
+        batch_size=settings.COOKBOOK_BATCH_SIZE,
+        title=title,
+    )
+    toc = TableOfContents(levelStyles=[TOC_STYLE])
+
+    story = [
+        Paragraph(f"<b>{escape(title)}</b>", STYLES["Title"]),
+        Spacer(1, 20),
+        Paragraph("<b>Contents</b>", STYLES["Heading2"]),
+        toc,
+    ]
+    for index in range(len(recipe_ids)):
+        story.append(PageBreak())
+        story.append(RecipeSection(index))
+
+    # Page numbers in the table of contents take a second layout pass
+    doc.multiBuild(story)
+
+
+def spooled_pdf(build, *args):
+    # Render with build(*args, output) into a temporary file that stays in
+    # memory while small and moves to disk past PDF_SPOOL_MAX_SIZE. Returns
+    # the file rewound; the caller closes it.
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.PDF_SPOOL_MAX_SIZE)
+    try:
+        build(*args, spool)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _file_version(field_file):
+    # Identify the embedded image by name, size and modification time
+    if not field_file:
+        return None
+
+    storage = field_file.storage
+    name = pdf_source(field_file)
+    try:
+        return [
+            name,
+            storage.size(name),
+            storage.get_modified_time(name).timestamp(),
+        ]
+    except (OSError, NotImplementedError):
+        return [name]
+
+
+def recipe_fingerprint(recipe):
+    # Hash of everything that ends up in the rendered PDF
+    content = [
+        PDF_LAYOUT_VERSION,
+        recipe.pk,
+        recipe.title,
+        recipe.description,
+        recipe.prep_duration,
+        recipe.cook_duration,
+        _file_version(recipe.thumbnail),
+        [
+            [ingredient.pk, ingredient.name, _file_version(ingredient.image)]
+            for ingredient in recipe.ingredients.all()
+        ],
+        [
+            [step.pk, step.step_number, step.instruction, _file_version(step.image)]
+            for step in recipe.steps.all()
+        ],
+    ]
+    encoded = json.dumps(content, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class CachedPdf:
+    # A rendered PDF from the cache storage, opened by RecipePdfCache.get()
+    # so that a concurrent purge cannot remove it before it is read.
+    # Whoever gets one streams or closes the file.
+    def __init__(self, name, fingerprint, file, last_modified):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.file = file
+        self.last_modified = last_modified
+
+    def open(self):
+        return self.file
+
+    def close(self):
+        self.file.close()
+
+
+class RecipePdfCache:
+    # Persistent cache of rendered recipe PDFs, one directory per recipe
+    # holding a single document named after the recipe fingerprint
+    def __init__(self, storage_alias="recipe_pdfs"):
+        self.storage_alias = storage_alias
+
+    @property
+    def storage(self):
+        return storages[self.storage_alias]
+
+    def get(self, recipe, attempts=3):
+        # Return the cached PDF for the recipe, rendering it on a miss
+        storage = self.storage
+        fingerprint = recipe_fingerprint(recipe)
+        name = f"{recipe.pk}/{fingerprint}.pdf"
+
+        for _ in range(attempts):
+            rendered = not storage.exists(name)
+            if rendered:
+                with spooled_pdf(build_recipe_pdf, recipe) as pdf:
+                    saved_name = storage.save(name, File(pdf))
+                if saved_name != name:
+                    # Another request stored the same document concurrently
+                    storage.delete(saved_name)
+
+            try:
+                last_modified = storage.get_modified_time(name)
+                file = storage.open(name, "rb")
+            except FileNotFoundError:
+                # Purged by a request that rendered another version of the
+                # recipe; render this one again
+                continue
+
+            # Older versions go only once this one is open
+            if rendered:
+                self._purge(recipe.pk, keep=name)
+            return CachedPdf(name, fingerprint, file, last_modified)
+
+        # Requests with different versions keep replacing each other's
+        # documents; serve this one without caching it
+        return CachedPdf(name, fingerprint, spooled_pdf(build_recipe_pdf, recipe), timezone.now())
+
+    def invalidate(self, recipe_ids):
+        # Remove every cached document for the given recipes
+        for recipe_id in recipe_ids:
+            self._purge(recipe_id)
+
+    def _purge(self, recipe_id, keep=None):
+        storage = self.storage
+        try:
+            _, files = storage.listdir(str(recipe_id))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        for file_name in files:
+            name = f"{recipe_id}/{file_name}"
+            if name != keep:
+                storage.delete(name)
+
+
+pdf_cache = RecipePdfCache()
@@ -0,0 +1,210 @@
+from collections import defaultdict
+import math
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Value, When
+
+from utils.batching import batches
+from .models import Recipe, Step
+
+
+# Relative importance of each searchable source (Postgres weights A-D)
+FIELD_WEIGHTS = {
+    "title": ("A", 1.0),
+    "description": ("B", 0.4),
+    "ingredients": ("B", 0.4),
+    "steps": ("C", 0.2),
+}
+
+
+class PostgresSearchBackend:
+    # tsvector column maintained per recipe, queried through a GIN index
+    def __init__(self, using="default"):
+        self.using = using
+        self.config = settings.RECIPE_SEARCH_CONFIG
+
+    def vector_expression(self):
+        # Title, description, ingredient names and step instructions
+        ingredient_names = Recipe.ingredients.through.objects.filter(
+            recipe_id=OuterRef("pk")
+        ).values("recipe_id").annotate(text=StringAgg("ingredient__name", " ")).values("text")
+
+        step_instructions = Step.objects.filter(
+            recipe_id=OuterRef("pk")
+        ).values("recipe_id").annotate(text=StringAgg("instruction", " ")).values("text")
+
+        sources = {
+            "title": F("title"),
+            "description": F("description"),
+            "ingredients": Subquery(ingredient_names),
+            "steps": Subquery(step_instructions),
+        }
+
+        vector = None
+        for name, expression in sources.items():
+            part = SearchVector(expression, weight=FIELD_WEIGHTS[name][0], config=self.config)
+            vector = part if vector is None else vector + part
+        return vector
+
+    def index(self, recipe_ids=None):
+        # Recompute stored vectors (all recipes when no ids are given)
+        queryset = Recipe.objects.using(self.using)
+        if recipe_ids is None:
+            return queryset.update(search_vector=self.vector_expression())
+
+        updated = 0
+        for batch in batches(recipe_ids):
+            updated += queryset.filter(pk__in=batch).update(search_vector=self.vector_expression())
+        return updated
+
+    def search(self, queryset, text):
+        query = SearchQuery(text, search_type="websearch", config=self.config)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F("search_vector"), query)
+        ).order_by("-search_rank", "-pk")
+
+
+class InMemorySearchBackend:
+    # Pure-Python inverted index used when the database is not PostgreSQL
+    # (e.g. SQLite test setups). Built lazily and kept per process.
+    token_pattern = re.compile(r"\w+")
+
+    def __init__(self, using="default"):
+        self.using = using
+        self.lock = threading.RLock()
+        self.postings = None
+        self.documents = {}
+
+    @classmethod
+    def tokenize(cls, text):
+        # Lowercase words with a naive plural strip ("tomatoes" -> "tomato")
+        tokens = []
+        for token in cls.token_pattern.findall((text or "").lower()):
+            if len(token) > 3 and token.endswith("es"):
+                token = token[:-2]
+            elif len(token) > 3 and token.endswith("s"):
+                token = token[:-1]
+            tokens.append(token)
+        return tokens
+
+    def _load(self, recipe_ids=None):
+        # Weighted term frequencies per recipe
+        recipes = Recipe.objects.using(self.using).only("pk", "title", "description")
+        links = Recipe.ingredients.through.objects.using(self.using)
+        steps = Step.objects.using(self.using)
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            links = links.filter(recipe_id__in=recipe_ids)
+            steps = steps.filter(recipe_id__in=recipe_ids)
+
+        documents = {}
+
+        def add(recipe_id, field, text):
+            for token in self.tokenize(text):
+                documents[recipe_id][token] += FIELD_WEIGHTS[field][1]
+
+        for recipe in recipes.iterator(chunk_size=2000):
+            documents[recipe.pk] = defaultdict(float)
+            add(recipe.pk, "title", recipe.title)
+            add(recipe.pk, "description", recipe.description)
+        for recipe_id, name in links.values_list("recipe_id", "ingredient__name").iterator(chunk_size=2000):
+            if recipe_id in documents:
+                add(recipe_id, "ingredients", name)
+        for recipe_id, instruction in steps.values_list("recipe_id", "instruction").iterator(chunk_size=2000):
+            if recipe_id in documents:
+                add(recipe_id, "steps", instruction)
+
+        return documents
+
+    def _build(self):
+        postings = defaultdict(dict)
+        documents = self._load()
+        for recipe_id, terms in documents.items():
+            for token, weight in terms.items():
+                postings[token][recipe_id] = weight
+        self.documents = {recipe_id: set(terms) for recipe_id, terms in documents.items()}
+        self.postings = postings
+
+    def index(self, recipe_ids=None):
+        with self.lock:
+            if recipe_ids is None:
+                self._build()
+                return len(self.documents)
+
+            # Nothing to update until the index is first used
+            if self.postings is None:
+                return 0
+
+            updated = 0
+            for batch in batches(set(recipe_ids)):
+                for recipe_id in batch:
+                    for token in self.documents.pop(recipe_id, ()):
+                        self.postings[token].pop(recipe_id, None)
+
+                documents = self._load(batch)
+                for recipe_id, terms in documents.items():
+                    for token, weight in terms.items():
+                        self.postings[token][recipe_id] = weight
+                    self.documents[recipe_id] = set(terms)
+                updated += len(documents)
+            return updated
+
+    def rank(self, text):
+        # (recipe_id, score) pairs matching every query term, best first
+        tokens = set(self.tokenize(text))
+        if not tokens:
+            return []
+
+        with self.lock:
+            if self.postings is None:
+                self._build()
+
+            lists = [self.postings.get(token, {}) for token in tokens]
+            if not all(lists):
+                return []
+
+            total = len(self.documents) or 1
+            lists.sort(key=len)
+            scores = {}
+            for recipe_id in lists[0]:
+                score = 0.0
+                for posting in lists:
+                    weight = posting.get(recipe_id)
+                    if weight is None:
+                        break
+                    score += weight * math.log(1 + total / len(posting))
+                else:
+                    scores[recipe_id] = score
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+    def search(self, queryset, text):
+        ranked = self.rank(text)[:settings.RECIPE_SEARCH_MAX_RESULTS]
+        if not ranked:
+            return queryset.none()
+
+        rank = Case(
+            *[When(pk=recipe_id, then=Value(score)) for recipe_id, score in ranked],
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=[recipe_id for recipe_id, _ in ranked]).annotate(
+            search_rank=rank
+        ).order_by("-search_rank", "-pk")
+
+
+_backends = {}
+
+
+def get_search_backend(using="default"):
+    # One backend instance per database alias
+    if using not in _backends:
+        if connections[using].vendor == "postgresql":
+            _backends[using] = PostgresSearchBackend(using)
+        else:
+            _backends[using] = InMemorySearchBackend(using)
+    return _backends[using]
@@ -1,19 +1,60 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
+from .images import RENDITIONS, generate_renditions, rendition_url
+from .ingredients import ingredient_resolver
 from .models import Recipe, Ingredient, Step
+from .signals import mark_recipes_changed
+
+
+class ImageRenditionsField(serializers.Field):
+    # Read-only map of rendition name -> URL for an image field
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        request = self.context.get("request")
+        urls = {}
+        for rendition in RENDITIONS:
+            url = rendition_url(value, rendition)
+            urls[rendition] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class FavouritedField(serializers.BooleanField):
+    # Whether the requesting user favourited the recipe, read from the
+    # is_favourited annotation added by RecipeViewSet (False when absent,
+    # e.g. for a recipe that was just created)
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return getattr(value, "is_favourited", False)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
     # Serializer for ingredient details
+    image_renditions = ImageRenditionsField(source="image")
+
     class Meta:
         model = Ingredient
-        fields = ["id", "name", "image"]
+        fields = ["id", "name", "image", "image_renditions"]
 
 
 class StepSerializer(serializers.ModelSerializer):
     # Serializer for individual recipe steps
+    image_renditions = ImageRenditionsField(source="image")
+
     class Meta:
         model = Step
-        fields = ["id", "step_number", "instruction", "image"]
+        fields = ["id", "step_number", "instruction", "image", "image_renditions"]
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -21,9 +62,14 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientSerializer(many=True)
     steps = StepSerializer(many=True)
 
+    # Pre-sized copies of the thumbnail
+    thumbnail_renditions = ImageRenditionsField(source="thumbnail")
+
     # Display creator username instead of full user object
     created_by = serializers.ReadOnlyField(source="created_by.username")
 
+    is_favourited = FavouritedField()
+
     class Meta:
         model = Recipe
         fields = [
@@ -33,26 +79,225 @@ class RecipeSerializer(serializers.ModelSerializer):
             "prep_duration",
             "cook_duration",
             "thumbnail",
+            "thumbnail_renditions",
             "created_by",
+            "favourite_count",
+            "is_favourited",
             "ingredients",
             "steps",
         ]
 
+    def validate_steps(self, steps):
+        # Steps are matched by number on update, so numbers must be unique
+        numbers = [step["step_number"] for step in steps]
+        if len(numbers) != len(set(numbers)):
+            raise serializers.ValidationError("Step numbers must be unique.")
+        return steps
+
     def create(self, validated_data):
         # Extract nested ingredients and steps data
         ingredients_data = validated_data.pop("ingredients")
         steps_data = validated_data.pop("steps")
 
-        # Create recipe instance
-        recipe = Recipe.objects.create(**validated_data)
+        with transaction.atomic():
+            # Create recipe instance
+            recipe = Recipe.objects.create(**validated_data)
 
-        # Add or create ingredients and associate with recipe
-        for ingredient_data in ingredients_data:
-            ingredient, _ = Ingredient.objects.get_or_create(**ingredient_data)
-            recipe.ingredients.add(ingredient)
+            # A new recipe has no links yet, so insert them directly
+            Link = Recipe.ingredients.through
+            Link.objects.bulk_create(
+                Link(recipe_id=recipe.pk, ingredient_id=ingredient_id)
+                for ingredient_id in self.resolve_ingredients(ingredients_data)
+            )
 
-        # Create step instances linked to recipe
-        for step_data in steps_data:
-            Step.objects.create(recipe=recipe, **step_data)
+            self.create_steps(recipe, steps_data)
 
         return recipe
+
+    def update(self, instance, validated_data):
+        # Nested data is optional (PATCH); when given it replaces the current
+        # ingredients and steps, touching only what actually changed
+        ingredients_data = validated_data.pop("ingredients", None)
+        steps_data = validated_data.pop("steps", None)
+
+        with transaction.atomic():
+            # Empty files compare unequal to None, so normalise both sides
+            changed = [
+                name for name, value in validated_data.items()
+                if (getattr(instance, name) or None) != (value or None)
+            ]
+            for name in changed:
+                setattr(instance, name, validated_data[name])
+            if changed:
+                instance.save(update_fields=[*changed, "updated_at"])
+
+            if ingredients_data is not None:
+                instance.ingredients.set(self.resolve_ingredients(ingredients_data))
+
+            if steps_data is not None:
+                self.update_steps(instance, steps_data)
+
+        return instance
+
+    def resolve_ingredients(self, ingredients_data):
+        # Catalogue ids for the payload, in order and without duplicates
+        ids = ingredient_resolver.resolve(data["name"] for data in ingredients_data)
+
+        ordered = []
+        for data in ingredients_data:
+            pk = ids[Ingredient.normalize(data["name"])]
+            if data.get("image"):
+                self.attach_image(pk, data["image"])
+            if pk not in ordered:
+                ordered.append(pk)
+        return ordered
+
+    def attach_image(self, pk, image):
+        # Ingredients are shared between recipes, so an upload only becomes
+        # the catalogue image when the ingredient has none yet
+        ingredient = Ingredient.objects.get(pk=pk)
+        if not ingredient.image:
+            ingredient.image = image
+            ingredient.save(update_fields=["image", "updated_at"])
+
+    def create_steps(self, recipe, steps_data):
+        # Insert all steps at once
+        steps = Step.objects.bulk_create(Step(recipe=recipe, **data) for data in steps_data)
+
+        for step in steps:
+            generate_renditions(step.image)
+        if steps:
+            mark_recipes_changed([recipe.pk])
+
+    def update_steps(self, recipe, steps_data):
+        # Diff against stored steps by step number: changed instructions are
+        # written with one bulk_update, new numbers with one bulk_create and
+        # numbers no longer present with one delete
+        existing = {step.step_number: step for step in recipe.steps.all()}
+        wanted = {data["step_number"]: data for data in steps_data}
+        now = timezone.now()
+
+        changed = []
+        for number, data in wanted.items():
+            step = existing.get(number)
+            if step is None:
+                continue
+
+            if "image" in data and (data["image"] or None) != (step.image or None):
+                # Uploaded files are stored by save(), not by bulk_update
+                for name, value in data.items():
+                    setattr(step, name, value)
+                step.save()
+            elif data["instruction"] != step.instruction:
+                step.instruction = data["instruction"]
+                step.updated_at = now
+                changed.append(step)
+
+        if changed:
+            Step.objects.bulk_update(changed, ["instruction", "updated_at"])
+            mark_recipes_changed([recipe.pk])
+
+        removed = [step.pk for number, step in existing.items() if number not in wanted]
+        if removed:
+            Step.objects.filter(pk__in=removed).delete()
+
+        self.create_steps(recipe, [data for number, data in wanted.items() if number not in existing])
+
+
+class SparseFieldsetMixin:
+    # Lets callers pick fields (?fields=) and opt into expandable ones (?expand=)
+    expandable_fields = ()
+
+    # Rendered whatever ?fields= selects
+    always_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        selected = self.selected_fields(fields, expand)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, fields=None, expand=None):
+        # Names of the fields rendered for the given selection
+        available = list(cls.Meta.fields)
+        expand = set(expand or ())
+
+        if fields:
+            wanted = set(fields) | expand
+        else:
+            wanted = (set(available) - set(cls.expandable_fields)) | expand
+
+        wanted |= set(cls.always_fields)
+        return [name for name in available if name in wanted]
+
+
+class RecipeListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Compact card representation used by the recipe list endpoint
+    created_by = serializers.ReadOnlyField(source="created_by.username")
+    thumbnail_renditions = ImageRenditionsField(source="thumbnail")
+    ingredient_count = serializers.IntegerField(read_only=True)
+    is_favourited = FavouritedField()
+
+    # Only rendered when requested with ?expand=
+    ingredients = IngredientSerializer(many=True, read_only=True)
+    steps = StepSerializer(many=True, read_only=True)
+
+    expandable_fields = ("description", "ingredients", "steps")
+
+    class Meta:
+        model = Recipe
+        fields = [
+            "id",
+            "title",
+            "description",
+            "prep_duration",
+            "cook_duration",
+            "thumbnail",
+            "thumbnail_renditions",
+            "created_by",
+            "favourite_count",
+            "is_favourited",
+            "ingredient_count",
+            "ingredients",
+            "steps",
+        ]
+
+
+class RecipeMatchSerializer(RecipeListSerializer):
+    # Recipe card with how well it matches a set of ingredients
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    always_fields = ("matched_ingredients", "missing_ingredients", "coverage")
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + [
+            "matched_ingredients",
+            "missing_ingredients",
+            "coverage",
+        ]
+
+
+class RecipeRankingSerializer(RecipeListSerializer):
+    # Recipe card with its favourites in the requested ranking window
+    window_favourites = serializers.IntegerField(read_only=True)
+
+    always_fields = ("window_favourites",)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ["window_favourites"]
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    # Recipe ids of a batch request, de-duplicated in order
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, ids):
+        limit = settings.RECIPE_BATCH_MAX_IDS
+        if len(ids) > limit:
+            raise serializers.ValidationError(f"Ensure this field has no more than {limit} elements.")
+        return list(dict.fromkeys(ids))
@@ -0,0 +1,136 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from .models import Recipe, Ingredient, Step
+from .changes import record_changes
+from .finder import ingredient_index
+from .images import IMAGE_FIELDS, generate_renditions
+from utils.cache import bump_generation
+from .ingredients import GENERATION_KEY as INGREDIENTS_GENERATION_KEY
+from .pdf import pdf_cache
+from .search import get_search_backend
+
+
+# Sent once per committed transaction with the ids of every recipe whose
+# content (fields, steps or ingredients) changed. Caches and indexes that
+# derive data from recipes subscribe to this instead of the model signals.
+recipe_content_changed = Signal()
+
+# Generation of the cached recipe list/detail responses (RecipeViewSet)
+RESPONSES_GENERATION_KEY = "recipes:responses:generation"
+
+_pending = threading.local()
+
+
+def mark_recipes_changed(recipe_ids, using="default"):
+    # Collect changed recipe ids and notify subscribers after commit. Ids
+    # marked within the same transaction are merged into one notification.
+    recipe_ids = {pk for pk in recipe_ids if pk is not None}
+    if not recipe_ids:
+        return
+
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        recipe_content_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+        return
+
+    # A rolled back transaction discards its on_commit callbacks, so only
+    # reuse the pending set while its flush callback is still registered
+    pending = getattr(_pending, using, None)
+    if pending is None or not any(
+        callback is pending["flush"] for _, callback, _ in connection.run_on_commit
+    ):
+        pending = {"ids": set()}
+        pending["flush"] = lambda: _flush(using, pending)
+        setattr(_pending, using, pending)
+        transaction.on_commit(pending["flush"], using=using, robust=True)
+
+    pending["ids"].update(recipe_ids)
+
+
+def _flush(using, pending):
+    if getattr(_pending, using, None) is pending:
+        setattr(_pending, using, None)
+    recipe_content_changed.send(sender=Recipe, recipe_ids=pending["ids"])
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    mark_recipes_changed([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Step)
+def step_saved(sender, instance, **kwargs):
+    mark_recipes_changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    # A new ingredient is not linked to any recipe yet
+    if not created:
+        mark_recipes_changed(instance.recipe_set.values_list("pk", flat=True))
+
+        # A rename makes cached name -> id lookups stale
+        if update_fields is None or "normalized_name" in update_fields:
+            transaction.on_commit(lambda: bump_generation(INGREDIENTS_GENERATION_KEY))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    # Links are removed by the delete, so collect affected recipes first
+    mark_recipes_changed(instance.recipe_set.values_list("pk", flat=True))
+    transaction.on_commit(lambda: bump_generation(INGREDIENTS_GENERATION_KEY))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Step)
+def create_image_renditions(sender, instance, **kwargs):
+    # Generate pre-sized copies of newly uploaded images
+    generate_renditions(getattr(instance, IMAGE_FIELDS[sender]))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        mark_recipes_changed([instance.pk])
+    elif action == "pre_clear":
+        mark_recipes_changed(instance.recipe_set.values_list("pk", flat=True))
+    else:
+        mark_recipes_changed(pk_set)
+
+
+@receiver(recipe_content_changed)
+def update_change_feed(sender, recipe_ids, **kwargs):
+    # Stamp updated_at (or a tombstone) after commit for the change feed
+    record_changes(recipe_ids)
+
+
+@receiver(recipe_content_changed)
+def invalidate_cached_pdfs(sender, recipe_ids, **kwargs):
+    # Drop rendered PDFs so the next download reflects the edit
+    pdf_cache.invalidate(recipe_ids)
+
+
+@receiver(recipe_content_changed)
+def update_search_index(sender, recipe_ids, **kwargs):
+    # Keep full-text documents in sync with recipe content
+    get_search_backend().index(recipe_ids)
+
+
+@receiver(recipe_content_changed)
+def update_ingredient_index(sender, recipe_ids, **kwargs):
+    # Keep ingredient -> recipe postings in sync with recipe links
+    ingredient_index.update(recipe_ids)
+
+
+@receiver(recipe_content_changed)
+def invalidate_cached_responses(sender, recipe_ids, **kwargs):
+    # Retire every cached list page and detail response
+    bump_generation(RESPONSES_GENERATION_KEY)
@@ -1,3 +1,1370 @@
-from django.test import TestCase
+from django.apps import apps
+import base64
+import csv
+from django.contrib.auth import get_user_model
+from datetime import timedelta
+from importlib import import_module
+import io
+import json
+import os
+import re
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+import openpyxl
+from PIL import Image as PilImage
+from reportlab.platypus import SimpleDocTemplate
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404
+from django.utils import timezone
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from favorites.models import Favourite
+from .changes import encode_token
+from .finder import ingredient_index
+from .importers import RecipeImporter, read_import_rows
+from .images import RENDITIONS, pdf_source, rendition_name, rendition_url
+from .ingredients import ingredient_resolver
+from .models import Recipe, Ingredient, Step
+from .pdf import PdfImage, pdf_cache
+from .search import InMemorySearchBackend, get_search_backend
+from .serializers import RecipeListSerializer, RecipeSerializer
+from .trending import ALL_TIME, top_recipes
+from utils.async_views import serve_media
+from utils.benchmarking import temporary_media
+from utils.jobs import claim_next, run_job
+from utils.models import Job
+
+
+@override_settings(RECIPE_CHANGES_DELAY_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    # Incremental sync through /api/recipes/changes/
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        # Flushed here, so changes made by the tests are recorded on their own
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipes = [
+                Recipe.objects.create(
+                    title=f"Recipe {i}", description="", prep_duration=1, cook_duration=1, created_by=cls.creator
+                )
+                for i in range(3)
+            ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.creator)
+
+    def changes(self, since=None, limit=None):
+        params = {name: value for name, value in (("since", since), ("limit", limit)) if value}
+        response = self.client.get("/api/recipes/changes/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_through_every_recipe(self):
+        first = self.changes(limit=2)
+        self.assertEqual([recipe["id"] for recipe in first["results"]], [recipe.pk for recipe in self.recipes[:2]])
+        self.assertTrue(first["has_more"])
+
+        second = self.changes(since=first["token"], limit=2)
+        self.assertEqual([recipe["id"] for recipe in second["results"]], [self.recipes[2].pk])
+        self.assertFalse(second["has_more"])
+
+        third = self.changes(since=second["token"])
+        self.assertEqual((third["results"], third["deleted"], third["token"]), ([], [], second["token"]))
+
+    def test_returns_edits_and_deletions_after_token(self):
+        token = self.changes()["token"]
+        edited, deleted, _ = self.recipes
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/recipes/{edited.pk}/", {"title": "Renamed"}, format="json")
+            self.assertEqual(response.status_code, 200, response.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/recipes/{deleted.pk}/").status_code, 204)
+
+        changes = self.changes(since=token)
+        self.assertEqual([recipe["title"] for recipe in changes["results"]], ["Renamed"])
+        self.assertEqual(changes["deleted"], [deleted.pk])
+        self.assertEqual(self.changes(since=changes["token"])["results"], [])
+
+    def test_rejects_invalid_and_expired_tokens(self):
+        self.assertEqual(self.client.get("/api/recipes/changes/?since=nonsense").status_code, 400)
+        self.assertEqual(self.client.get("/api/recipes/changes/?limit=0").status_code, 400)
+
+        expired = encode_token(timezone.now() - timedelta(days=31), 1)
+        self.assertEqual(self.client.get(f"/api/recipes/changes/?since={expired}").status_code, 410)
+
+
+def recipe_payload(ingredients=3, steps=3, **fields):
+    # Valid nested recipe data with numbered ingredients and steps
+    return {
+        "title": "Tomato soup",
+        "description": "Warming soup",
+        "prep_duration": 10,
+        "cook_duration": 30,
+        "ingredients": [{"name": f"Ingredient {i}"} for i in range(ingredients)],
+        "steps": [
+            {"step_number": number, "instruction": f"Step {number}"}
+            for number in range(1, steps + 1)
+        ],
+        **fields,
+    }
+
+
+class RecipeSerializerWriteTests(TestCase):
+    # Nested writes must cost a fixed number of queries regardless of how
+    # many ingredients and steps a recipe has
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="creator", password="secret", role="creator"
+        )
+
+    def setUp(self):
+        ingredient_resolver.clear()
+
+    def save(self, data, instance=None, partial=False):
+        serializer = RecipeSerializer(instance, data=data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        if instance is None:
+            return serializer.save(created_by=self.user)
+        return serializer.save()
+
+    def count_queries(self, function, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            function(*args, **kwargs)
+        return len(queries)
+
+    def test_create_query_count_does_not_grow_with_payload(self):
+        small = self.count_queries(self.save, recipe_payload(ingredients=2, steps=2))
+        large = self.count_queries(self.save, recipe_payload(ingredients=20, steps=30))
+        self.assertEqual(small, large)
+
+    def test_create_query_count(self):
+        # recipe insert, ingredient lookup, ingredient insert + read back,
+        # link insert, step insert (inside one savepoint)
+        with self.assertNumQueries(8):
+            recipe = self.save(recipe_payload(ingredients=20, steps=30))
+
+        self.assertEqual(recipe.ingredients.count(), 20)
+        self.assertEqual(recipe.steps.count(), 30)
+
+    def test_create_reuses_existing_ingredients(self):
+        existing = Ingredient.objects.create(name="Flour")
+
+        data = recipe_payload(ingredients=0)
+        data["ingredients"] = [{"name": " flour"}, {"name": "FLOUR "}, {"name": "Brown  sugar"}]
+        recipe = self.save(data)
+
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(
+            sorted(recipe.ingredients.values_list("name", flat=True)),
+            ["Brown  sugar", "Flour"],
+        )
+        self.assertTrue(recipe.ingredients.filter(pk=existing.pk).exists())
+        self.assertEqual(
+            Ingredient.objects.get(name="Brown  sugar").normalized_name, "brown sugar"
+        )
+
+    def test_create_with_known_ingredients_skips_insert(self):
+        self.save(recipe_payload(ingredients=5))
+        with self.assertNumQueries(6):
+            self.save(recipe_payload(ingredients=5))
+
+    def test_cached_ingredients_skip_lookup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.save(recipe_payload(ingredients=5))
+
+        with self.assertNumQueries(5):
+            self.save(recipe_payload(ingredients=5))
+
+    def test_duplicate_step_numbers_are_rejected(self):
+        data = recipe_payload(steps=2)
+        data["steps"][1]["step_number"] = 1
+        serializer = RecipeSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("steps", serializer.errors)
+
+    def test_duplicate_step_numbers_are_rejected_by_the_database(self):
+        recipe = self.save(recipe_payload(steps=1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Step.objects.create(recipe=recipe, step_number=1, instruction="Again")
+
+    def test_update_only_touches_changed_steps(self):
+        recipe = self.save(recipe_payload(ingredients=3, steps=30))
+        before = {step.step_number: step.pk for step in recipe.steps.all()}
+
+        data = recipe_payload(ingredients=3, steps=30)
+        data["steps"][4]["instruction"] = "Stir well"
+        del data["steps"][29]
+        data["steps"].append({"step_number": 40, "instruction": "Serve"})
+
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.save(data, instance=recipe)
+
+        writes = [
+            query["sql"] for query in queries
+            if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+        ]
+        step_writes = [sql for sql in writes if '"recipes_step"' in sql.split("(")[0]]
+        self.assertEqual(len(step_writes), 3)
+        self.assertFalse([sql for sql in writes if '"recipes_recipe"' in sql.split("(")[0]])
+
+        after = {step.step_number: step for step in recipe.steps.all()}
+        self.assertEqual(after[5].instruction, "Stir well")
+        self.assertEqual(after[5].pk, before[5])
+        self.assertEqual(after[1].pk, before[1])
+        self.assertNotIn(30, after)
+        self.assertEqual(after[40].instruction, "Serve")
+
+    def test_update_query_count_does_not_grow_with_payload(self):
+        def edit(steps):
+            recipe = self.save(recipe_payload(ingredients=steps, steps=steps))
+            data = recipe_payload(ingredients=steps, steps=steps, title="Renamed")
+            for step in data["steps"]:
+                step["instruction"] += " (edited)"
+            data["ingredients"] = data["ingredients"][1:] + [{"name": f"New {steps}"}]
+            recipe = Recipe.objects.get(pk=recipe.pk)
+            return self.count_queries(self.save, data, instance=recipe)
+
+        self.assertEqual(edit(2), edit(25))
+
+    def test_unchanged_update_does_not_write(self):
+        recipe = self.save(recipe_payload())
+        recipe = Recipe.objects.get(pk=recipe.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.save(recipe_payload(), instance=recipe)
+
+        writes = [
+            query["sql"] for query in queries
+            if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+        ]
+        self.assertEqual(writes, [])
+
+    def test_partial_update_keeps_nested_data(self):
+        recipe = self.save(recipe_payload(ingredients=2, steps=4))
+        self.save({"title": "Renamed"}, instance=recipe, partial=True)
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Renamed")
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertEqual(Step.objects.filter(recipe=recipe).count(), 4)
+
+    def test_update_replaces_ingredients(self):
+        recipe = self.save(recipe_payload(ingredients=3))
+        data = {"ingredients": [{"name": "Ingredient 2"}, {"name": "Basil"}]}
+        self.save(data, instance=recipe, partial=True)
+
+        self.assertEqual(
+            sorted(recipe.ingredients.values_list("name", flat=True)),
+            ["Basil", "Ingredient 2"],
+        )
+
+
+class RecipeSearchTests(TestCase):
+    # ?q= full-text search with the database's backend
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+
+        def recipe(title, description="Weeknight dinner", ingredients=(), steps=()):
+            recipe = Recipe.objects.create(
+                title=title, description=description, prep_duration=1, cook_duration=1, created_by=cls.creator
+            )
+            recipe.ingredients.add(*(Ingredient.objects.get_or_create(name=name)[0] for name in ingredients))
+            for number, instruction in enumerate(steps, start=1):
+                recipe.steps.create(step_number=number, instruction=instruction)
+            return recipe
+
+        # Flushed here, so edits made by the tests are indexed on their own
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.in_steps = recipe("Pasta bake", steps=["Stir in the tomatoes"])
+            cls.in_ingredients = recipe("Summer salad", ingredients=["Tomato", "Basil"])
+            cls.in_title = recipe("Tomato soup", steps=["Simmer gently"])
+            cls.unrelated = recipe("Pancakes", ingredients=["Flour"])
+
+    def setUp(self):
+        cache.clear()
+        get_search_backend().index()
+        self.client.force_authenticate(self.creator)
+
+    def search(self, text):
+        response = self.client.get("/api/recipes/", {"q": text, "fields": "id"})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_results_are_ranked_by_where_terms_match(self):
+        self.assertEqual(self.search("tomatoes"), [self.in_title.pk, self.in_ingredients.pk, self.in_steps.pk])
+        self.assertEqual(self.search("tomato basil"), [self.in_ingredients.pk])
+        self.assertEqual(self.search("anchovy"), [])
+
+    def test_cursor_pages_keep_the_ranking(self):
+        # Ranked below older recipes, and tied with the one matching in steps
+        with self.captureOnCommitCallbacks(execute=True):
+            late = Recipe.objects.create(
+                title="Roast vegetables", description="Weeknight dinner", prep_duration=1, cook_duration=1,
+                created_by=self.creator,
+            )
+            late.steps.create(step_number=1, instruction="Add the tomatoes")
+
+        ranked = self.search("tomatoes")
+        self.assertEqual(ranked, [self.in_title.pk, self.in_ingredients.pk, late.pk, self.in_steps.pk])
+
+        ids = []
+        url = "/api/recipes/?q=tomatoes&fields=id&pagination=cursor&page_size=1"
+        while url:
+            page = self.client.get(url).json()
+            ids += [recipe["id"] for recipe in page["results"]]
+            last, url = page, page["next"]
+        self.assertEqual(ids, ranked)
+
+        ids = []
+        url = last["previous"]
+        while url:
+            page = self.client.get(url).json()
+            ids = [recipe["id"] for recipe in page["results"]] + ids
+            url = page["previous"]
+        self.assertEqual(ids, ranked[:-1])
+
+        # Ranks in cursors must be numbers
+        token = base64.urlsafe_b64encode(json.dumps({"pk": late.pk, "v": "high"}).encode()).decode()
+        response = self.client.get("/api/recipes/", {"q": "tomatoes", "cursor": token})
+        self.assertEqual(response.status_code, 404)
+
+    def test_edits_are_searchable_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/recipes/{self.unrelated.pk}/", {"title": "Buckwheat crepes"}, format="json")
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(self.search("buckwheat"), [self.unrelated.pk])
+        self.assertEqual(self.search("pancakes"), [])
+
+    def test_rebuild_search_index_command(self):
+        out = io.StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertEqual(out.getvalue().strip(), f"Indexed {Recipe.objects.count()} recipes")
+
+    def test_in_memory_tokens_fold_plurals(self):
+        self.assertEqual(InMemorySearchBackend.tokenize("Tomatoes, eggs & PEAS"), ["tomato", "egg", "pea"])
+
+    @skipUnless(connection.vendor == "postgresql", "search vectors are stored on PostgreSQL only")
+    def test_migration_backfills_search_vectors(self):
+        Recipe.objects.update(search_vector=None)
+        migration = import_module("recipes.migrations.0003_recipe_search_vector")
+        with connection.schema_editor() as schema_editor:
+            migration.backfill_search_vectors(apps, schema_editor)
+
+        self.assertFalse(Recipe.objects.filter(search_vector=None).exists())
+        self.assertEqual(self.search("tomato basil"), [self.in_ingredients.pk])
+
+
+class IngredientCatalogueTests(TestCase):
+    # One catalogue row per normalized ingredient name
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="creator", password="secret", role="creator"
+        )
+
+    def setUp(self):
+        ingredient_resolver.clear()
+
+    def test_normalize(self):
+        self.assertEqual(Ingredient.normalize("  Brown\tSUGAR "), "brown sugar")
+
+    def test_duplicate_name_fails_validation(self):
+        Ingredient.objects.create(name="Flour")
+        with self.assertRaises(ValidationError):
+            Ingredient(name="flour ").full_clean()
+
+    def test_rename_invalidates_cached_ids(self):
+        flour = Ingredient.objects.create(name="Flour")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(ingredient_resolver.resolve(["flour"]), {"flour": flour.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flour.name = "Rye flour"
+            flour.save()
+
+        with self.assertNumQueries(3):
+            ids = ingredient_resolver.resolve(["flour"])
+        self.assertNotEqual(ids["flour"], flour.pk)
+
+    def test_importer_links_ingredient_column(self):
+        Ingredient.objects.create(name="Flour")
+        columns = ["title", "description", "prep_duration", "cook_duration", "ingredients"]
+        rows = [
+            (2, ("Bread", "Loaf", 10, 40, "flour, Water, water")),
+            (3, ("Toast", "Slice", 1, 2, None)),
+        ]
+
+        report = RecipeImporter(created_by=self.user).run(ImportRows(rows, columns))
+
+        self.assertEqual(report.created, 2)
+        bread = Recipe.objects.get(title="Bread")
+        self.assertEqual(sorted(bread.ingredients.values_list("name", flat=True)), ["Flour", "Water"])
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+
+# Columns of xlsx_upload files
+xlsx_columns = ["title", "description", "prep_duration", "cook_duration", "ingredients", "steps"]
+
+
+class ImportRows(list):
+    # In-memory stand-in for ExcelRows
+    def __init__(self, rows, columns):
+        super().__init__(rows)
+        self.columns = columns
+
+
+def xlsx_upload(rows, columns=xlsx_columns):
+    # Workbook in the bulk_upload layout, as an uploaded file
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.append(list(columns))
+    for row in rows:
+        sheet.append(list(row))
+    content = io.BytesIO()
+    book.save(content)
+    return SimpleUploadedFile("recipes.xlsx", content.getvalue())
+
+
+class RecipeImporterTests(TestCase):
+    # Streaming bulk_upload: chunked inserts with a per-row report
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = get_user_model().objects.create_user(username="creator", password="secret", role="creator")
+
+    def setUp(self):
+        ingredient_resolver.clear()
+        self.client.force_authenticate(self.creator)
+
+    def upload(self, rows):
+        return self.client.post("/api/recipes/bulk_upload/", {"file": xlsx_upload(rows)}, format="multipart")
+
+    @override_settings(RECIPE_IMPORT_CHUNK_SIZE=2)
+    def test_bad_rows_are_reported_by_row_number(self):
+        response = self.upload([
+            ("Bread", "Loaf", 10, 40, "Flour", "Knead\nBake"),
+            ("Toast", "Slice", "soon", -1, None, None),
+            (None, None, None, None, None, None),
+            ("Soup", "Hot", 5, 20, None, None),
+            ("", "Nameless", 1, 1, None, None),
+            ("Salad", "Cold", 0, 0, None, None),
+        ])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertEqual((body["processed"], body["created"], body["failed"]), (5, 3, 2))
+        self.assertEqual(body["errors"], [
+            {"row": 3, "errors": {
+                "prep_duration": "A valid integer is required.",
+                "cook_duration": "Ensure this value is greater than or equal to 0.",
+            }},
+            {"row": 6, "errors": {"title": "This field is required."}},
+        ])
+        self.assertEqual(
+            sorted(Recipe.objects.filter(created_by=self.creator).values_list("title", flat=True)),
+            ["Bread", "Salad", "Soup"],
+        )
+        self.assertEqual(list(Recipe.objects.get(title="Bread").steps.values_list("instruction", flat=True)), [
+            "Knead", "Bake",
+        ])
+
+    def test_rows_the_database_rejects_are_retried_one_by_one(self):
+        bulk_create = Step.objects.bulk_create
+
+        def reject_bad_steps(steps, **kwargs):
+            if any(step.instruction == "Rejected" for step in steps):
+                raise IntegrityError("step rejected")
+            return bulk_create(steps, **kwargs)
+
+        rows = [(f"Recipe {i}", "Text", 1, 1, None, "Rejected" if i == 1 else "Cook") for i in range(3)]
+        with mock.patch.object(Step.objects, "bulk_create", side_effect=reject_bad_steps):
+            report = RecipeImporter(created_by=self.creator, chunk_size=3).run(
+                ImportRows([(number, row) for number, row in enumerate(rows, start=2)], xlsx_columns)
+            )
+
+        self.assertEqual((report.created, report.failed), (2, 1))
+        self.assertEqual(report.errors, [{"row": 3, "errors": {"non_field_errors": "step rejected"}}])
+        self.assertEqual(
+            list(Recipe.objects.order_by("title").values_list("title", flat=True)), ["Recipe 0", "Recipe 2"]
+        )
+        self.assertFalse(Step.objects.filter(instruction="Rejected").exists())
+
+    def test_chunk_size_sets_the_batches(self):
+        rows = ImportRows(
+            [(number, (f"Recipe {number}", "Text", 1, 1, None, None)) for number in range(2, 7)], xlsx_columns
+        )
+        progress = []
+
+        with override_settings(RECIPE_IMPORT_CHUNK_SIZE=2):
+            report = RecipeImporter(created_by=self.creator).run(
+                rows, progress=lambda report: progress.append(report.created)
+            )
+
+        self.assertEqual(report.created, 5)
+        self.assertEqual(progress, [2, 4, 5])
+
+    def test_file_without_valid_rows_is_rejected(self):
+        response = self.upload([("Bread", "Loaf", "x", 1, None, None), (None, "No title", 1, 1, None, None)])
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual((response.json()["created"], response.json()["failed"]), (0, 2))
+        self.assertFalse(Recipe.objects.exists())
+
+
+class IngredientFinderTests(TestCase):
+    # find_by_ingredients ranks recipes by ingredient coverage
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+
+    def setUp(self):
+        ingredient_resolver.clear()
+        ingredient_index.postings = None
+        self.client.force_authenticate(self.viewer)
+
+        self.recipes = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            for title, names in {
+                "bread": ["Flour", "Water", "Salt"],
+                "cake": ["Flour", "Sugar", "Eggs", "Butter"],
+                "brine": ["Water", "Salt"],
+            }.items():
+                data = recipe_payload(title=title, ingredients=0, steps=1)
+                data["ingredients"] = [{"name": name} for name in names]
+                serializer = RecipeSerializer(data=data)
+                serializer.is_valid(raise_exception=True)
+                self.recipes[title] = serializer.save(created_by=self.creator).pk
+
+    def find(self, query):
+        response = self.client.get(f"/api/recipes/find_by_ingredients/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [(result["title"], result["missing_ingredients"]) for result in response.json()["results"]]
+
+    def test_any_ranks_by_coverage(self):
+        self.assertEqual(
+            self.find("ingredients=flour,water,salt"),
+            [("bread", 0), ("brine", 0), ("cake", 3)],
+        )
+
+    def test_all_and_missing(self):
+        self.assertEqual(self.find("ingredients=water,salt&match=all"), [("brine", 0), ("bread", 1)])
+        self.assertEqual(self.find("ingredients=flour,sugar&missing=1"), [])
+        self.assertEqual(self.find("ingredients=flour,sugar,eggs&missing=1"), [("cake", 1)])
+        self.assertEqual(self.find("ingredients=flour,unknown&match=all"), [])
+
+    def test_index_follows_ingredient_changes(self):
+        self.find("ingredients=salt")
+
+        recipe = Recipe.objects.get(pk=self.recipes["brine"])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients.remove(Ingredient.objects.get(normalized_name="salt"))
+
+        self.assertEqual(self.find("ingredients=salt"), [("bread", 2)])
+
+
+class TopRecipesTests(TestCase):
+    # Most favourited recipes of all time and within sliding windows
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewers = [
+            User.objects.create_user(username=f"viewer{i}", password="secret", role="viewer")
+            for i in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Recipe {i}", description="", prep_duration=1, cook_duration=1, created_by=creator
+            )
+            for i in range(4)
+        ]
+        # All time: recipe 0 has 3 favourites, recipes 1 and 2 two each.
+        # Recipe 0's are more than a week old.
+        for recipe, viewers in zip(cls.recipes, [cls.viewers, cls.viewers[:2], cls.viewers[1:]]):
+            for viewer in viewers:
+                Favourite.objects.create(user=viewer, recipe=recipe)
+        Favourite.objects.filter(recipe=cls.recipes[0]).update(created_at=timezone.now() - timedelta(days=8))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewers[0])
+
+    def test_all_time_reads_the_counter(self):
+        self.assertEqual(
+            top_recipes(ALL_TIME, limit=2), [(self.recipes[0].pk, 3), (self.recipes[2].pk, 2)]
+        )
+
+    def test_windows_are_counted_in_one_grouped_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            ranked = top_recipes("7d", limit=10)
+        self.assertEqual(ranked, [(self.recipes[2].pk, 2), (self.recipes[1].pk, 2)])
+        self.assertEqual(len(queries), 1)
+        self.assertIn("GROUP BY", queries[0]["sql"])
+        self.assertIn("LIMIT 10", queries[0]["sql"])
+
+        self.assertEqual(top_recipes("30d", limit=1), [(self.recipes[0].pk, 3)])
+
+    def test_endpoint(self):
+        response = self.client.get("/api/recipes/top/", {"window": "7d", "fields": "id"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(card["id"], card["window_favourites"]) for card in response.json()["results"]],
+            [(self.recipes[2].pk, 2), (self.recipes[1].pk, 2)],
+        )
+        self.assertEqual(self.client.get("/api/recipes/top/", {"window": "1y"}).status_code, 400)
+
+
+class FavouritedFlagTests(TestCase):
+    # Recipe responses say whether the viewer favourited each recipe
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Recipe {i}", description="", prep_duration=1, cook_duration=1, created_by=creator
+            )
+            for i in range(5)
+        ]
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[1])
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[3])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def test_list_flags_favourites_without_extra_queries(self):
+        # page count + page rows
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/recipes/?fields=id,is_favourited")
+
+        flags = {result["id"]: result["is_favourited"] for result in response.json()["results"]}
+        self.assertEqual(
+            flags,
+            {recipe.pk: index in (1, 3) for index, recipe in enumerate(self.recipes)},
+        )
+
+    def test_favourite_ids_revalidates_with_etag(self):
+        response = self.client.get("/api/recipes/favourite_ids/")
+        self.assertEqual(response.json()["ids"], [self.recipes[3].pk, self.recipes[1].pk])
+
+        etag = response["ETag"]
+        response = self.client.get("/api/recipes/favourite_ids/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Favourite.objects.filter(user=self.viewer, recipe=self.recipes[1]).delete()
+        Favourite.objects.create(user=self.viewer, recipe=self.recipes[0])
+        response = self.client.get("/api/recipes/favourite_ids/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["ids"], [self.recipes[0].pk, self.recipes[3].pk])
+
+
+class ResponseCacheTests(TestCase):
+    # List and detail responses are reused until a recipe changes
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+
+    def setUp(self):
+        # Created here so their commit callbacks run before the tests
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes = [
+                Recipe.objects.create(
+                    title=f"Recipe {i}", description="", prep_duration=1, cook_duration=1, created_by=self.creator
+                )
+                for i in range(3)
+            ]
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get("/api/recipes/?page=1")
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        # Only the favourite counts and flags are read again
+        with self.assertNumQueries(1):
+            second = self.client.get("/api/recipes/?page=1")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.json(), first.json())
+
+    def test_favourites_are_current_per_user(self):
+        self.client.get("/api/recipes/")
+
+        Favourite.objects.create(user=self.viewer, recipe=self.recipes[0])
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(favourite_count=1)
+        response = self.client.get("/api/recipes/")
+        self.assertEqual(response["X-Cache"], "HIT")
+        card = next(card for card in response.json()["results"] if card["id"] == self.recipes[0].pk)
+        self.assertEqual((card["favourite_count"], card["is_favourited"]), (1, True))
+
+        self.client.force_authenticate(self.creator)
+        card = next(
+            card for card in self.client.get("/api/recipes/").json()["results"] if card["id"] == self.recipes[0].pk
+        )
+        self.assertEqual((card["favourite_count"], card["is_favourited"]), (1, False))
+
+    def test_detail_revalidates_with_etag(self):
+        url = f"/api/recipes/{self.recipes[0].pk}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Favourite.objects.create(user=self.viewer, recipe=self.recipes[0])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_recipe_edit_retires_cached_responses(self):
+        url = f"/api/recipes/{self.recipes[0].pk}/"
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].title = "Renamed"
+            self.recipes[0].save()
+
+        response = self.client.get(url)
+        self.assertEqual((response["X-Cache"], response.json()["title"]), ("MISS", "Renamed"))
+
+    def test_favourite_ranking_is_not_cached(self):
+        self.client.get("/api/recipes/?ordering=-favourite_count")
+        response = self.client.get("/api/recipes/?ordering=-favourite_count")
+        self.assertNotIn("X-Cache", response)
+
+
+class RecipeListFieldsTests(TestCase):
+    # ?fields= and ?expand= pick what the list renders and what it fetches
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipe = Recipe.objects.create(
+                title="Soup", description="Hot", prep_duration=5, cook_duration=20, created_by=cls.creator
+            )
+            cls.recipe.ingredients.add(Ingredient.objects.create(name="leek"), Ingredient.objects.create(name="salt"))
+            cls.recipe.steps.create(step_number=2, instruction="Season")
+            cls.recipe.steps.create(step_number=1, instruction="Boil")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def list(self, query=""):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/recipes/?{query}")
+        self.assertEqual(response.status_code, 200)
+        sql = " ".join(query["sql"] for query in queries.captured_queries)
+        return response.json()["results"][0], sql
+
+    def test_default_cards_leave_out_expandable_fields(self):
+        card, sql = self.list()
+        self.assertEqual(list(card), [
+            name for name in RecipeListSerializer.Meta.fields
+            if name not in RecipeListSerializer.expandable_fields
+        ])
+        self.assertEqual(card["ingredient_count"], 2)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn("recipes_step", sql)
+
+    def test_fields_select_a_subset(self):
+        card, sql = self.list("fields=id, title,unknown")
+        self.assertEqual(card, {"id": self.recipe.pk, "title": "Soup"})
+        self.assertNotIn("accounts_user", sql)
+        self.assertNotIn("favorites_favourite", sql)
+        self.assertNotIn("recipes_recipe_ingredients", sql)
+
+    def test_expand_adds_fields_and_their_prefetches(self):
+        card, sql = self.list("expand=description,steps")
+        self.assertEqual(card["description"], "Hot")
+        self.assertEqual([step["instruction"] for step in card["steps"]], ["Boil", "Season"])
+        self.assertNotIn("ingredients", card)
+
+        card, sql = self.list("fields=title&expand=ingredients")
+        self.assertEqual(list(card), ["title", "ingredients"])
+        self.assertEqual(sorted(ingredient["name"] for ingredient in card["ingredients"]), ["leek", "salt"])
+        self.assertNotIn("recipes_step", sql)
+
+    def test_ingredient_matches_always_render_their_scores(self):
+        response = self.client.get("/api/recipes/find_by_ingredients/?ingredients=leek&fields=title")
+        self.assertEqual(response.status_code, 200)
+        match = response.json()["results"][0]
+        self.assertEqual(
+            set(match), {"title", "matched_ingredients", "missing_ingredients", "coverage"}
+        )
+
+
+class AsyncViewTests(TestCase):
+    # The async read paths answer like their DRF counterparts
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.creator_token = Token.objects.get(user=creator).key
+        cls.viewer_token = Token.objects.get(user=cls.viewer).key
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Recipe {i}", description="", prep_duration=i, cook_duration=1, created_by=creator
+            )
+            for i in range(3)
+        ]
+        cls.recipes[0].steps.create(step_number=1, instruction="Boil")
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, token=None, **headers):
+        headers["Authorization"] = f"Token {token or self.viewer_token}"
+        return self.async_client.get(url, headers=headers)
+
+    async def test_list_and_detail_match_sync_views(self):
+        sync_client = APIClient()
+        sync_client.credentials(HTTP_AUTHORIZATION=f"Token {self.viewer_token}")
+
+        for path in ["?page_size=2&page=2&ordering=-prep_duration", "?fields=id,is_favourited", f"{self.recipes[0].pk}/"]:
+            response = await self.get(f"/api/async/recipes/{path}")
+            self.assertEqual(response.status_code, 200)
+            expected = await sync_to_async(sync_client.get)(f"/api/recipes/{path}")
+            # Page links differ in their path only
+            content = response.content.decode().replace("/api/async/recipes/", "/api/recipes/")
+            self.assertEqual(json.loads(content), expected.json())
+
+    async def test_authentication_and_roles(self):
+        response = await self.async_client.get("/api/async/recipes/")
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.get("/api/async/recipes/my_favourites/", token=self.creator_token)
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.get("/api/async/recipes/999999/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_favourite_toggles(self):
+        url = f"/api/async/recipes/{self.recipes[0].pk}/"
+        headers = {"Authorization": f"Token {self.viewer_token}"}
+
+        response = await self.async_client.post(url + "favourite/", headers=headers)
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.post(url + "favourite/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        favourites = (await self.get("/api/async/recipes/my_favourites/")).json()
+        self.assertEqual([recipe["id"] for recipe in favourites["results"]], [self.recipes[1].pk, self.recipes[0].pk])
+
+        response = await self.async_client.delete(url + "unfavourite/", headers=headers)
+        self.assertEqual(response.status_code, 204)
+        response = await self.async_client.delete(url + "unfavourite/", headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.delete("/api/async/recipes/999999/unfavourite/", headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_pdf_is_streamed_and_revalidated(self):
+        with temporary_media():
+            url = f"/api/async/recipes/{self.recipes[0].pk}/download_pdf/"
+            response = await self.get(url)
+            self.assertEqual(response.status_code, 200)
+            content = b"".join([chunk async for chunk in response.streaming_content])
+            self.assertTrue(content.startswith(b"%PDF"))
+            self.assertEqual(int(response["Content-Length"]), len(content))
+
+            response = await self.get(url, **{"If-None-Match": response["ETag"]})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_media_files_are_streamed(self):
+        with temporary_media() as media_root:
+            with open(os.path.join(media_root, "note.txt"), "wb") as file:
+                file.write(b"hello")
+
+            response = await serve_media(RequestFactory().get("/media/note.txt"), "note.txt")
+            self.assertEqual(response["Content-Type"], "text/plain")
+            self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), b"hello")
+
+            with self.assertRaises(Http404):
+                await serve_media(RequestFactory().get("/media/../settings.py"), "../settings.py")
+
+
+class RecipePdfTests(TestCase):
+    # download_pdf serves documents from the rendered PDF cache
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        # Flushed here, so edits made by the tests purge documents on their own
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipe = Recipe.objects.create(
+                title="Stew", description="Slow", prep_duration=10, cook_duration=90, created_by=cls.creator
+            )
+            cls.recipe.steps.create(step_number=1, instruction="Simmer")
+
+    def setUp(self):
+        self.enterContext(temporary_media())
+        self.client.force_authenticate(self.viewer)
+
+    def download(self, **headers):
+        return self.client.get(f"/api/recipes/{self.recipe.pk}/download_pdf/", **headers)
+
+    def test_download_revalidates_with_etag(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        etag = response["ETag"]
+
+        with mock.patch("recipes.pdf.build_recipe_pdf") as build:
+            self.assertEqual(self.download(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            response = self.download()
+            self.assertEqual(response["ETag"], etag)
+            b"".join(response.streaming_content)
+        build.assert_not_called()
+
+    def test_background_pdfs_are_stored_under_the_recipe_id(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(title="Beef / stew")
+        response = self.client.post(f"/api/recipes/{self.recipe.pk}/download_pdf_async/")
+        self.assertEqual(response.status_code, 202)
+
+        job = run_job(claim_next("host:1"))
+        self.assertEqual(job.status, Job.SUCCEEDED, job.error)
+        self.assertEqual(job.result_file.name, f"jobs/results/recipe-{self.recipe.pk}.pdf")
+
+        response = self.client.get(f"/api/jobs/{job.pk}/result/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="Beef / stew.pdf"', response["Content-Disposition"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_edits_replace_the_cached_document(self):
+        etag = self.download()["ETag"]
+        storage = pdf_cache.storage
+        self.assertEqual(len(storage.listdir(str(self.recipe.pk))[1]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.title = "Beef stew"
+            self.recipe.save()
+        self.assertEqual(storage.listdir(str(self.recipe.pk))[1], [])
+
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        b"".join(response.streaming_content)
+        self.assertEqual(len(storage.listdir(str(self.recipe.pk))[1]), 1)
+
+    def test_cached_documents_stay_readable_when_purged(self):
+        cached = pdf_cache.get(self.recipe)
+        pdf_cache.invalidate([self.recipe.pk])
+
+        with cached.open() as file:
+            self.assertTrue(file.read().startswith(b"%PDF"))
+
+    def test_documents_purged_before_opening_are_rendered_again(self):
+        storage = pdf_cache.storage
+        open_file = storage.open
+        calls = []
+
+        def purged_once(name, mode="rb"):
+            calls.append(name)
+            if len(calls) == 1:
+                raise FileNotFoundError(name)
+            return open_file(name, mode)
+
+        with mock.patch.object(storage, "open", side_effect=purged_once):
+            cached = pdf_cache.get(self.recipe)
+
+        self.assertEqual(len(calls), 2)
+        with cached.open() as file:
+            self.assertTrue(file.read().startswith(b"%PDF"))
+
+    def test_images_are_read_from_storages_without_paths(self):
+        storage = InMemoryStorage()
+        image = io.BytesIO()
+        PilImage.new("RGB", (40, 30), "red").save(image, format="PNG")
+        name = storage.save("recipes/red.png", ContentFile(image.getvalue()))
+
+        output = io.BytesIO()
+        SimpleDocTemplate(output).build([PdfImage(SimpleNamespace(storage=storage, name=name), 40, 30)])
+        self.assertIn(b"/Subtype /Image", output.getvalue())
+
+
+class ImageRenditionTests(TestCase):
+    # Pre-sized copies of uploaded images and the URLs that point at them
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+
+    def setUp(self):
+        self.enterContext(temporary_media())
+        self.client.force_authenticate(self.creator)
+
+    def png(self, name="pizza.png", size=(800, 600), color="red"):
+        image = io.BytesIO()
+        PilImage.new("RGB", size, color).save(image, format="PNG")
+        return ContentFile(image.getvalue(), name=name)
+
+    def create_recipe(self, thumbnail=None):
+        return Recipe.objects.create(
+            title="Pizza", description="Flat", prep_duration=10, cook_duration=10,
+            created_by=self.creator, thumbnail=thumbnail or self.png(),
+        )
+
+    def forget_renditions(self, recipe):
+        # As for images uploaded before renditions were recorded
+        Recipe.objects.filter(pk=recipe.pk).update(renditions_of="")
+        recipe.refresh_from_db()
+
+    def renditions(self, recipe):
+        response = self.client.get(f"/api/recipes/{recipe.pk}/")
+        self.assertEqual(response.status_code, 200)
+        return response.data["thumbnail"], response.data["thumbnail_renditions"]
+
+    def test_uploads_get_every_rendition(self):
+        recipe = self.create_recipe()
+        storage = recipe.thumbnail.storage
+
+        for rendition, spec in RENDITIONS.items():
+            with storage.open(rendition_name(recipe.thumbnail.name, rendition)) as file:
+                image = PilImage.open(file)
+                self.assertEqual(image.format, spec["format"])
+                # 800x600 scaled into the bounding box, keeping 4:3
+                self.assertEqual(image.size, spec["size"])
+
+        original, urls = self.renditions(recipe)
+        self.assertEqual(set(urls), set(RENDITIONS))
+        self.assertEqual(urls["card"], "http://testserver" + rendition_url(recipe.thumbnail, "card"))
+        self.assertNotEqual(urls["card"], original)
+        self.assertEqual(pdf_source(recipe.thumbnail), rendition_name(recipe.thumbnail.name, "pdf"))
+
+    def test_originals_with_one_stem_get_their_own_renditions(self):
+        png = self.create_recipe(self.png("pizza.png", color="red"))
+        jpeg = io.BytesIO()
+        PilImage.new("RGB", (800, 600), "blue").save(jpeg, format="JPEG")
+        jpg = self.create_recipe(ContentFile(jpeg.getvalue(), name="pizza.jpg"))
+
+        self.assertNotEqual(rendition_url(png.thumbnail, "card"), rendition_url(jpg.thumbnail, "card"))
+        for recipe, color in ((png, (255, 0, 0)), (jpg, (0, 0, 255))):
+            with recipe.thumbnail.storage.open(pdf_source(recipe.thumbnail)) as file:
+                pixel = PilImage.open(file).convert("RGB").getpixel((0, 0))
+            self.assertTrue(all(abs(a - b) < 10 for a, b in zip(pixel, color)), pixel)
+
+    def test_serializing_does_not_ask_the_storage(self):
+        self.create_recipe()
+        self.create_recipe()
+        cache.clear()
+
+        with mock.patch.object(FileSystemStorage, "exists") as exists:
+            response = self.client.get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        exists.assert_not_called()
+        self.assertIn("/renditions/", response.json()["results"][0]["thumbnail_renditions"]["card"])
+
+    def test_small_images_are_not_upscaled(self):
+        recipe = self.create_recipe()
+        recipe.thumbnail = self.png("small.png", size=(100, 50))
+        recipe.save()
+
+        with recipe.thumbnail.storage.open(rendition_name(recipe.thumbnail.name, "card")) as file:
+            self.assertEqual(PilImage.open(file).size, (100, 50))
+
+    def test_unreadable_uploads_have_no_renditions(self):
+        with self.assertLogs("recipes.images", "WARNING"):
+            recipe = Recipe.objects.create(
+                title="Broken", description="Not an image", prep_duration=1, cook_duration=1,
+                created_by=self.creator, thumbnail=ContentFile(b"not an image", name="broken.png"),
+            )
+        storage = recipe.thumbnail.storage
+        self.assertFalse(storage.exists(rendition_name(recipe.thumbnail.name, "card")))
+        self.assertEqual(rendition_url(recipe.thumbnail, "card"), recipe.thumbnail.url)
+
+    def test_backfill_writes_only_missing_renditions(self):
+        recipe = self.create_recipe()
+        recipe.thumbnail.storage.delete(rendition_name(recipe.thumbnail.name, "card"))
+        self.forget_renditions(recipe)
+
+        output = io.StringIO()
+        call_command("backfill_image_renditions", stdout=output)
+        self.assertIn("recipes: 1 images, 1 renditions written", output.getvalue())
+
+        output = io.StringIO()
+        call_command("backfill_image_renditions", "--force", stdout=output)
+        self.assertIn(f"recipes: 1 images, {len(RENDITIONS)} renditions written", output.getvalue())
+
+    def test_missing_renditions_fall_back_to_the_original(self):
+        recipe = self.create_recipe()
+        storage = recipe.thumbnail.storage
+        for rendition in RENDITIONS:
+            storage.delete(rendition_name(recipe.thumbnail.name, rendition))
+        self.forget_renditions(recipe)
+
+        original, urls = self.renditions(recipe)
+        self.assertEqual(urls, {rendition: original for rendition in RENDITIONS})
+        self.assertEqual(pdf_source(recipe.thumbnail), recipe.thumbnail.name)
+
+        call_command("backfill_image_renditions", stdout=io.StringIO())
+        original, urls = self.renditions(recipe)
+        for rendition, url in urls.items():
+            self.assertTrue(url.endswith(rendition_name(recipe.thumbnail.name, rendition)))
+
+
+class CookbookTests(TestCase):
+    # Many recipes exported as one PDF with a table of contents
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Stew & dumplings {i}", description="<b>", prep_duration=i, cook_duration=1, created_by=creator
+            )
+            for i in range(5)
+        ]
+        for recipe in cls.recipes:
+            recipe.steps.create(step_number=1, instruction="Simmer")
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[1])
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[3])
+
+    def setUp(self):
+        self.client.force_authenticate(self.viewer)
+
+    def outline(self, response):
+        # Titles of the PDF outline: the cookbook, then one per recipe
+        content = b"".join(response.streaming_content)
+        self.assertTrue(content.startswith(b"%PDF"))
+        return [title.decode() for title in re.findall(rb"/Title \(([^)]*)\)", content)[1:]]
+
+    def test_filtered_recipes_in_list_order(self):
+        with self.settings(COOKBOOK_BATCH_SIZE=2):
+            response = self.client.get("/api/recipes/cookbook/?ordering=-prep_duration")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn('filename="cookbook.pdf"', response["Content-Disposition"])
+        self.assertEqual(
+            self.outline(response), [recipe.title for recipe in reversed(self.recipes)]
+        )
+
+    def test_newest_first_by_default(self):
+        response = self.client.get("/api/recipes/cookbook/")
+        self.assertEqual(
+            self.outline(response), [recipe.title for recipe in reversed(self.recipes)]
+        )
+
+    def test_favourites(self):
+        response = self.client.get("/api/recipes/cookbook/?favourites=true")
+        self.assertEqual(
+            self.outline(response), [self.recipes[3].title, self.recipes[1].title]
+        )
+
+    def test_rejects_empty_and_oversized_selections(self):
+        response = self.client.get("/api/recipes/cookbook/?prep_duration=99")
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(COOKBOOK_MAX_RECIPES=4):
+            response = self.client.get("/api/recipes/cookbook/")
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeExportTests(TestCase):
+    # Exports use the bulk_upload layout and can be imported again
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.importer = User.objects.create_user(username="importer", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+
+        flour = Ingredient.objects.create(name="Flour")
+        water = Ingredient.objects.create(name="Water")
+        salt = Ingredient.objects.create(name="Salt, to taste")
+        recipes = [
+            ("Bread", "", [flour, water, salt]),
+            ("=SUM(1, 2)", "+", [flour, water]),
+            ('Pie, "deep dish"', "'@", [salt]),
+        ]
+        for i, (title, prefix, ingredients) in enumerate(recipes):
+            recipe = Recipe.objects.create(
+                title=title, description=f"{prefix}Line one\nline two, {i}", prep_duration=i,
+                cook_duration=10, created_by=cls.creator,
+            )
+            recipe.ingredients.add(*ingredients)
+            recipe.steps.create(step_number=1, instruction="Mix")
+            recipe.steps.create(step_number=2, instruction=f"Bake {i}")
+
+    def setUp(self):
+        ingredient_resolver.clear()
+        self.client.force_authenticate(self.creator)
+
+    def recipes(self, user):
+        return [
+            (
+                recipe.title, recipe.description, recipe.prep_duration, recipe.cook_duration,
+                sorted(ingredient.name for ingredient in recipe.ingredients.all()),
+                [step.instruction for step in recipe.steps.all()],
+            )
+            for recipe in Recipe.objects.filter(created_by=user).order_by("prep_duration")
+        ]
+
+    def export(self, query):
+        response = self.client.get(f"/api/recipes/export/{query}")
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return b"".join(response.streaming_content)
+        return response.content
+
+    def test_csv_round_trip(self):
+        content = self.export("?type=csv&ordering=-prep_duration")
+        self.assertTrue(content.decode("utf-8-sig").startswith(
+            "title,description,prep_duration,cook_duration,ingredients,steps\r\n"
+        ))
+
+        report = RecipeImporter(created_by=self.importer).run(read_import_rows(io.BytesIO(content), "recipes.csv"))
+        self.assertEqual(report.created, 3)
+        self.assertEqual(self.recipes(self.importer), self.recipes(self.creator))
+
+    def test_xlsx_round_trip(self):
+        content = self.export("")
+        report = RecipeImporter(created_by=self.importer).run(read_import_rows(io.BytesIO(content), "recipes.xlsx"))
+        self.assertEqual(report.created, 3)
+        self.assertEqual(self.recipes(self.importer), self.recipes(self.creator))
+
+    def test_newest_first_by_default(self):
+        content = self.export("?type=csv").decode("utf-8-sig")
+        titles = [row[0] for row in csv.reader(io.StringIO(content))][1:]
+        self.assertEqual(titles, ['Pie, "deep dish"', "'=SUM(1, 2)", "Bread"])
+
+    def test_filters_and_permissions(self):
+        content = self.export("?type=csv&prep_duration=1").decode("utf-8-sig")
+        self.assertEqual(content.count("\r\n"), 2)
+        # Spreadsheets would run the title as a formula without the quote
+        self.assertIn("'=SUM(1, 2)", content)
+        self.assertIn('"\'+Line one', content)
+
+        self.assertEqual(self.client.get("/api/recipes/export/?type=pdf").status_code, 400)
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.client.get("/api/recipes/export/").status_code, 403)
+
+    def test_bulk_upload_accepts_csv(self):
+        file = SimpleUploadedFile(
+            "recipes.csv",
+            b"title,description,prep_duration,cook_duration,ingredients,steps\r\n"
+            b'Soup,Hot,5,20,"Water, Salt","Boil\nServe"\r\n',
+            content_type="text/csv",
+        )
+        self.client.force_authenticate(self.importer)
+        response = self.client.post("/api/recipes/bulk_upload/", {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.recipes(self.importer), [("Soup", "Hot", 5, 20, ["Salt", "Water"], ["Boil", "Serve"])])
+
+    @override_settings(RECIPE_IMPORT_CHUNK_SIZE=100)
+    def test_bulk_upload_reports_undecodable_csv_data(self):
+        rows = b"".join(b"Soup %d,Hot,5,20\r\n" % i for i in range(1000))
+        file = SimpleUploadedFile(
+            "recipes.csv", b"title,description,prep_duration,cook_duration\r\n" + rows + b"\xff\xfe,x,1,1\r\n",
+            content_type="text/csv",
+        )
+        self.client.force_authenticate(self.importer)
+        response = self.client.post("/api/recipes/bulk_upload/", {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertIn("File is unreadable after line", body["file_error"])
+        self.assertEqual(body["created"], Recipe.objects.filter(created_by=self.importer).count())
+        self.assertGreater(body["created"], 0)
+
+        file = SimpleUploadedFile(
+            "recipes.csv", b"title,description,prep_duration,cook_duration\r\n" + rows.replace(b",5,", b",x,") + b"\xff",
+            content_type="text/csv",
+        )
+        response = self.client.post("/api/recipes/bulk_upload/", {"file": file}, format="multipart")
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()["created"], 0)
+        self.assertIsNotNone(response.json()["file_error"])
+
+
+class BatchFetchTests(TestCase):
+    # Many recipes by id in one request
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Recipe {i}", description="", prep_duration=1, cook_duration=1, created_by=creator
+            )
+            for i in range(3)
+        ]
+        for recipe in cls.recipes:
+            recipe.steps.create(step_number=1, instruction="Boil")
+        Favourite.objects.create(user=cls.viewer, recipe=cls.recipes[2])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def test_results_follow_requested_order(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+
+        # recipes, ingredients, steps
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/recipes/batch/?ids={third},999999,{first},{third}")
+
+        results = response.json()["results"]
+        self.assertEqual([(result["id"], result["status"]) for result in results], [
+            (third, "ok"), (999999, "not_found"), (first, "ok"),
+        ])
+        detail = self.client.get(f"/api/recipes/{third}/").json()
+        self.assertEqual(results[0]["recipe"], detail)
+        self.assertTrue(results[0]["recipe"]["is_favourited"])
+
+    def test_rejects_invalid_ids(self):
+        self.assertEqual(self.client.get("/api/recipes/batch/").status_code, 400)
+        self.assertEqual(self.client.get("/api/recipes/batch/?ids=1,x").status_code, 400)
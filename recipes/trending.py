@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from favorites.models import Favourite
+from .models import Recipe
+
+
+ALL_TIME = "all"
+
+# Sliding windows over Favourite.created_at
+WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
+
+def top_recipes(window=ALL_TIME, limit=10):
+    # [(recipe_id, favourites)] most favourited first. All-time rankings
+    # read the favourite_count index; windows count recent favourites over
+    # the (created_at, recipe) index and are cached for a short while.
+    if window == ALL_TIME:
+        return list(
+            Recipe.objects.filter(favourite_count__gt=0)
+            .order_by("-favourite_count", "-pk")
+            .values_list("pk", "favourite_count")[:limit]
+        )
+
+    key = f"recipes:trending:{window}:{limit}"
+    ranked = cache.get(key)
+    if ranked is None:
+        # Counted in the database from a range scan of the (created_at,
+        # recipe) index, so only the top rows leave it
+        since = timezone.now() - WINDOWS[window]
+        ranked = list(
+            Favourite.objects.filter(created_at__gte=since)
+            .values("recipe_id")
+            .annotate(favourites=Count("*"))
+            .order_by("-favourites", "-recipe_id")
+            .values_list("recipe_id", "favourites")[:limit]
+        )
+        cache.set(key, ranked, settings.TRENDING_CACHE_SECONDS)
+    return ranked
@@ -1,51 +1,213 @@
+import json
+
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Prefetch
-
-from .models import Recipe, Step
-from .serializers import RecipeSerializer
+from rest_framework.reverse import reverse
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Recipe, Ingredient, Step
+from .serializers import (
+    RecipeIdsSerializer,
+    RecipeListSerializer,
+    RecipeMatchSerializer,
+    RecipeRankingSerializer,
+    RecipeSerializer,
+)
+from .finder import MATCH_ALL, MATCH_ANY, ingredient_index
+from .trending import ALL_TIME, WINDOWS, top_recipes
+from .changes import ChangeTokenExpired, InvalidChangeToken, changes_since
+from utils.cache import CachedResponseMixin, generation_age
+from utils.pagination import SizedPageNumberPagination
+from utils.routers import ReplicaReadMixin, reading_from_replica
+from favorites.bulk import REMOVED, add_favourites, remove_favourites
 from favorites.models import Favourite
 from accounts.permissions import IsCreator, IsViewer
-import openpyxl
-from django.db import transaction
-
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from django.http import HttpResponse
-import io
+from .exporters import XLSX_CONTENT_TYPE, export_rows, stream_csv, write_xlsx
+from .importers import InvalidImportFile, RecipeImporter, read_import_rows
+from .signals import RESPONSES_GENERATION_KEY
+from utils.jobs import enqueue
+
+from .pdf import build_cookbook_pdf, pdf_cache, spooled_pdf
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import content_disposition_header, http_date, quote_etag
+import tempfile
 
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from reportlab.platypus import Image
-from reportlab.lib.utils import ImageReader
-from reportlab.lib.pagesizes import A4
-import os
+from rest_framework.filters import OrderingFilter
+from .filters import RecipeSearchFilter
 
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     # Main ViewSet to manage recipes (CRUD + custom actions)
     serializer_class = RecipeSerializer
 
+    # Read-only actions served from a database replica when there is one
+    replica_actions = [
+        "list", "retrieve", "batch", "my_favourites", "favourite_ids", "find_by_ingredients",
+        "top", "export", "download_pdf", "cookbook", "changes",
+    ]
+
+    # List and detail responses are cached until a recipe changes
+    cache_generation_key = RESPONSES_GENERATION_KEY
+
+    # Fields that change without a recipe edit, refreshed on cache hits
+    volatile_fields = ["favourite_count", "is_favourited"]
+
     # All endpoints require authentication by default
     permission_classes = [IsAuthenticated]
 
     # Enable filtering, search and ordering
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ["prep_duration", "cook_duration"]
-    search_fields = ["title", "description"]
-    ordering_fields = ["prep_duration", "cook_duration"]
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter, OrderingFilter]
+    filterset_fields = ["prep_duration", "cook_duration", "created_by"]
+    ordering_fields = ["prep_duration", "cook_duration", "favourite_count"]
+
+    # Model columns needed to render each list field
+    list_field_columns = {
+        "id": ["id"],
+        "title": ["title"],
+        "description": ["description"],
+        "prep_duration": ["prep_duration"],
+        "cook_duration": ["cook_duration"],
+        "thumbnail": ["thumbnail"],
+        "thumbnail_renditions": ["thumbnail", "renditions_of"],
+        "created_by": ["created_by", "created_by__username"],
+        "favourite_count": ["favourite_count"],
+    }
 
     def get_queryset(self):
+        if self.action == "list":
+            return self.get_list_queryset()
+
         # Optimize queries using select_related and prefetch_related
-        return Recipe.objects.select_related("created_by").prefetch_related(
+        queryset = Recipe.objects.defer("search_vector").select_related("created_by").prefetch_related(
             "ingredients",
             Prefetch("steps", queryset=Step.objects.order_by("step_number"))
         )
+        return self.annotate_favourited(queryset)
+
+    def annotate_favourited(self, queryset):
+        # is_favourited for the requesting user as an EXISTS subquery, so
+        # a page of recipes costs no extra queries
+        favourites = Favourite.objects.filter(user_id=self.request.user.pk, recipe_id=OuterRef("pk"))
+        return queryset.annotate(is_favourited=Exists(favourites))
+
+    def get_list_queryset(self):
+        # Fetch only the columns and relations the selected fields need
+        selected = RecipeListSerializer.selected_fields(**self.get_field_selection())
+
+        columns = {"id"}
+        for name in selected:
+            columns.update(self.list_field_columns.get(name, []))
+
+        # Newest first unless searched or ?ordering= is given, as in
+        # cursor mode (KeysetPagination.default_ordering) and the async list
+        queryset = Recipe.objects.only(*columns).order_by("-pk")
+        if "created_by" in selected:
+            queryset = queryset.select_related("created_by")
+
+        if "ingredient_count" in selected:
+            ingredient_links = Recipe.ingredients.through.objects.filter(
+                recipe_id=OuterRef("pk")
+            ).values("recipe_id").annotate(count=Count("*")).values("count")
+            queryset = queryset.annotate(
+                ingredient_count=Coalesce(Subquery(ingredient_links), 0)
+            )
+
+        if "is_favourited" in selected:
+            queryset = self.annotate_favourited(queryset)
+
+        if "ingredients" in selected:
+            queryset = queryset.prefetch_related("ingredients")
+        if "steps" in selected:
+            queryset = queryset.prefetch_related(
+                Prefetch("steps", queryset=Step.objects.order_by("step_number"))
+            )
+
+        return queryset
+
+    def should_cache_response(self, request):
+        # Favourites do not retire cached pages, so rankings by them are
+        # never cached, nor are cards whose volatile fields lack an id
+        ordering = request.query_params.get("ordering", "")
+        if "favourite_count" in ordering:
+            return False
+
+        if self.action == "list":
+            selected = RecipeListSerializer.selected_fields(**self.get_field_selection())
+            return "id" in selected or not set(self.volatile_fields) & set(selected)
+        return True
+
+    def should_store_response(self, request):
+        # A replica may not have had a recipe change yet while replicas that
+        # far behind are still used; caching what it returned would keep the
+        # old data for the new generation
+        if not reading_from_replica():
+            return True
+        age = generation_age(self.cache_generation_key)
+        return age is None or age > settings.REPLICA_MAX_LAG_SECONDS + settings.REPLICA_LAG_CHECK_INTERVAL
+
+    def cached_items(self, data):
+        return data["results"] if self.action == "list" else [data]
+
+    def refresh_cached_data(self, data):
+        # One query for the current favourite counts and flags of the cards
+        items = self.cached_items(data)
+        fields = [name for name in self.volatile_fields if items and name in items[0]]
+        if not fields:
+            return data
+
+        current = {
+            row["id"]: row
+            for row in self.annotate_favourited(
+                Recipe.objects.filter(pk__in=[item["id"] for item in items])
+            ).values("id", *fields)
+        }
+        for item in items:
+            item.update((name, current[item["id"]][name]) for name in fields if item["id"] in current)
+        return data
+
+    def response_cache_variant(self, data):
+        return json.dumps([
+            [item.get(name) for name in self.volatile_fields] for item in self.cached_items(data)
+        ])
+
+    def get_favourites_queryset(self):
+        # Recipes favourited by the requesting viewer, newest first
+        return Recipe.objects.filter(
+            favourited_by__user=self.request.user
+        ).defer("search_vector").select_related("created_by").prefetch_related(
+            "ingredients",
+            "steps"
+        ).annotate(is_favourited=Value(True)).order_by("-pk")
+
+    def get_field_selection(self):
+        # Parse comma-separated ?fields= and ?expand= query parameters
+        params = self.request.query_params
+        return {
+            name: [value.strip() for value in params.get(name, "").split(",") if value.strip()]
+            for name in ("fields", "expand")
+        }
+
+    def get_serializer_class(self):
+        # Lightweight card serializer for list pages
+        if self.action == "list":
+            return RecipeListSerializer
+        if self.action == "find_by_ingredients":
+            return RecipeMatchSerializer
+        if self.action == "top":
+            return RecipeRankingSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ["list", "find_by_ingredients", "top"]:
+            kwargs.update(self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
         # Ensure only creators can create recipes
@@ -82,152 +244,381 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["delete"], permission_classes=[IsViewer])
     def unfavourite(self, request, pk=None):
-        # Remove recipe from viewer's favourites
+        # Remove recipe from viewer's favourites. remove_favourites looks the
+        # favourite up under the user's lock and adjusts favourite_count by
+        # what it deleted, so concurrent requests cannot both count it.
         recipe = self.get_object()
 
-        try:
-            favourite = Favourite.objects.get(
-                user=request.user,
-                recipe=recipe
-            )
-            favourite.delete()
+        if remove_favourites(request.user, [recipe.pk])[recipe.pk] == REMOVED:
             return Response(
                 {"message": "Recipe removed from favourites"},
                 status=status.HTTP_204_NO_CONTENT
             )
-        except Favourite.DoesNotExist:
-            return Response(
-                {"message": "Recipe not in favourites"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            {"message": "Recipe not in favourites"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, methods=["post"], permission_classes=[IsViewer])
+    def bulk_favourite(self, request):
+        # Add many recipes to viewer's favourites: {"ids": [...]}
+        return self._bulk_favourites(request, add_favourites)
+
+    @action(detail=False, methods=["post"], permission_classes=[IsViewer])
+    def bulk_unfavourite(self, request):
+        # Remove many recipes from viewer's favourites: {"ids": [...]}
+        return self._bulk_favourites(request, remove_favourites)
+
+    def _bulk_favourites(self, request, change):
+        # Apply the change to every id at once and report each id's outcome
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        statuses = change(request.user, serializer.validated_data["ids"])
+        return Response({
+            "results": [{"id": pk, "status": outcome} for pk, outcome in statuses.items()]
+        })
+
+    @action(detail=False, methods=["get"])
+    def batch(self, request):
+        # Fetch many recipes by id (?ids=3,1,2) with one prefetched queryset;
+        # results follow the requested order with a per-id status
+        ids = [value.strip() for value in request.query_params.get("ids", "").split(",") if value.strip()]
+        serializer = RecipeIdsSerializer(data={"ids": ids})
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+
+        recipes = self.get_queryset().in_bulk(ids)
+        found = [recipes[pk] for pk in ids if pk in recipes]
+        data = iter(self.get_serializer(found, many=True).data)
+
+        return Response({
+            "results": [
+                {"id": pk, "status": "ok", "recipe": next(data)} if pk in recipes
+                else {"id": pk, "status": "not_found"}
+                for pk in ids
+            ]
+        })
 
     @action(detail=False, methods=["get"], permission_classes=[IsViewer])
     def my_favourites(self, request):
         # Return all recipes favourited by current viewer
-        recipes = Recipe.objects.filter(
-            favourited_by__user=request.user
-        ).select_related("created_by").prefetch_related(
-            "ingredients",
-            "steps"
-        )
+        page = self.paginate_queryset(self.get_favourites_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsViewer])
+    def favourite_ids(self, request):
+        # Ids of every recipe the viewer favourited, newest first. Ids only
+        # grow and a removal lowers the count, so (count, latest id) changes
+        # with every edit and revalidation needs just one aggregate.
+        favourites = Favourite.objects.filter(user=request.user)
+        state = favourites.aggregate(count=Count("pk"), latest=Max("pk"))
+        etag = quote_etag(f"{request.user.pk}-{state['count']}-{state['latest'] or 0}")
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            ids = list(favourites.order_by("-pk").values_list("recipe_id", flat=True))
+            response = Response({"count": len(ids), "ids": ids})
+
+        # Per-user data: shared caches must not reuse it across tokens
+        response["ETag"] = etag
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    @action(detail=False, methods=["get"])
+    def find_by_ingredients(self, request):
+        # Recipes ranked by how much of their ingredient list is covered by
+        # ?ingredients= (comma-separated ids or names). ?match=all keeps only
+        # recipes using every ingredient; ?missing=N keeps recipes that need
+        # at most N ingredients outside the list.
+        params = request.query_params
+        tokens = [value.strip() for value in params.get("ingredients", "").split(",") if value.strip()]
+        if not tokens:
+            return Response(
+                {"error": "ingredients is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        match = params.get("match", MATCH_ANY)
+        if match not in [MATCH_ALL, MATCH_ANY]:
+            return Response(
+                {"error": f"match must be '{MATCH_ALL}' or '{MATCH_ANY}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_missing = params.get("missing")
+        if max_missing is not None:
+            if not max_missing.isdigit():
+                return Response(
+                    {"error": "missing must be a non-negative integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            max_missing = int(max_missing)
+
+        # Numeric tokens are ids, anything else is looked up by name
+        ingredient_ids = {int(token) for token in tokens if token.isdigit()}
+        names = {Ingredient.normalize(token) for token in tokens if not token.isdigit()}
+        found = dict(
+            Ingredient.objects.filter(normalized_name__in=names).values_list("normalized_name", "pk")
+        ) if names else {}
+        ingredient_ids.update(found.values())
+
+        results = []
+        if match == MATCH_ANY or len(found) == len(names):
+            results = ingredient_index.find(ingredient_ids, match=match, max_missing=max_missing)
+
+        # Results are a ranked list of ids, so page them by number
+        paginator = SizedPageNumberPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        recipes = self.get_list_queryset().in_bulk([recipe_id for recipe_id, _, _ in page])
+
+        matches = []
+        for recipe_id, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_ingredients = matched
+            recipe.missing_ingredients = total - matched
+            recipe.coverage = round(matched / total, 4)
+            matches.append(recipe)
+
+        serializer = self.get_serializer(matches, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def top(self, request):
+        # Most favourited recipes of all time (?window=all) or within the
+        # last ?window=24h|7d|30d, at most ?limit= of them
+        window = request.query_params.get("window", ALL_TIME)
+        if window != ALL_TIME and window not in WINDOWS:
+            return Response(
+                {"error": f"window must be one of {[ALL_TIME, *WINDOWS]}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        limit = request.query_params.get("limit", "10")
+        if not limit.isdigit() or not 1 <= int(limit) <= settings.MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"limit must be between 1 and {settings.MAX_PAGE_SIZE}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ranked = top_recipes(window, int(limit))
+        recipes = self.get_list_queryset().in_bulk([recipe_id for recipe_id, _ in ranked])
+
+        cards = []
+        for recipe_id, favourites in ranked:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.window_favourites = favourites
+            cards.append(recipe)
+
+        serializer = self.get_serializer(cards, many=True)
+        return Response({"window": window, "results": serializer.data})
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        # Incremental sync: recipes changed and ids of recipes deleted after
+        # ?since=<token>, oldest first, at most ?limit= of them. Without
+        # since the whole catalogue is paged through. Clients keep the
+        # returned token and ask again at once while has_more is true.
+        limit = request.query_params.get("limit", str(settings.RECIPE_CHANGES_PAGE_SIZE))
+        if not limit.isdigit() or not 1 <= int(limit) <= settings.MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"limit must be between 1 and {settings.MAX_PAGE_SIZE}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        since = request.query_params.get("since")
+        try:
+            recipes, deleted, token, has_more = changes_since(self.get_queryset(), since, int(limit))
+        except InvalidChangeToken as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ChangeTokenExpired as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
 
         serializer = self.get_serializer(recipes, many=True)
-        return Response(serializer.data)
+        return Response({
+            "results": serializer.data,
+            "deleted": deleted,
+            "token": token or since,
+            "has_more": has_more,
+        })
 
     @action(detail=False, methods=["post"], permission_classes=[IsCreator])
     def bulk_upload(self, request):
-        # Bulk upload recipes using Excel file (.xlsx)
+        # Bulk upload recipes using an Excel (.xlsx) or CSV (.csv) file
         file = request.FILES.get("file")
 
         if not file:
             return Response(
-                {"error": "Excel file is required"},
+                {"error": "Excel or CSV file is required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         try:
-            workbook = openpyxl.load_workbook(file)
-            sheet = workbook.active
+            rows = read_import_rows(file)
+        except InvalidImportFile as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            rows = list(sheet.iter_rows(values_only=True))
+        # Stream rows into the database in chunks and collect per-row errors
+        report = RecipeImporter(created_by=request.user).run(rows)
 
-            headers = rows[0]
-            required_columns = ["title", "description", "prep_duration", "cook_duration"]
+        response_status = status.HTTP_201_CREATED
+        if (report.failed or report.file_error) and not report.created:
+            response_status = status.HTTP_400_BAD_REQUEST
 
-            # Validate column headers
-            if list(headers) != required_columns:
-                return Response(
-                    {"error": f"Excel columns must be {required_columns}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        return Response(
+            {
+                "message": f"{report.created} recipes uploaded successfully",
+                **report.to_dict(),
+            },
+            status=response_status
+        )
+
+    @action(detail=False, methods=["get"], permission_classes=[IsCreator])
+    def export(self, request):
+        # Download the recipes matching the list endpoint's filters, search
+        # and ordering in the bulk_upload layout: ?type=xlsx (default) or csv
+        file_type = request.query_params.get("type", "xlsx")
+        if file_type not in ("xlsx", "csv"):
+            return Response(
+                {"error": "type must be xlsx or csv"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            created_count = 0
+        # Newest first unless searched or ?ordering= is given, as listed
+        queryset = self.filter_queryset(Recipe.objects.order_by("-pk"))
+        rows = export_rows(queryset)
 
-            # Ensure atomic transaction for bulk creation
-            with transaction.atomic():
-                for row in rows[1:]:
-                    Recipe.objects.create(
-                        title=row[0],
-                        description=row[1],
-                        prep_duration=int(row[2]),
-                        cook_duration=int(row[3]),
-                        created_by=request.user
-                    )
-                    created_count += 1
+        # CSV rows are sent as they are read
+        if file_type == "csv":
+            response = StreamingHttpResponse(stream_csv(rows), content_type="text/csv; charset=utf-8")
+            response["Content-Disposition"] = content_disposition_header(True, "recipes.csv")
+            return response
 
+        # A workbook is a zip archive finished only on save, so it is
+        # written to a temporary file that is closed with the response
+        output = tempfile.TemporaryFile()
+        try:
+            write_xlsx(rows, output)
+        except BaseException:
+            output.close()
+            raise
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename="recipes.xlsx",
+            content_type=XLSX_CONTENT_TYPE,
+        )
+
+    @action(detail=False, methods=["post"], permission_classes=[IsCreator])
+    def bulk_upload_async(self, request):
+        # Queue an Excel or CSV bulk upload to run on a background worker
+        file = request.FILES.get("file")
+
+        if not file:
             return Response(
-                {"message": f"{created_count} recipes uploaded successfully"},
-                status=status.HTTP_201_CREATED
+                {"error": "Excel or CSV file is required"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        except Exception as e:
+        # Reject files with the wrong layout before queueing them
+        try:
+            read_import_rows(file).close()
+        except InvalidImportFile as e:
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        file.seek(0)
 
-    @action(detail=True, methods=["get"], permission_classes=[IsViewer])
-    def download_pdf(self, request, pk=None):
-        # Generate and download recipe as PDF (including images)
-        recipe = self.get_object()
-
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-
-        styles = getSampleStyleSheet()
-
-        # Recipe title
-        elements.append(Paragraph(f"<b>{recipe.title}</b>", styles["Title"]))
-        elements.append(Spacer(1, 12))
+        job = enqueue("recipes.import", request.user, input_file=file)
+        return self._job_accepted(job)
 
-        # Add thumbnail if available
-        if recipe.thumbnail:
-            elements.append(Image(recipe.thumbnail.path, width=200, height=150))
-            elements.append(Spacer(1, 12))
-
-        # Basic details
-        elements.append(Paragraph(f"Description: {recipe.description}", styles["Normal"]))
-        elements.append(Spacer(1, 12))
-        elements.append(Paragraph(f"Prep Duration: {recipe.prep_duration} mins", styles["Normal"]))
-        elements.append(Paragraph(f"Cook Duration: {recipe.cook_duration} mins", styles["Normal"]))
-        elements.append(Spacer(1, 20))
+    @action(detail=True, methods=["post"], permission_classes=[IsViewer])
+    def download_pdf_async(self, request, pk=None):
+        # Queue PDF generation; the file is downloaded from the job endpoint
+        recipe = self.get_object()
 
-        # Ingredients section
-        elements.append(Paragraph("<b>Ingredients:</b>", styles["Heading2"]))
-        elements.append(Spacer(1, 10))
+        job = enqueue("recipes.pdf", request.user, payload={"recipe_id": recipe.pk})
+        return self._job_accepted(job)
 
-        for ingredient in recipe.ingredients.all():
-            elements.append(Paragraph(f"- {ingredient.name}", styles["Normal"]))
-            elements.append(Spacer(1, 6))
+    def _job_accepted(self, job):
+        # Common 202 response pointing clients at the job status endpoint
+        return Response(
+            {
+                "job_id": job.pk,
+                "status": job.status,
+                "status_url": reverse("jobs-detail", args=[job.pk], request=self.request),
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
 
-            if ingredient.image:
-                elements.append(Image(ingredient.image.path, width=100, height=80))
-                elements.append(Spacer(1, 10))
+    @action(detail=True, methods=["get"], permission_classes=[IsViewer])
+    def download_pdf(self, request, pk=None):
+        # Generate and download recipe as PDF (including images)
+        recipe = self.get_object()
 
-        elements.append(Spacer(1, 20))
+        # Serve the cached document, rendering it only when content changed
+        cached = pdf_cache.get(recipe)
+        etag = quote_etag(cached.fingerprint)
+        last_modified = cached.last_modified.timestamp()
 
-        # Steps section
-        elements.append(Paragraph("<b>Steps:</b>", styles["Heading2"]))
-        elements.append(Spacer(1, 10))
+        # Let clients revalidate with If-None-Match / If-Modified-Since
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            cached.close()
+            return not_modified
+
+        response = FileResponse(
+            cached.open(),
+            as_attachment=True,
+            filename=f"{recipe.title}.pdf",
+            content_type="application/pdf",
+        )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
 
-        for step in recipe.steps.all():
-            elements.append(
-                Paragraph(f"{step.step_number}. {step.instruction}", styles["Normal"])
+    @action(detail=False, methods=["get"], permission_classes=[IsViewer])
+    def cookbook(self, request):
+        # Download many recipes as one PDF with a table of contents: the
+        # viewer's favourites with ?favourites=true, otherwise the recipes
+        # matching the list endpoint's filters, search and ordering
+        if request.query_params.get("favourites", "").lower() in ("1", "true"):
+            queryset = self.get_favourites_queryset()
+        else:
+            # Newest first unless searched or ?ordering= is given, as listed
+            queryset = self.filter_queryset(Recipe.objects.order_by("-pk"))
+
+        limit = settings.COOKBOOK_MAX_RECIPES
+        recipe_ids = list(queryset.values_list("pk", flat=True)[:limit + 1])
+        if not recipe_ids:
+            return Response(
+                {"error": "No recipes match the cookbook selection"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(recipe_ids) > limit:
+            return Response(
+                {"error": f"A cookbook can contain at most {limit} recipes; narrow the filters"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            elements.append(Spacer(1, 6))
-
-            if step.image:
-                elements.append(Image(step.image.path, width=200, height=150))
-                elements.append(Spacer(1, 12))
-
-        doc.build(elements)
-        buffer.seek(0)
 
-        return HttpResponse(
-            buffer,
+        # Served from a temporary file that is closed with the response
+        pdf = spooled_pdf(build_cookbook_pdf, self.get_queryset(), recipe_ids)
+        return FileResponse(
+            pdf,
+            as_attachment=True,
+            filename="cookbook.pdf",
             content_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{recipe.title}.pdf"'
-            },
         )
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import Job
 
-# Register your models here.
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "created_by", "progress", "total", "created_at")
+    list_filter = ("kind", "status")
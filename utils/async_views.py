@@ -0,0 +1,104 @@
+import mimetypes
+import os
+import stat as stat_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.authentication import CachedTokenAuthentication
+
+# Bytes read per chunk when streaming files
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # JSON encoded like DRF responses (dates, decimals, lazy strings)
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def stream_file(file, chunk_size=FILE_CHUNK_SIZE):
+    # Async iterator over a file object's contents; the blocking reads run
+    # in worker threads so the event loop keeps serving other requests
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+class AsyncAPIView(View):
+    # Base for async-native API endpoints: token authentication, an optional
+    # required role and JSON errors shaped like DRF's. Handlers must be
+    # coroutines (async def get/post/...).
+    role = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated like the DRF views, so no CSRF checks
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await CachedTokenAuthentication().aauthenticate(request)
+        except AuthenticationFailed as e:
+            return json_response({"detail": str(e.detail)}, status.HTTP_401_UNAUTHORIZED)
+
+        if authenticated is None:
+            return json_response(
+                {"detail": "Authentication credentials were not provided."}, status.HTTP_401_UNAUTHORIZED
+            )
+        request.user, request.auth = authenticated
+
+        if self.role is not None and request.user.role != self.role:
+            return json_response(
+                {"detail": "You do not have permission to perform this action."}, status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return json_response({"detail": "Not found."}, status.HTTP_404_NOT_FOUND)
+        except APIException as e:
+            return json_response({"detail": e.detail}, e.status_code)
+
+
+async def serve_media(request, path):
+    # Streams files below MEDIA_ROOT with ETag/Last-Modified revalidation.
+    # Mounted at MEDIA_URL when SERVE_MEDIA is set, for deployments without
+    # a front-end server for uploads.
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+
+    try:
+        stat = await sync_to_async(os.stat, thread_sensitive=False)(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("File not found")
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise Http404("File not found")
+
+    etag = quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        file = await sync_to_async(open, thread_sensitive=False)(full_path, "rb")
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = StreamingHttpResponse(stream_file(file), content_type=content_type or "application/octet-stream")
+        response["Content-Length"] = stat.st_size
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
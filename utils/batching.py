@@ -0,0 +1,9 @@
+# Fixed-size chunks for IN (...) lookups and bulk writes, which keeps every
+# query under database parameter limits
+
+
+def batches(items, size=1000):
+    # Lists of at most size items, in the given order
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,294 @@
+from contextlib import contextmanager
+from datetime import timedelta
+import io
+import os
+import re
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import connections, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+
+@contextmanager
+def rolled_back(using="default"):
+    # Run benchmark work inside a transaction that is always discarded
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
+
+
+@contextmanager
+def temporary_media():
+    # Point MEDIA_ROOT and file-based storages at throwaway directories,
+    # side by side so private storages stay outside MEDIA_ROOT
+    with tempfile.TemporaryDirectory() as root:
+        media_root = os.path.join(root, "media")
+        os.mkdir(media_root)
+        storages = {
+            alias: dict(
+                config,
+                OPTIONS={**config.get("OPTIONS", {}), "location": os.path.join(root, alias)},
+            )
+            if alias not in ("default", "staticfiles") else config
+            for alias, config in settings.STORAGES.items()
+        }
+        with override_settings(MEDIA_ROOT=media_root, STORAGES=storages):
+            yield media_root
+
+
+def bench_user(role="creator", username=None):
+    # Fetch or create a throwaway user for benchmark runs
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        username=username or f"bench_{role}",
+        defaults={"role": role, "email": f"bench_{role}@example.com"},
+    )
+    return user
+
+
+def allow_test_host():
+    # Like setup_test_environment(), accept the test client's host name
+    if not {"testserver", "*"} & set(settings.ALLOWED_HOSTS):
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+
+def bench_client(user=None):
+    # API client for in-process requests, authenticated as user
+    allow_test_host()
+
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def wsgi_get(application, url, token):
+    # One request through the WSGI application, as a WSGI server makes it
+    parts = urlsplit(url)
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": parts.path,
+        "QUERY_STRING": parts.query,
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "testserver",
+        "HTTP_AUTHORIZATION": f"Token {token}",
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    statuses = []
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        size = sum(len(chunk) for chunk in body)
+    finally:
+        body.close()
+    return statuses[0], size
+
+
+class StatementCapture:
+    # Database execute wrapper keeping every statement run through it with
+    # its parameters, for EXPLAIN afterwards
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+# Tables that grow with the number of recipes, users and favourites. A full
+# scan of one of them is cheap in a test database and slow in production.
+LARGE_TABLES = ("recipes_recipe", "recipes_step", "recipes_recipe_ingredients", "favorites_favourite")
+
+# Full table scans as EXPLAIN reports them: "SCAN <table or alias>"
+# without an index on SQLite, "Seq Scan on <table> [<alias>]" on PostgreSQL
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"^SCAN (\w+)()$"),
+    "postgresql": re.compile(r"\bSeq Scan on (\w+)(?: (\w+))?"),
+}
+
+# An outer ORDER BY on the primary key alone, which walks the primary key
+# index and stops at the LIMIT
+PK_ORDER_RE = re.compile(r' ORDER BY "\w+"\."id" (?:ASC|DESC)(?: LIMIT \d+)?$')
+
+# Table aliases in Django's SQL, as in FROM "recipes_recipe" U0. Only
+# subqueries and repeated joins alias their tables.
+TABLE_ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b')
+
+
+def query_plan(sql, params, using="default"):
+    # The database's plan for one statement, a line per plan node
+    connection = connections[using]
+    explain = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+    with connection.cursor() as cursor:
+        cursor.execute(f"{explain} {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def outer_query(sql):
+    # The statement without the text inside parentheses, i.e. without
+    # subqueries and function arguments
+    depth = 0
+    outer = []
+    for char in sql:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            outer.append(char)
+    return "".join(outer)
+
+
+def full_scans(sql, params, using="default", tables=LARGE_TABLES):
+    # Tables of the given set the statement reads in full. An outer query
+    # without WHERE, ordered by nothing or by the primary key only, returns
+    # rows as they are read (the unfiltered page, the COUNT(*) of page
+    # number pagination), so only its subqueries are checked.
+    pattern = FULL_SCAN_PATTERNS[connections[using].vendor]
+    outer = outer_query(sql)
+    bounded = " WHERE " not in outer and (" ORDER BY " not in outer or PK_ORDER_RE.search(outer))
+    aliases = {alias: table for table, alias in TABLE_ALIAS_RE.findall(sql)}
+
+    scanned = []
+    for line in query_plan(sql, params, using):
+        match = pattern.search(line.strip())
+        if not match:
+            continue
+        name, alias = match.groups()
+        in_subquery = bool(alias) or name in aliases
+        table = aliases.get(name, name)
+        if table in tables and not (bounded and not in_subquery):
+            scanned.append(table)
+    return scanned
+
+
+class Timer:
+    # Context manager measuring wall-clock time in seconds
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+def seed_recipes(user, count, ingredients_per_recipe=8, steps_per_recipe=10, batch_size=1000,
+                 catalogue_size=None):
+    # Bulk-insert recipes with ingredients and steps; returns created ids.
+    # Bypasses model signals, so run it inside rolled_back().
+    from recipes.models import Recipe, Ingredient, Step
+
+    catalogue_size = catalogue_size or max(ingredients_per_recipe * 4, 50)
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f"Bench ingredient {i}", normalized_name=f"bench ingredient {i}")
+        for i in range(catalogue_size)
+    )
+    Link = Recipe.ingredients.through
+
+    recipe_ids = []
+    for start in range(0, count, batch_size):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                title=f"Recipe {i}",
+                description=f"Description of recipe {i} with some searchable text",
+                prep_duration=i % 60,
+                cook_duration=i % 120,
+                created_by=user,
+            )
+            for i in range(start, min(start + batch_size, count))
+        )
+
+        links = []
+        steps = []
+        for recipe in recipes:
+            for j in range(ingredients_per_recipe):
+                ingredient = ingredients[(recipe.pk + j * 7) % len(ingredients)]
+                links.append(Link(recipe_id=recipe.pk, ingredient_id=ingredient.pk))
+            for number in range(1, steps_per_recipe + 1):
+                steps.append(Step(
+                    recipe=recipe,
+                    step_number=number,
+                    instruction=f"Step {number} of recipe {recipe.pk}: stir and cook gently",
+                ))
+
+        Link.objects.bulk_create(links, ignore_conflicts=True)
+        Step.objects.bulk_create(steps)
+        recipe_ids.extend(recipe.pk for recipe in recipes)
+
+    return recipe_ids
+
+
+def seed_favourites(recipe_ids, users, per_user, prefix="bench_fan"):
+    # Bulk-create viewers favouriting recipes; returns the viewers. Skewed
+    # so a few recipes are far more popular, spread over 60 days.
+    # bulk_create skips the counter signals, so counts are set at the end.
+    from favorites.models import Favourite
+    from recipes.models import Recipe
+
+    User = get_user_model()
+    accounts = User.objects.bulk_create(
+        User(username=f"{prefix}_{i}", role="viewer") for i in range(users)
+    )
+
+    now = timezone.now()
+    for start in range(0, len(accounts), 500):
+        favourites = []
+        for user in accounts[start:start + 500]:
+            chosen = {recipe_ids[(user.pk * 7919 + j * j * 31) % len(recipe_ids) // (1 + j % 4)] for j in range(per_user)}
+            favourites.extend(Favourite(user=user, recipe_id=recipe_id) for recipe_id in chosen)
+
+        favourites = Favourite.objects.bulk_create(favourites)
+        for favourite in favourites:
+            favourite.created_at = now - timedelta(hours=(favourite.user_id * 13 + favourite.recipe_id) % (60 * 24))
+        Favourite.objects.bulk_update(favourites, ["created_at"], batch_size=1000)
+
+    counts = Favourite.objects.filter(
+        recipe_id=OuterRef("pk")
+    ).values("recipe_id").annotate(count=Count("*")).values("count")
+    Recipe.objects.filter(pk__in=recipe_ids).update(favourite_count=Coalesce(Subquery(counts), 0))
+    return accounts
+
+
+SAMPLE_IMAGES = os.path.join(settings.BASE_DIR, "resources", "Recipe_images")
+
+
+def create_sample_recipe(user):
+    # Recipe using the full-resolution sample photos shipped in resources/;
+    # run it under temporary_media()
+    from recipes.models import Recipe, Ingredient, Step
+
+    def image(name):
+        return File(open(os.path.join(SAMPLE_IMAGES, name), "rb"), name=name)
+
+    recipe = Recipe.objects.create(
+        title="Benchmark Pizza",
+        description="Recipe used to benchmark PDF rendering",
+        prep_duration=20,
+        cook_duration=15,
+        created_by=user,
+        thumbnail=image("pizza.jpg"),
+    )
+    recipe.ingredients.add(Ingredient.objects.create(name="Flour", image=image("flour.jpg")))
+    Step.objects.create(recipe=recipe, step_number=1, instruction="Prepare dough", image=image("prepare dough.jpg"))
+    Step.objects.create(recipe=recipe, step_number=2, instruction="Add toppings", image=image("toppings.jpg"))
+    return recipe
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import registry
+
+
+# Generation counters are integers in Django's cache that writers bump and
+# readers compare against the value their local state was built from. With
+# a shared cache backend a bump is seen by every process.
+
+def get_generation(key):
+    return cache.get(key, 0)
+
+
+def bump_generation(key):
+    # Returns the new generation
+    cache.set(f"{key}:bumped_at", time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+        return 1
+
+
+def generation_age(key):
+    # Seconds since the generation was last bumped, or None if never
+    bumped_at = cache.get(f"{key}:bumped_at")
+    return None if bumped_at is None else time.time() - bumped_at
+
+
+# Per-process counters of CachedResponseMixin lookups
+response_cache_stats = {"hits": 0, "misses": 0, "not_modified": 0, "bypassed": 0}
+registry.register_stats("response_cache", response_cache_stats, "Cached API response lookups")
+
+
+def response_cache_hit_rate():
+    lookups = response_cache_stats["hits"] + response_cache_stats["misses"]
+    return response_cache_stats["hits"] / lookups if lookups else 0.0
+
+
+class CachedResponseMixin:
+    # Caches the data of successful list/retrieve responses under the URL,
+    # the sorted query parameters and the current generation of
+    # cache_generation_key; bumping it retires every entry at once. Both
+    # fresh and cached responses carry an ETag for conditional GETs.
+    cache_generation_key = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def should_cache_response(self, request):
+        return True
+
+    def should_store_response(self, request):
+        # Hook to serve a fresh response without caching it
+        return True
+
+    def refresh_cached_data(self, data):
+        # Hook to update fields that change without a generation bump (e.g.
+        # per-user flags) in data read from the cache
+        return data
+
+    def response_cache_variant(self, data):
+        # Hook returning a string of those fields' values for the ETag
+        return ""
+
+    def response_cache_key(self, request, generation):
+        params = sorted((name, values) for name, values in request.query_params.lists() if any(values))
+        ident = json.dumps([request.build_absolute_uri(request.path), params])
+        digest = hashlib.sha1(ident.encode()).hexdigest()
+        return f"responses:{self.cache_generation_key}:{generation}:{digest}"
+
+    def cached_response(self, view, request, *args, **kwargs):
+        if not self.should_cache_response(request):
+            response_cache_stats["bypassed"] += 1
+            return view(request, *args, **kwargs)
+
+        key = self.response_cache_key(request, get_generation(self.cache_generation_key))
+        data = cache.get(key)
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            # Stored as plain JSON types; DRF's response data keeps a
+            # reference to its serializer
+            data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            if self.should_store_response(request):
+                cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+            response_cache_stats["misses"] += 1
+            state = "MISS"
+        else:
+            data = self.refresh_cached_data(data)
+            response_cache_stats["hits"] += 1
+            state = "HIT"
+
+        etag = quote_etag(hashlib.sha1((key + self.response_cache_variant(data)).encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data)
+        else:
+            response_cache_stats["not_modified"] += 1
+
+        response["ETag"] = etag
+        response["X-Cache"] = state
+        # Data may differ per user, so shared caches must not reuse it
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
@@ -0,0 +1,146 @@
+from datetime import timedelta
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Handler functions keyed by job kind
+_handlers = {}
+
+# Kinds whose handlers must not run twice for one job
+_not_retried = set()
+
+
+def register(kind, retry=True):
+    # Decorator registering a function as the handler for a job kind.
+    # Handlers receive (job, progress) and return a JSON-serialisable result.
+    # Jobs of kinds registered with retry=False fail instead of running again
+    # when their worker stops sending heartbeats, for handlers whose partial
+    # work would be repeated (e.g. rows already imported).
+    def decorator(func):
+        _handlers[kind] = func
+        if not retry:
+            _not_retried.add(kind)
+        return func
+    return decorator
+
+
+def enqueue(kind, user, payload=None, input_file=None):
+    # Store a new pending job for the worker pool to pick up
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    return Job.objects.create(
+        kind=kind,
+        created_by=user,
+        payload=payload or {},
+        input_file=input_file,
+    )
+
+
+class JobProgress:
+    # Progress reporter handed to job handlers
+    def __init__(self, job):
+        self.job = job
+
+    def update(self, progress, total=None):
+        self.job.progress = progress
+        fields = {"progress": progress, "heartbeat_at": timezone.now()}
+        if total is not None:
+            self.job.total = total
+            fields["total"] = total
+        Job.objects.filter(pk=self.job.pk).update(**fields)
+
+
+def claim_next(worker_id):
+    # Atomically move the oldest pending job to running. The conditional
+    # UPDATE works on every backend, so no broker or row locks are needed.
+    candidates = Job.objects.filter(status=Job.PENDING).order_by("created_at", "pk")
+
+    for pk in candidates.values_list("pk", flat=True)[:10]:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING,
+            worker=worker_id,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+
+    return None
+
+
+def run_job(job):
+    # Execute a claimed job and persist its outcome
+    try:
+        handler = _handlers[job.kind]
+        job.result = handler(job, JobProgress(job))
+        job.status = Job.SUCCEEDED
+    except Exception as e:
+        # The traceback goes to the log only; error is shown to the user
+        logger.exception("Job %s failed", job.pk)
+        job.status = Job.FAILED
+        job.error = str(e) or "The job failed."
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        "status", "result", "result_file", "error", "progress", "total", "finished_at"
+    ])
+
+    # Uploaded input is no longer needed once the job finished either way
+    if job.input_file:
+        job.input_file.delete(save=True)
+
+    return job
+
+
+def requeue_stale_jobs():
+    # Return running jobs whose worker stopped sending heartbeats to the
+    # queue, or fail them when their kind is not retried
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER_SECONDS),
+    )
+
+    abandoned = list(stale.filter(kind__in=_not_retried).only("pk", "input_file"))
+    failed = Job.objects.filter(pk__in=[job.pk for job in abandoned], status=Job.RUNNING).update(
+        status=Job.FAILED,
+        error="The worker stopped responding; the job may have been partly applied.",
+        finished_at=now,
+        input_file="",
+    )
+    for job in abandoned:
+        if job.input_file:
+            job.input_file.delete(save=False)
+
+    return failed + stale.update(status=Job.PENDING, worker="")
+
+
+def work(poll_interval=None, once=False):
+    # Worker loop: claim and run jobs until stopped (or the queue is empty)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = poll_interval or settings.JOB_POLL_INTERVAL_SECONDS
+
+    while True:
+        close_old_connections()
+        requeue_stale_jobs()
+
+        job = claim_next(worker_id)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        logger.info("Worker %s running job %s (%s)", worker_id, job.pk, job.kind)
+        run_job(job)
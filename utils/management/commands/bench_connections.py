@@ -0,0 +1,87 @@
+from importlib.util import find_spec
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from utils.benchmarking import allow_test_host, bench_user, wsgi_get
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database connection overhead: a new connection per request "
+        "against persistent connections and, on PostgreSQL with psycopg_pool, a connection pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--path",
+            default="recipes/favourite_ids/",
+            help="API path requested, relative to /api/ (a cheap one shows the overhead best)",
+        )
+
+    def handle(self, *args, **options):
+        allow_test_host()
+        token = Token.objects.get_or_create(user=bench_user("viewer"))[0].key
+        connection = connections["default"]
+        configured = dict(connection.settings_dict)
+
+        options_without_pool = {
+            name: value for name, value in configured.get("OPTIONS", {}).items() if name != "pool"
+        }
+        modes = {
+            "new connection per request": {"CONN_MAX_AGE": 0, "OPTIONS": options_without_pool},
+            "persistent connections": {"CONN_MAX_AGE": 600, "OPTIONS": options_without_pool},
+        }
+        if connection.vendor == "postgresql" and find_spec("psycopg_pool") is not None:
+            pool = configured.get("OPTIONS", {}).get("pool") or {"min_size": 1, "max_size": 4}
+            modes["connection pool"] = {"CONN_MAX_AGE": 0, "OPTIONS": {**options_without_pool, "pool": pool}}
+
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        try:
+            for name, config in modes.items():
+                self.use(connection, config)
+                self.measure(name, f"/api/{options['path']}", token, options["requests"], opened)
+        finally:
+            connection_created.disconnect(count_connection)
+            self.use(connection, configured)
+
+    def use(self, connection, config):
+        # Start over with another connection configuration; every thread's
+        # wrapper shares this settings dict
+        connection.close()
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+        connection.settings_dict.update(config)
+
+    def measure(self, name, url, token, requests, opened):
+        application = get_wsgi_application()
+        status, _ = wsgi_get(application, url, token)
+        assert status.startswith("200"), status
+        opened.clear()
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            request_start = time.perf_counter()
+            wsgi_get(application, url, token)
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        self.stdout.write(
+            f"{name:>27}: {requests / elapsed:8.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:6.2f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.2f} ms, "
+            f"{len(opened)} connections opened"
+        )
@@ -0,0 +1,61 @@
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from utils.jobs import work
+
+
+def _worker_main(poll_interval, once):
+    # Entry point for child processes (re-initialises Django under spawn)
+    django.setup()
+    try:
+        work(poll_interval=poll_interval, once=once)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run background job workers backed by the database job table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--poll-interval", type=float, default=None)
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        poll_interval = options["poll_interval"]
+        once = options["once"]
+
+        if processes <= 1:
+            try:
+                work(poll_interval=poll_interval, once=once)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        # Child processes must not share the parent's database connections
+        connections.close_all()
+
+        workers = [
+            multiprocessing.Process(target=_worker_main, args=(poll_interval, once))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(f"Started {processes} job workers")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
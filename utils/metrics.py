@@ -0,0 +1,217 @@
+from bisect import bisect_left
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+from django.dispatch import Signal
+
+
+# Sent with the request and its RequestRecord for every request slower than
+# SLOW_REQUEST_THRESHOLD_MS, after it was logged
+slow_request = Signal()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Histogram:
+    # Bucketed observations per label set, rendered with Prometheus'
+    # cumulative _bucket/_sum/_count samples
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        # [count per bucket..., count above the last bucket, sum]
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], series):
+                cumulative += count
+                yield f"{self.name}_bucket", (*labels, ("le", bound)), cumulative
+            yield f"{self.name}_sum", labels, series[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CounterMetric:
+    # Monotonic total per label set
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.series.items()):
+            yield self.name, labels, value
+
+
+class MetricsRegistry:
+    # Per-process metrics rendered in the Prometheus text format. Stats
+    # dicts kept by caches elsewhere are exported as counters as they are.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.stats = {}
+
+    def histogram(self, name, help_text, buckets):
+        return self.metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def counter(self, name, help_text):
+        return self.metrics.setdefault(name, CounterMetric(name, help_text))
+
+    def register_stats(self, prefix, stats, help_text):
+        # Export each key of a {name: count} dict as <prefix>_<name>_total
+        self.stats[prefix] = (stats, help_text)
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            self.metrics[name].observe(labels, value)
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.metrics[name].inc(labels, amount)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(
+                    f"{name}{format_labels(labels)} {value}" for name, labels, value in metric.samples()
+                )
+
+        for prefix, (stats, help_text) in sorted(self.stats.items()):
+            for key, value in sorted(stats.items()):
+                name = f"{prefix}_{key}_total"
+                lines.append(f"# HELP {name} {help_text}: {key.replace('_', ' ')}")
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+registry.histogram(
+    "http_request_duration_seconds", "Time spent handling requests", LATENCY_BUCKETS
+)
+registry.histogram(
+    "http_request_db_queries", "Database queries run per request", QUERY_COUNT_BUCKETS
+)
+registry.histogram(
+    "http_request_db_seconds", "Time spent in database queries per request", LATENCY_BUCKETS
+)
+registry.histogram(
+    "http_response_encode_seconds",
+    "Time spent encoding response bodies after the view returned (DRF renderers; "
+    "serializer.data is built inside the view and counted in request duration only)",
+    LATENCY_BUCKETS,
+)
+registry.histogram(
+    "http_response_size_bytes", "Response body sizes", SIZE_BUCKETS
+)
+registry.counter(
+    "http_requests_total", "Requests handled, by status code"
+)
+
+
+class QueryRecorder:
+    # Database execute wrapper counting and timing a request's queries and
+    # keeping the first max_statements of them for the slow log
+    def __init__(self, max_statements):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_statements = max_statements
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < self.max_statements:
+                self.statements.append((elapsed, sql))
+
+
+class StackSampler:
+    # Sampling profiler for request threads. One daemon thread wakes every
+    # interval and records the current stack of each registered thread as a
+    # collapsed "file:function:line;..." string (flame graph input).
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.thread = None
+
+    def start(self, ident):
+        with self.lock:
+            self.threads[ident] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="request-sampler", daemon=True)
+                self.thread.start()
+
+    def stop(self, ident):
+        with self.lock:
+            return self.threads.pop(ident, Counter())
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, stacks in self.threads.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame, depth=40):
+        names = []
+        while frame is not None and len(names) < depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+_samplers = {}
+
+
+def get_sampler(interval):
+    # One sampler thread per configured interval
+    sampler = _samplers.get(interval)
+    if sampler is None:
+        sampler = _samplers.setdefault(interval, StackSampler(interval))
+    return sampler
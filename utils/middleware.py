@@ -0,0 +1,184 @@
+from contextlib import ExitStack, contextmanager
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import QueryRecorder, get_sampler, registry, slow_request
+from .routers import WriteTracker, _write_tracker, mark_written
+
+logger = logging.getLogger("utils.slow_requests")
+
+
+class RequestRecord:
+    # Measurements of one request
+    def __init__(self, queries):
+        self.queries = queries
+        self.duration = 0.0
+        self.encode = 0.0
+        self.size = None
+        self.stacks = None
+
+
+class InstrumentationMiddleware:
+    # Records per-view latency, query count and SQL time, response encoding
+    # time and response size into utils.metrics.registry (served at /metrics). Goes
+    # first in MIDDLEWARE so the other middleware is timed as well. Works
+    # in both sync and async stacks, so async views stay on the event loop.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        record = self.start(request)
+
+        # Stacks are sampled for every request, then kept only for slow ones
+        sampler = None
+        if settings.SLOW_REQUEST_THRESHOLD_MS is not None and settings.SLOW_REQUEST_PROFILE_INTERVAL_MS:
+            sampler = get_sampler(settings.SLOW_REQUEST_PROFILE_INTERVAL_MS / 1000)
+            sampler.start(threading.get_ident())
+
+        try:
+            with self.measure(record):
+                response = self.get_response(request)
+        finally:
+            if sampler is not None:
+                record.stacks = sampler.stop(threading.get_ident())
+
+        return self.finish(request, response, record)
+
+    async def __acall__(self, request):
+        # No stack sampling here: the thread is the event loop's, shared by
+        # every request in flight
+        record = self.start(request)
+        with self.measure(record):
+            response = await self.get_response(request)
+        return self.finish(request, response, record)
+
+    def start(self, request):
+        max_sql = settings.SLOW_REQUEST_MAX_SQL if settings.SLOW_REQUEST_THRESHOLD_MS is not None else 0
+        record = RequestRecord(QueryRecorder(max_sql))
+        request._instrumentation = record
+        return record
+
+    @contextmanager
+    def measure(self, record):
+        # Connections are shared with the threads running this request's
+        # sync code, so their queries are counted too
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record.queries))
+                yield
+        finally:
+            record.duration = time.perf_counter() - start
+
+    def finish(self, request, response, record):
+        if response.streaming:
+            length = response.get("Content-Length")
+            record.size = int(length) if length and length.isdigit() else None
+        else:
+            record.size = len(response.content)
+
+        self.observe(request, response, record)
+        threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+        if threshold is not None and record.duration * 1000 >= threshold:
+            self.log_slow_request(request, response, record)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are encoded by their renderer after the view returns;
+        # serializer.data was already built inside the view
+        record = getattr(request, "_instrumentation", None)
+        if record is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                record.encode = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def observe(self, request, response, record):
+        match = request.resolver_match
+        view = (("view", match.view_name if match else "unmatched"),)
+        method = (("method", request.method),)
+
+        registry.observe("http_request_duration_seconds", (*method, *view), record.duration)
+        registry.observe("http_request_db_queries", view, record.queries.count)
+        registry.observe("http_request_db_seconds", view, record.queries.seconds)
+        if record.encode:
+            registry.observe("http_response_encode_seconds", view, record.encode)
+        if record.size is not None:
+            registry.observe("http_response_size_bytes", view, record.size)
+        registry.inc("http_requests_total", (*method, ("status", response.status_code), *view))
+
+    def log_slow_request(self, request, response, record):
+        lines = [
+            f"Slow request: {request.method} {request.get_full_path()} -> {response.status_code} "
+            f"in {record.duration * 1000:.1f} ms ({record.queries.count} queries, "
+            f"{record.queries.seconds * 1000:.1f} ms SQL, {record.encode * 1000:.1f} ms encoding)"
+        ]
+        for elapsed, sql in sorted(record.queries.statements, key=lambda item: -item[0]):
+            lines.append(f"  {elapsed * 1000:8.2f} ms  {sql}")
+        if record.stacks:
+            lines.append("  Sampled stacks (samples, collapsed stack):")
+            lines.extend(f"  {count:6d}  {stack}" for stack, count in record.stacks.most_common(10))
+
+        logger.warning("\n".join(lines))
+        slow_request.send(sender=self.__class__, request=request, record=record)
+
+
+class PrimaryAfterWriteMiddleware:
+    # Notes requests that wrote to the database, so that the user's
+    # read-only requests skip the replicas for REPLICA_STICKY_SECONDS and
+    # see their own changes (utils.routers). Does nothing without replicas.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        with self.track(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        with self.track(request):
+            return await self.get_response(request)
+
+    @contextmanager
+    def track(self, request):
+        # The tracker object is shared with the threads running the
+        # request's sync code, which get copies of the context
+        tracker = WriteTracker()
+        token = _write_tracker.set(tracker)
+        try:
+            yield
+        finally:
+            _write_tracker.reset(token)
+            # DRF authenticates inside the view and sets request.user then
+            user = getattr(request, "user", None)
+            if tracker.wrote and user is not None and user.is_authenticated:
+                mark_written(user.pk)
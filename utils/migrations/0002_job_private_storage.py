@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-18 20:41
+
+import utils.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='input_file',
+            field=models.FileField(blank=True, null=True, storage=utils.models.job_storage, upload_to='jobs/input/'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='result_file',
+            field=models.FileField(blank=True, null=True, storage=utils.models.job_storage, upload_to='jobs/results/'),
+        ),
+    ]
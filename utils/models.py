@@ -1,3 +1,83 @@
 from django.db import models
+from django.conf import settings
+from django.core.files.storage import storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
 
-# Create your models here.
+
+class JobStorage(LazyObject):
+    # The "jobs" storage from STORAGES, kept outside MEDIA_ROOT: uploaded
+    # imports and results are only handed out by JobViewSet.result, to the
+    # job's owner, and must never be served at MEDIA_URL
+    def _setup(self):
+        self._wrapped = storages["jobs"]
+
+
+_job_storage = JobStorage()
+
+
+def job_storage():
+    # Callable so migrations reference the storage instead of its location
+    return _job_storage
+
+
+@receiver(setting_changed)
+def reset_job_storage(setting, **kwargs):
+    # Follow STORAGES overrides like default_storage does
+    if setting == "STORAGES":
+        _job_storage._wrapped = empty
+
+
+class Job(models.Model):
+    # Available job states
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    )
+
+    # Registered handler name, e.g. "recipes.import"
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+
+    # User who requested the job
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="jobs"
+    )
+
+    # Handler arguments and optional uploaded input
+    payload = models.JSONField(default=dict, blank=True)
+    input_file = models.FileField(upload_to="jobs/input/", storage=job_storage, null=True, blank=True)
+
+    # Handler output (JSON summary and/or downloadable file)
+    result = models.JSONField(null=True, blank=True)
+    result_file = models.FileField(upload_to="jobs/results/", storage=job_storage, null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    # Progress reported by the handler
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+
+    # Worker bookkeeping
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Workers poll for the oldest pending jobs
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        # Readable representation in admin
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,247 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Full-precision ISO format (DjangoJSONEncoder truncates microseconds,
+    # which would make datetime positions ambiguous)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class SizedPageNumberPagination(PageNumberPagination):
+    # Page-number pagination with a client-selectable, capped page size
+    page_size_query_param = "page_size"
+
+    @property
+    def max_page_size(self):
+        return settings.MAX_PAGE_SIZE
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # paginate_queryset() for async views: the count and the page rows
+        # are read with the async ORM
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        bottom = (number - 1) * page_size
+        rows = [row async for row in queryset[bottom:bottom + page_size]]
+        self.page = paginator._get_page(rows, number, paginator)
+        return rows
+
+
+class KeysetPagination(BasePagination):
+    # Cursor pagination on (ordering field, pk), where the ordering field is
+    # ?ordering=, else the queryset's own first ordering. Each page is a single
+    # indexed range scan: no COUNT(*) and no OFFSET, so deep pages cost the
+    # same as the first one and rows inserted meanwhile never shift pages.
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    default_ordering = "-pk"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request, queryset)
+        self.reverse = bool(cursor and cursor.get("r"))
+
+        # Walk backwards for "previous" cursors, then restore page order
+        descending = self.descending != self.reverse
+        prefix = "-" if descending else ""
+        order = [f"{prefix}{self.field}", f"{prefix}pk"] if self.field != "pk" else [f"{prefix}pk"]
+        queryset = queryset.order_by(*order)
+
+        if cursor:
+            queryset = queryset.filter(self.position_filter(cursor, descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=settings.MAX_PAGE_SIZE,
+            )
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        # Reuse the view's OrderingFilter validation (first term only)
+        ordering = None
+        if view is not None and OrderingFilter in getattr(view, "filter_backends", []):
+            ordering = OrderingFilter().get_ordering(request, queryset, view)
+
+        term = ordering[0] if ordering else self.queryset_ordering(queryset) or self.default_ordering
+        field = term.lstrip("-")
+        if field == "id":
+            field = "pk"
+        return field, term.startswith("-")
+
+    def queryset_ordering(self, queryset):
+        # First ordering term the queryset already has (e.g. -search_rank
+        # from a ranked search), if it is a plain field or annotation
+        order_by = queryset.query.order_by
+        term = order_by[0] if order_by else None
+        if isinstance(term, str) and term != "?" and "__" not in term:
+            return term
+        return None
+
+    def position_filter(self, cursor, descending):
+        # Rows strictly after the cursor position in the current direction
+        op = "lt" if descending else "gt"
+        if self.field == "pk":
+            return Q(**{f"pk__{op}": cursor["pk"]})
+        return Q(**{f"{self.field}__{op}": cursor["v"]}) | Q(
+            **{self.field: cursor["v"], f"pk__{op}": cursor["pk"]}
+        )
+
+    def encode_cursor(self, obj, reverse=False):
+        position = {"pk": obj.pk, "r": reverse}
+        if self.field != "pk":
+            position["v"] = getattr(obj, self.field)
+        encoded = json.dumps(position, default=_encode_value, separators=(",", ":"))
+        token = base64.urlsafe_b64encode(encoded.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset):
+        # Cursors come back from clients, so anything but a position this
+        # class could have produced is a 404 rather than a database error
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            if not isinstance(cursor, dict) or not isinstance(cursor.get("pk"), int):
+                raise ValueError
+            if self.field != "pk":
+                cursor["v"] = self.decode_value(queryset, cursor["v"])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def decode_value(self, queryset, value):
+        # The ordering field's value converted like a form input would be;
+        # annotations (such as search ranks) must be numbers
+        try:
+            field = queryset.model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError
+            return value
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError
+        return value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class PageOrCursorPagination(BasePagination):
+    # Page numbers by default; keyset mode with ?pagination=cursor (or when
+    # following a ?cursor= link)
+    mode_query_param = "pagination"
+
+    def __init__(self):
+        self.page_number = SizedPageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.delegate = self.page_number
+
+    def paginate_queryset(self, queryset, request, view=None):
+        use_keyset = (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.keyset.cursor_query_param in request.query_params
+        )
+        self.delegate = self.keyset if use_keyset else self.page_number
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = self.page_number.get_schema_operation_parameters(view)
+        parameters += [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": 'Set to "cursor" for keyset pagination',
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.keyset.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor returned in next/previous links",
+                "schema": {"type": "string"},
+            },
+        ]
+        return parameters
@@ -0,0 +1,148 @@
+from contextvars import ContextVar
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .metrics import registry
+
+# Replica alias reads of the current request go to, or None for the primary
+_read_alias = ContextVar("read_alias", default=None)
+
+# WriteTracker of the current request, set by PrimaryAfterWriteMiddleware
+_write_tracker = ContextVar("write_tracker", default=None)
+
+# Per-process counters of where read-only actions were routed
+replica_read_stats = {"replica": 0, "primary_after_write": 0, "primary_replicas_behind": 0}
+registry.register_stats("replica_reads", replica_read_stats, "Read-only requests by database routing decision")
+
+# Seconds behind the primary, or NULL when nothing was replayed yet. A
+# replica that has replayed everything it received is not behind, however
+# long ago the last write was.
+POSTGRESQL_LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+# {alias: (monotonic time measured, lag)} of this process
+_replica_lags = {}
+
+
+def replica_lag(alias):
+    # Seconds the replica is behind the primary, or None when it cannot be
+    # reached. Only PostgreSQL reports replication lag; other databases
+    # count as up to date.
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRESQL_LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        connection.close()
+        return None
+    return float(lag or 0)
+
+
+def available_replicas():
+    # Replicas at most REPLICA_MAX_LAG_SECONDS behind. Each one's lag is
+    # measured at most every REPLICA_LAG_CHECK_INTERVAL seconds per process.
+    now = time.monotonic()
+    available = []
+    for alias in settings.DATABASE_REPLICAS:
+        measured = _replica_lags.get(alias)
+        if measured is None or now - measured[0] >= settings.REPLICA_LAG_CHECK_INTERVAL:
+            measured = _replica_lags[alias] = (now, replica_lag(alias))
+        if measured[1] is not None and measured[1] <= settings.REPLICA_MAX_LAG_SECONDS:
+            available.append(alias)
+    return available
+
+
+def _written_key(user_id):
+    return f"db:wrote:{user_id}"
+
+
+def mark_written(user_id):
+    # Keep the user's reads on the primary until replicas have their write.
+    # Kept in the default cache, so use a shared one with several processes.
+    cache.set(_written_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def recently_written(user_id):
+    return cache.get(_written_key(user_id), False)
+
+
+def read_replica(user):
+    # Replica alias for a read-only request of user, or None for the primary
+    if user.is_authenticated and recently_written(user.pk):
+        replica_read_stats["primary_after_write"] += 1
+        return None
+
+    replicas = available_replicas()
+    if not replicas:
+        replica_read_stats["primary_replicas_behind"] += 1
+        return None
+
+    replica_read_stats["replica"] += 1
+    return random.choice(replicas)
+
+
+def reading_from_replica():
+    return _read_alias.get() is not None
+
+
+class WriteTracker:
+    # Whether the request has written to the database
+    def __init__(self):
+        self.wrote = False
+
+
+class ReplicaRouter:
+    # Sends reads to the replica chosen for the current request by
+    # ReplicaReadMixin and everything else to the primary. Writes always go
+    # to the primary, even for objects that were read from a replica, and
+    # are noted for PrimaryAfterWriteMiddleware.
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        tracker = _write_tracker.get()
+        if tracker is not None:
+            tracker.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects from any of them relate
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the primary's schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    # Runs the viewset actions named in replica_actions with their reads on
+    # one replica from DATABASE_REPLICAS, unless the user wrote within
+    # REPLICA_STICKY_SECONDS or every replica is too far behind.
+    # Authentication and permission checks still read from the primary.
+    replica_actions = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions and settings.DATABASE_REPLICAS:
+            _read_alias.set(read_replica(request.user))
@@ -0,0 +1,30 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    # Serializer exposing job status and progress for polling
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "total",
+            "result",
+            "error",
+            "result_url",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def get_result_url(self, obj):
+        # Download link is only available once a result file exists
+        if obj.status != Job.SUCCEEDED or not obj.result_file:
+            return None
+        return reverse("jobs-result", args=[obj.pk], request=self.context.get("request"))
@@ -1,3 +1,446 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+import base64
+import json
+import os
+import time
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import viewsets
+from rest_framework.authtoken.models import Token
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import Recipe
+from recipes.signals import RESPONSES_GENERATION_KEY
+from .benchmarking import temporary_media
+from .cache import bump_generation
+from .jobs import claim_next, enqueue, register, requeue_stale_jobs, run_job
+from .metrics import registry, slow_request
+from .models import Job
+from .routers import ReplicaReadMixin, replica_read_stats
+
+
+class InstrumentationTests(TestCase):
+    # Requests are measured per view and exported at /metrics
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="viewer", password="secret", role="viewer")
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def series(self, name, labels):
+        return registry.metrics[name].series.get(labels)
+
+    def test_requests_are_recorded_per_view(self):
+        labels = (("method", "GET"), ("view", "jobs-list"))
+        before = self.series("http_request_duration_seconds", labels)
+        before = sum(before[:-1]) if before else 0
+
+        self.client.get("/api/jobs/")
+        after = self.series("http_request_duration_seconds", labels)
+        self.assertEqual(sum(after[:-1]), before + 1)
+
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",view="jobs-list"}', body)
+        self.assertIn('http_requests_total{method="GET",status="200",view="jobs-list"}', body)
+        self.assertIn('http_request_db_queries_bucket{view="jobs-list",le="+Inf"}', body)
+        self.assertIn('http_response_encode_seconds_count{view="jobs-list"}', body)
+        self.assertIn("response_cache_hits_total", body)
+
+    def test_metrics_are_limited_to_allowed_clients(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0, SLOW_REQUEST_PROFILE_INTERVAL_MS=1)
+    def test_slow_requests_are_logged_with_sql(self):
+        records = []
+
+        def receiver(sender, request, record, **kwargs):
+            records.append(record)
+
+        slow_request.connect(receiver)
+        try:
+            with self.assertLogs("utils.slow_requests", "WARNING") as logs:
+                self.client.get("/api/jobs/")
+        finally:
+            slow_request.disconnect(receiver)
+
+        self.assertIn("Slow request: GET /api/jobs/ -> 200", logs.output[0])
+        self.assertIn("utils_job", logs.output[0])
+        self.assertEqual(len(records), 1)
+        self.assertGreaterEqual(records[0].queries.count, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    # ?pagination=cursor pages through recipes by (ordering field, pk)
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f"Recipe {i}", description="", prep_duration=i % 3, cook_duration=1, created_by=creator
+            )
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, page):
+        return [recipe["id"] for recipe in page["results"]]
+
+    def test_pages_follow_the_ordering_both_ways(self):
+        expected = [
+            recipe.pk for recipe in sorted(self.recipes, key=lambda recipe: (recipe.prep_duration, recipe.pk))
+        ]
+
+        page = self.get("/api/recipes/?pagination=cursor&ordering=prep_duration&page_size=3")
+        self.assertNotIn("count", page)
+        pages = [self.ids(page)]
+        while page["next"]:
+            page = self.get(page["next"])
+            pages.append(self.ids(page))
+        self.assertEqual([pk for ids in pages for pk in ids], expected)
+        self.assertEqual(pages[-1], expected[6:])
+
+        previous = self.get(page["previous"])
+        self.assertEqual(self.ids(previous), expected[3:6])
+
+    def test_page_and_cursor_modes_default_to_newest_first(self):
+        newest_first = [recipe.pk for recipe in reversed(self.recipes)]
+        self.assertEqual(self.ids(self.get("/api/recipes/?page_size=3")), newest_first[:3])
+        self.assertEqual(self.ids(self.get("/api/recipes/?page=2&page_size=3")), newest_first[3:6])
+        self.assertEqual(self.ids(self.get("/api/recipes/?pagination=cursor&page_size=3")), newest_first[:3])
+        token = Token.objects.get_or_create(user=self.viewer)[0]
+        response = self.client.get("/api/async/recipes/?page_size=3", HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(self.ids(response.json()), newest_first[:3])
+
+    def test_tampered_cursors_are_not_found(self):
+        def cursor(position):
+            return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+        for ordering, position in [
+            ("", {"pk": "abc"}),
+            ("", "pk"),
+            ("", [1]),
+            ("prep_duration", {"pk": 1}),
+            ("prep_duration", {"pk": 1, "v": "zz"}),
+            ("prep_duration", {"pk": 1, "v": None}),
+        ]:
+            with self.subTest(ordering=ordering, position=position):
+                response = self.client.get(f"/api/recipes/?ordering={ordering}&cursor={cursor(position)}")
+                self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(self.client.get("/api/recipes/?cursor=%%%").status_code, 404)
+
+
+@register("tests.fail")
+def failing_job(job, progress):
+    raise ValueError("Nothing to do")
+
+
+@register("tests.echo")
+def echo_job(job, progress):
+    job.result_file.save("echo.txt", ContentFile(job.payload["text"].encode()), save=False)
+    progress.update(1, total=1)
+    return {"length": len(job.payload["text"])}
+
+
+@register("tests.once", retry=False)
+def single_attempt_job(job, progress):
+    return {}
+
+
+class JobQueueTests(TestCase):
+    # Jobs stored in the database and run by workers
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="creator", password="secret", role="creator")
+
+    def setUp(self):
+        self.media = self.enterContext(temporary_media())
+
+    def test_workers_claim_the_oldest_pending_job_once(self):
+        first = enqueue("tests.echo", self.user, payload={"text": "a"})
+        second = enqueue("tests.echo", self.user, payload={"text": "b"})
+
+        claimed = claim_next("host:1")
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker), (first.pk, Job.RUNNING, "host:1"))
+        self.assertIsNotNone(claimed.heartbeat_at)
+        self.assertEqual(claim_next("host:2").pk, second.pk)
+        self.assertIsNone(claim_next("host:3"))
+
+    def test_run_job_stores_the_result(self):
+        enqueue("tests.echo", self.user, payload={"text": "hello"})
+        job = run_job(claim_next("host:1"))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.progress, job.total), (Job.SUCCEEDED, {"length": 5}, 1, 1))
+        self.assertIsNotNone(job.finished_at)
+        with job.result_file.open("rb") as file:
+            self.assertEqual(file.read(), b"hello")
+
+    def test_results_are_downloaded_by_their_owner_only(self):
+        job = run_job(enqueue("tests.echo", self.user, payload={"text": "hello"}))
+        url = f"/api/jobs/{job.pk}/result/"
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"hello")
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertTrue(self.client.get(f"/api/jobs/{job.pk}/").json()["result_url"].endswith(url))
+
+        other = get_user_model().objects.create_user(username="other", password="secret", role="creator")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(f"/api/jobs/{job.pk}/").status_code, 404)
+
+    def test_unfinished_and_failed_jobs_have_no_result(self):
+        pending = enqueue("tests.echo", self.user, payload={"text": "hello"})
+        with self.assertLogs("utils.jobs", "ERROR"):
+            failed = run_job(enqueue("tests.fail", self.user))
+
+        self.client.force_authenticate(self.user)
+        for job in (pending, failed):
+            response = self.client.get(f"/api/jobs/{job.pk}/result/")
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()["status"], job.status)
+
+    def test_job_files_are_kept_outside_media_root(self):
+        job = enqueue("tests.fail", self.user, input_file=ContentFile(b"title", name="upload.csv"))
+
+        self.assertTrue(os.path.exists(job.input_file.path))
+        self.assertFalse(job.input_file.path.startswith(os.path.join(self.media, "")))
+        self.assertEqual(self.client.get(f"/media/{job.input_file.name}").status_code, 404)
+
+    def test_failed_jobs_delete_their_input(self):
+        job = enqueue("tests.fail", self.user, input_file=ContentFile(b"title", name="upload.csv"))
+        path = job.input_file.path
+
+        with self.assertLogs("utils.jobs", "ERROR"):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.error, "Nothing to do")
+        self.assertFalse(job.input_file)
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(JOB_STALE_AFTER_SECONDS=60)
+class StaleJobTests(TestCase):
+    # Running jobs whose worker went quiet
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="creator", password="secret", role="creator")
+
+    def setUp(self):
+        self.media = self.enterContext(temporary_media())
+
+    def running_job(self, kind, **fields):
+        job = enqueue(kind, self.user, **fields)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, worker="host:1", heartbeat_at=timezone.now() - timedelta(seconds=61)
+        )
+        return job
+
+    def test_stale_jobs_are_requeued(self):
+        job = self.running_job("tests.fail")
+        fresh = enqueue("tests.fail", self.user)
+        Job.objects.filter(pk=fresh.pk).update(status=Job.RUNNING, heartbeat_at=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.PENDING, ""))
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+
+    def test_stale_jobs_of_kinds_not_retried_fail(self):
+        job = self.running_job("tests.once", input_file=ContentFile(b"title", name="upload.csv"))
+        path = job.input_file.path
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("stopped responding", job.error)
+        self.assertFalse(job.input_file)
+        self.assertFalse(os.path.exists(path))
+
+    def test_stale_imports_are_not_run_again(self):
+        job = self.running_job("recipes.import", input_file=ContentFile(b"title", name="upload.csv"))
+        requeue_stale_jobs()
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+
+class RoutedViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    # Reports where its reads and writes would go
+    authentication_classes = []
+    permission_classes = []
+    replica_actions = ["list"]
+
+    def routes(self):
+        return Response({"read": router.db_for_read(Job), "write": router.db_for_write(Job)})
+
+    def list(self, request):
+        return self.routes()
+
+    @action(detail=False)
+    def other(self, request):
+        return self.routes()
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"])
+class ReplicaRouterTests(SimpleTestCase):
+    # Only reads of the viewset's replica_actions leave the primary
+    def setUp(self):
+        patcher = mock.patch("utils.routers.replica_lag", return_value=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, name):
+        view = RoutedViewSet.as_view({"get": name})
+        return view(APIRequestFactory().get("/")).data
+
+    def test_replica_actions_read_from_a_replica(self):
+        routes = self.get("list")
+        self.assertIn(routes["read"], ["replica_1", "replica_2"])
+        self.assertEqual(routes["write"], "default")
+
+    def test_other_actions_and_code_outside_views_use_the_primary(self):
+        self.assertEqual(self.get("other"), {"read": "default", "write": "default"})
+        self.get("list")
+        self.assertEqual(router.db_for_read(Job), "default")
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate("replica_1", "recipes"))
+        self.assertTrue(router.allow_migrate("default", "recipes"))
+
+
+REPLICA = "replica_test"
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_LAG_CHECK_INTERVAL=0, RESPONSE_CACHE_TIMEOUT=0)
+class ReplicaDatabaseTests(TestCase):
+    # A second test database, added for this class only, stands in for a
+    # replica. Nothing replicates to it, so rows created by a test exist on
+    # the primary only and every read that finds them came from the primary.
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        primary = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings[REPLICA] = {
+            **primary,
+            "NAME": primary["NAME"] if connections[DEFAULT_DB_ALIAS].vendor == "sqlite" else f"{primary['NAME']}_replica",
+            "TEST": {**primary["TEST"], "NAME": None, "MIRROR": None},
+        }
+        cls.databases = frozenset({*cls.databases, REPLICA})
+        # Migrated here, as replicas are never migrated through the router
+        with override_settings(DATABASE_REPLICAS=[]):
+            connections[REPLICA].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].creation.destroy_test_db(verbosity=0)
+        cls.databases = cls.databases - {REPLICA}
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user(username="creator", password="secret", role="creator")
+        cls.viewer = User.objects.create_user(username="viewer", password="secret", role="viewer")
+        cls.recipe = Recipe.objects.create(
+            title="Soup", description="", prep_duration=1, cook_duration=1, created_by=cls.creator
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def status(self, path):
+        return self.client.get(path).status_code
+
+    def test_read_only_actions_read_from_the_replica(self):
+        before = replica_read_stats["replica"]
+        self.assertEqual(self.status(f"/api/recipes/{self.recipe.pk}/"), 404)
+        self.assertEqual(self.client.get("/api/recipes/").json()["count"], 0)
+        self.assertEqual(replica_read_stats["replica"], before + 2)
+
+        # Writes go to the primary
+        response = self.client.post(f"/api/recipes/{self.recipe.pk}/favourite/")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.recipe.favourited_by.using(DEFAULT_DB_ALIAS).count(), 1)
+        self.assertEqual(self.recipe.favourited_by.using(REPLICA).count(), 0)
+
+    def test_users_read_from_the_primary_after_writing(self):
+        self.client.force_authenticate(self.creator)
+        response = self.client.post(
+            "/api/recipes/",
+            {
+                "title": "Stew",
+                "description": "Slow cooked",
+                "prep_duration": 5,
+                "cook_duration": 60,
+                "ingredients": [{"name": "Beef"}],
+                "steps": [{"step_number": 1, "instruction": "Simmer"}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe_id = response.json()["id"]
+
+        # The creator sees the new recipe at once; other users see the
+        # replica, which does not have it yet
+        self.assertEqual(self.status(f"/api/recipes/{recipe_id}/"), 200)
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.status(f"/api/recipes/{recipe_id}/"), 404)
+
+        # After REPLICA_STICKY_SECONDS the creator reads the replica again
+        cache.clear()
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.status(f"/api/recipes/{recipe_id}/"), 404)
+
+    def test_replicas_behind_or_unreachable_fall_back_to_the_primary(self):
+        path = f"/api/recipes/{self.recipe.pk}/"
+        with mock.patch("utils.routers.replica_lag", return_value=60.0):
+            self.assertEqual(self.status(path), 200)
+        with mock.patch("utils.routers.replica_lag", return_value=None):
+            self.assertEqual(self.status(path), 200)
+        with mock.patch("utils.routers.replica_lag", return_value=1.0):
+            self.assertEqual(self.status(path), 404)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_replica_responses_are_not_cached_right_after_a_change(self):
+        bump_generation(RESPONSES_GENERATION_KEY)
+        self.client.get("/api/recipes/")
+        self.assertEqual(self.client.get("/api/recipes/")["X-Cache"], "MISS")
+
+        cache.set(f"{RESPONSES_GENERATION_KEY}:bumped_at", time.time() - 60, None)
+        self.client.get("/api/recipes/")
+        self.assertEqual(self.client.get("/api/recipes/")["X-Cache"], "HIT")
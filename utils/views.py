@@ -1,3 +1,53 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
+from django.utils.http import content_disposition_header
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+import os
 
-# Create your views here.
+from .metrics import registry
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    # Poll status/progress of background jobs and download their results
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Users can only see their own jobs
+        return Job.objects.filter(created_by=self.request.user).order_by("-created_at")
+
+    @action(detail=True, methods=["get"])
+    def result(self, request, pk=None):
+        # Download the file produced by a finished job
+        job = self.get_object()
+
+        if job.status != Job.SUCCEEDED or not job.result_file:
+            return Response(
+                {"error": "Job has no downloadable result", "status": job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        # Handlers may name the download in their result; stored names are
+        # storage-safe and may carry a suffix that keeps them unique
+        filename = job.result.get("filename") if isinstance(job.result, dict) else None
+        response = FileResponse(
+            job.result_file.open("rb"),
+            as_attachment=True,
+            filename=os.path.basename(job.result_file.name),
+        )
+        if filename:
+            # Set directly: FileResponse would cut the name at any "/"
+            response["Content-Disposition"] = content_disposition_header(True, filename)
+        return response
+
+
+def metrics(request):
+    # Prometheus scrape endpoint, open to METRICS_ALLOWED_IPS only
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")